@@ -7,7 +7,6 @@ import json
 import time
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 # --- ADD THESE 4 LINES ---
@@ -17,6 +16,19 @@ from selenium.webdriver.common.by import By
 import undetected_chromedriver as uc
 import random
 from supabase_queries import check_if_value_exists_in_colum, setup_supabase_client
+from driver_pool import DriverPool
+from scroll_loader import GRID_SELECTORS, scroll_until_stable
+from pdp_workers import pdp_concurrency, pdp_fetch_mode, pdp_lean_profile, run_pdp_stage
+from seen_index import SeenIndex
+from checkpoint_writer import CheckpointWriter
+from run_state import RunState, resume_requested
+from http_fetch import make_http_prefetch
+from html_parsing import make_soup, parse_html
+from rate_control import controlled_get
+from phase_timing import page_source, set_context, timed, write_report
+from page_cache import LISTING, PDP, record_driver_page, record_page
+from page_ready import wait_ready
+from image_urls import canonical_image_url
 
 
 
@@ -35,56 +47,20 @@ CATEGORIES_TO_SCRAPE = [
     }
 ]
 
-import undetected_chromedriver as uc
-from selenium.webdriver.chrome.options import Options
-
-def make_driver():
-    """Configures and initializes an undetectable Chrome driver for H&M."""
-    
-    options = uc.ChromeOptions()
-    
-    # --- CRUCIAL: TEMPORARILY REMOVE HEADLESS FOR DEBUGGING ---
-    # When debugging blocks, it is essential to see the browser:
-    # options.add_argument("--headless=new") # COMMENT OUT THIS LINE
-    options.add_argument("--window-size=1920,1080")
-    
-    # --- PERFORMANCE/STABILITY (Keep these) ---
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--log-level=3") 
-
-    driver = uc.Chrome(options=options, version_main=141)
-    
-    # Add a network timeout (separate from script timeout)
-    driver.set_page_load_timeout(60) # Set a high limit for the page to load
-    
-    return driver
-
-
-def fully_scroll(driver, pause=0, max_loops=8):
-    """Scrolls down the page until no new content is loaded."""
-
-    loops = 0
-    while loops < max_loops:
-
-        driver.execute_script("window.scrollBy(0, 850);")
-        time.sleep(pause)
 
-        loops += 1
-        print(f"Loops done: {loops}/{max_loops}")
 
 
 
 # --- MODIFIED: Added main_category and role parameters ---
 def parse_product_grid(html: str, main_category: str, role: str):
     """Parses the HTML content to extract product details."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     results = []
 
     for article in soup.select('main[data-testid="product-grid"] article[data-testid="plp-product-card"]'):
         # Selects the specific primary image tag
         img_tag = article.select_one('img[data-testid="product-card-primary-image"]')
-        image = img_tag.get('src') if img_tag else None
+        image = canonical_image_url(img_tag.get('src'), "adidas") if img_tag else None
 
         # Selects the specific link tag
         link_tag = article.select_one('a[data-testid="product-card-image-link"]')
@@ -106,66 +82,47 @@ def parse_product_grid(html: str, main_category: str, role: str):
 
     return results
 
+def load_listing_html(driver, url):
+    """Opens and scrolls one listing page; run through pool.run() so blocked pages are retried headed."""
+    controlled_get(driver, url)
+    # time.sleep(5)
+    scroll_until_stable(driver, GRID_SELECTORS["adidas"], pause=0.8)
+    return page_source(driver)
+
 # --- MODIFIED: Added main_category and role parameters ---
-def fetch_and_scroll(url, main_category, role):
-    """Drives the Selenium browser to fetch and scroll the page."""
+@timed("wait")
+def fetch_and_scroll(pool, url, main_category, role):
+    """Drives a pooled Selenium browser to fetch and scroll the page."""
     print(f"Scraping {url}")
-    driver = make_driver()
-    try:
-        driver.get(url)
-        # time.sleep(5)
-        fully_scroll(driver, pause=0.8, max_loops=16)
-        soup_html = driver.page_source
-        
-
-    finally:
-        driver.quit()
+    soup_html = pool.run(load_listing_html, url)
+    record_page(url, LISTING, html=soup_html, role=role, main_category=main_category)
 
     # --- MODIFIED: Pass category data to parser ---
-    return parse_product_grid(soup_html, main_category, role)
+    return parse_html(parse_product_grid, soup_html, main_category, role)
 
 
         
 
 
 
+@timed("wait")
 def scrape_product_detail_via_schema(driver, product_url):
     print(f"  -> Fetching details for: {product_url}")
-    details_dict = {} # <-- NOTE: Renamed to avoid confusion
     SCHEMA_ID = 'product-schema'
     MAIN_CONTENT_ID = 'main-content'
     json_string = None
     
     try:
-        driver.get(product_url)
-        wait = WebDriverWait(driver, 5) 
+        controlled_get(driver, product_url)
+        # 1. WAIT FOR THE SCHEMA AND A QUIET PAGE (the cookie banner is dismissed on the way, see page_ready)
+        if not wait_ready(driver, RETAILER, selector='script[type="application/ld+json"]', timeout=5)["ready"]:
+            raise TimeoutError("no JSON-LD schema on the page")
 
-        # 1. WAIT FOR PAGE STABILITY 
-        wait.until(
-            EC.presence_of_element_located((By.ID, MAIN_CONTENT_ID))
-        )
-        print("  -> Main content container found via Presence. Adding buffer...")
-        # time.sleep(1.5) 
-
-        # 2. POPUP/COOKIE BANNER HANDLING (Code omitted for brevity, assumed correct)
-        try:
-            cookie_accept_selector = (By.ID, "onetrust-accept-btn-handler")
-            cookie_button = WebDriverWait(driver, 0.5).until(EC.element_to_be_clickable(cookie_accept_selector))
-            cookie_button.click()
-            print("  -> Cookie banner accepted/closed.")
-            # time.sleep(1
-        except Exception:
-            print("  -> No cookie banner detected or could not close it. Continuing.")
-            pass
-  
-            
-        schema_element = wait.until(
-            # CHANGE IS HERE: Use By.CSS_SELECTOR to find the script by its type attribute
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'script[type="application/ld+json"]')) 
-        )
+        schema_element = driver.find_element(By.CSS_SELECTOR, 'script[type="application/ld+json"]')
 
         print("  -> ✅ Product Schema script found after stabilization.")
         json_string = schema_element.get_attribute('innerHTML')
+        record_driver_page(driver, product_url, json_ld=json_string)
 
             
 
@@ -173,6 +130,13 @@ def scrape_product_detail_via_schema(driver, product_url):
         print(f"  -> ❌ ERROR during navigation/wait: {e}")
         return {} 
         
+    return parse_product_detail(json_string)
+
+
+def parse_product_detail(json_string):
+    """Maps the Adidas JSON-LD schema string to our product fields."""
+    details_dict = {}
+
     # --- JSON PROCESSING (The core fix is here) ---
     if json_string:
         try:
@@ -204,112 +168,140 @@ def scrape_product_detail_via_schema(driver, product_url):
     # --- CRITICAL FIX 3: RETURN THE DICTIONARY ---
     return details_dict
 
-def products_already_in_database(filepath):
-    """Loads previously scraped product URLs from a JSON file."""
+def scrape_product_detail_via_http(json_string, html):
+    """HTTP fetch mode: parses a PDP downloaded by http_fetch instead of a live browser."""
+    return parse_product_detail(json_string)
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    scraped_urls = {item['url'] for item in data if 'url' in item}
-    # print(scraped_urls)
-    print(f"Loaded {len(scraped_urls)} previously scraped product URLs.")
-    return scraped_urls
 
+# Retailer key used by the shared modules (pdp_workers, seen_index, crawl_scheduler)
+RETAILER = "adidas"
+# --- MODIFICATION 1: Set to 5 to test 5 pages per category ---
+MAX_PAGES_PER_CATEGORY = 1
+PDP_LIMIT = None
+# All categories go through one PDP stage into one catalog file, named after the last category
+PDP_PER_CATEGORY = False
+CATALOG_PATH_TEMPLATE = "adidas_catalog/donna/{role}.json"
+# Listing parser used when replaying cached pages (see page_cache)
+LISTING_PARSER = parse_product_grid
+# Empty results (navigation or wait errors) are not kept: the item is marked failed and retried by --resume
+PDP_KEEP = bool
 
-def main():
-    """Orchestrates the scraping process."""
+
+def scrape_category_listing(pool, category_info, supabase_client=None):
+    """STEP 1 for one category: returns the listing items of its first MAX_PAGES_PER_CATEGORY pages."""
     all_data = []
 
+    slug = category_info["slug"]
+    main_cat = category_info["main_category"]
+    role = category_info["role"]
+    set_context(category=role)
 
-    # --- STEP 1: Scrape Listing Pages for URLs and basic info ---
-    print("--- STEP 1: Scraping Listing Pages for URLs and basic info ---")
+    # Loop through the pages for this category
+    for i in range(1, MAX_PAGES_PER_CATEGORY + 1): 
+        print(f"  -> Loading Page {i}...")
 
-    # --- MODIFICATION 1: Set to 5 to test 5 pages per category ---
-    MAX_PAGES_PER_CATEGORY = 1
+        if main_cat in ["shoes"]:
+            page_url = CATEGORY_URL_SHOES_TEMPLATE.format(slug=slug, page=i)
 
-    # --- MODIFIED LOOP STRUCTURE ---
-    for category_info in CATEGORIES_TO_SCRAPE:
-        slug = category_info["slug"]
-        cat_name = category_info["name"]
-        main_cat = category_info["main_category"]
-        role = category_info["role"]
+        # Pass the category info to the scraper
+        data = fetch_and_scroll(pool, page_url, main_cat, role) 
         
-        print(f"\n--- Scraping Category: {cat_name} ({slug}) ---")
+        if not data:
+            print(f"  -> No data found on page {i} for {slug}. Stopping this category.")
+            break 
 
-        # Loop through the pages for this category
-        for i in range(1, MAX_PAGES_PER_CATEGORY + 1): 
-            print(f"  -> Loading Page {i}...")
+        print(f"  -> Found {len(data)} items on page which aren't in Database{i}. Adding ALL {len(data)} items to scraping list.")
+        all_data.extend(data) 
 
-            if main_cat in ["shoes"]:
-                page_url = CATEGORY_URL_SHOES_TEMPLATE.format(slug=slug, page=i)
+        # Random delay between listing pages
+        # time.sleep(1 + random.random() * 3)
 
-            # Pass the category info to the scraper
-            data = fetch_and_scroll(page_url, main_cat, role) 
-            
-            if not data:
-                print(f"  -> No data found on page {i} for {slug}. Stopping this category.")
-                break 
+    return all_data
 
-            print(f"  -> Found {len(data)} items on page which aren't in Database{i}. Adding ALL {len(data)} items to scraping list.")
-            all_data.extend(data) 
-            # --------------------------------------------------
-            
-            # Random delay between listing pages
-            # time.sleep(1 + random.random() * 3)
-    # --- END OF MODIFIED LOOP ---
+
+def scrape_details(pool, all_data, catalog_path, seen, state, resumed=False):
+    """STEP 2: scrapes the PDPs of `all_data` and writes them to `catalog_path`."""
+    # Finished products are streamed to a JSONL checkpoint and compacted at the end
+    checkpoint = CheckpointWriter(catalog_path, resume=resumed)
+
+    def finish(item, details):
+        checkpoint.append({**item, **details})
+
+    run_pdp_stage(
+        pool,
+        all_data,
+        scrape_product_detail_via_schema,
+        concurrency=pdp_concurrency(RETAILER),
+        on_done=finish,
+        on_status=state.mark,
+        lean=pdp_lean_profile(RETAILER),
+        prefetch=make_http_prefetch(scrape_product_detail_via_http) if pdp_fetch_mode() == "http" else None,
+        keep=PDP_KEEP,
+    )
+
+    # Read before finish() clears the queue
+    done = state.done_urls()
+    data = state.finish(checkpoint)
+    # Products count as seen only once they are in the catalog file, and only if they were scraped successfully
+    seen.mark_done(RETAILER, [record for record in data if record.get('url') in done])
+    return data
+
+
+def main(resume: bool = False):
+    """Orchestrates the scraping process."""
+    all_data = []
+
+    # Warm browsers shared by the listing and PDP phases
+    pool = DriverPool(size=pdp_concurrency("adidas"), max_pages=50)
+    # Products scraped in earlier runs are not queued again
+    seen = SeenIndex()
+    
+    # The listing queue and per-URL status survive crashes (see run_state)
+    state = RunState("adidas")
+    queued = state.unfinished() if resume else None
+    if queued is not None:
+        print(f"--- Resuming: {len(queued)} unfinished products, skipping STEP 1 ---")
+        all_data = queued
+    else:
+        # --- STEP 1: Scrape Listing Pages for URLs and basic info ---
+        print("--- STEP 1: Scraping Listing Pages for URLs and basic info ---")
+
+        # --- MODIFIED LOOP STRUCTURE ---
+        for category_info in CATEGORIES_TO_SCRAPE:
+            print(f"\n--- Scraping Category: {category_info['name']} ({category_info['slug']}) ---")
+            all_data.extend(scrape_category_listing(pool, category_info))
         
-    # Now all_data will have (3 pages * 11 categories) = 33 items (if all pages/categories exist)
-    print(f"\nTotal items collected for detailed scraping: {len(all_data)}")
+        # Now all_data will have (3 pages * 11 categories) = 33 items (if all pages/categories exist)
+        print(f"\nTotal items collected for detailed scraping: {len(all_data)}")
+
+        if not all_data:
+            print("Skipping STEP 2: No product URLs collected due to block/error.")
+            pool.close()
+            return 
 
-    if not all_data:
-        print("Skipping STEP 2: No product URLs collected due to block/error.")
-        return 
+        all_data = seen.filter_new("adidas", all_data)
+        if not all_data:
+            print("Skipping STEP 2: every product is already in the seen index.")
+            pool.close()
+            return
+
+        state.save_queue(all_data)
 
     # --- STEP 2: Scrape Product Detail Pages (PDP) ---
     print("\n--- STEP 2: Scraping Details from Product Pages ---")
-    
-    driver = make_driver() 
 
-    successful_data = []
-    try:
-        for i, item in enumerate(all_data):
-            # if i > 1:
-            #     break
-            # Added print to show progress
-            print(f"\nProcessing item {i+1}/{len(all_data)} (Category: {item['main_category']})")
-            if not item.get('url'):
-                print("  -> Skipping item, no URL found.")
-                continue
-            
-            # Call the PDP scraping function
-            details = scrape_product_detail_via_schema(driver, item['url'])
-            
-            # # Print the successfully extracted dictionary
-            # print("  -> JSON DETTAGLIATO: ", details)
-            if details is None:
-                print("  -> Item skipped intentionally ('Pairs' item). NOT added to final list.")
-                continue  # Skip this item entirely
-            # Merge the new details into the existing item dictionary
-            else:
-                item.update(details)
-                successful_data.append(item) # ONLY successful items are kept here
-            
-            # Random delay between products to mimic human behavior
-            # time.sleep(1 + random.random() * 1.5) 
+    # The catalog file is named after the last category, as before
+    role = CATEGORIES_TO_SCRAPE[-1]["role"]
 
+    try:
+        scrape_details(pool, all_data, CATALOG_PATH_TEMPLATE.format(role=role), seen, state, resumed=queued is not None)
     finally:
-        driver.quit()
-
-    # --- Final Saving and Preview ---
-    
-    with open(f"adidas_catalog/donna/{role}.json", "w", encoding="utf-8") as f:
-        json.dump(successful_data, f, indent=4, ensure_ascii=False)
-    print(f"\n✅ Test data successfully saved to adidas_catalog/uomo/{role}.json")
-
-    # print("\n" + "="*50)
-    # print("--- Final Extracted Data Preview (First Item with Details) ---")
-    # print("="*50)
-    
+        pool.report()
+        pool.close()
     
     print(f"\nCompleted! Total {len(all_data)} products processed.")
+    write_report(RETAILER)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(resume=resume_requested())
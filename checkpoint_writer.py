@@ -0,0 +1,130 @@
+import os
+import json
+import threading
+
+
+class CheckpointWriter:
+    """
+    Streams finished PDP records to a JSON Lines checkpoint and merges it into the catalog file at the end.
+
+    Each append writes one line, so the cost per product is constant instead of
+    re-serializing the whole list. Lines are flushed immediately and fsynced every
+    `fsync_every` records, so a crash loses at most that many products. An
+    existing checkpoint is always appended to, whether or not the run resumes.
+
+    Usage:
+        checkpoint = CheckpointWriter("zara_catalog/donna/coats.json")
+        checkpoint.append(record)          # from any PDP worker thread
+        checkpoint.compact(order=urls)     # merges into coats.json, removes the .jsonl
+    """
+
+    def __init__(self, final_path: str, checkpoint_path: str = None, fsync_every: int = 20, resume: bool = False):
+        self.final_path = final_path
+        self.checkpoint_path = checkpoint_path or os.path.splitext(final_path)[0] + ".checkpoint.jsonl"
+        self.fsync_every = fsync_every
+
+        os.makedirs(os.path.dirname(self.checkpoint_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # Always append: records left by a crashed run are compacted with this run's, never truncated
+        leftover = 0 if resume else len(self.records())
+        if leftover:
+            print(f"  -> ⚠️ {self.checkpoint_path} holds {leftover} records from an unfinished run. They will be merged into the catalog with this run's.")
+        self._file = open(self.checkpoint_path, "a", encoding="utf-8")
+        self._pending = 0
+
+    def append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._pending += 1
+            if self._pending >= self.fsync_every:
+                os.fsync(self._file.fileno())
+                self._pending = 0
+
+    def sync(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._pending = 0
+
+    def records(self) -> list:
+        """Reads back every record in the checkpoint (a torn last line from a crash is ignored)."""
+        records = []
+        if not os.path.exists(self.checkpoint_path):
+            return records
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"  -> ⚠️ Ignoring a truncated line in {self.checkpoint_path}.")
+        return records
+
+    def close(self):
+        self.sync()
+        with self._lock:
+            self._file.close()
+
+    def _read_catalog(self) -> list:
+        """Records already in the catalog file from earlier runs (empty if there is none)."""
+        if not os.path.exists(self.final_path):
+            return []
+        try:
+            with open(self.final_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            # Never overwrite a catalog we cannot read; the checkpoint stays on disk
+            print(f"  -> ❌ Could not read {self.final_path}, keeping the checkpoint: {e}")
+            raise
+
+    def compact(self, order: list = None, keep_checkpoint: bool = False) -> list:
+        """
+        Merges the checkpoint into the catalog JSON and deletes the checkpoint.
+
+        Records are de-duplicated by URL (last one wins) and, if `order` (a list of
+        URLs) is given, sorted in that order; URLs not in `order` keep their
+        checkpoint order at the end. Products already in the catalog file are
+        updated in place and new ones are appended, so an incremental run never
+        drops what earlier runs scraped. Nothing is written when the checkpoint is empty.
+        With `keep_checkpoint` the JSONL file stays on disk so a resumed run can append to it.
+
+        Returns:
+            The records of this checkpoint, de-duplicated and ordered.
+        """
+        self.close()
+
+        by_url = {}
+        for record in self.records():
+            by_url[record.get('url')] = record
+        data = list(by_url.values())
+
+        if order:
+            position = {url: i for i, url in enumerate(order)}
+            data.sort(key=lambda record: position.get(record.get('url'), len(position)))
+
+        if data:
+            catalog = {}
+            unkeyed = []
+            for record in self._read_catalog():
+                if record.get('url'):
+                    catalog[record['url']] = record
+                else:
+                    unkeyed.append(record)
+            added = sum(1 for record in data if record.get('url') not in catalog)
+            for record in data:
+                catalog[record.get('url')] = record
+
+            tmp_path = self.final_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(unkeyed + list(catalog.values()), f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.final_path)
+            print(f"\n✅ Compacted {len(data)} records into {self.final_path} ({added} new, {len(catalog) + len(unkeyed)} in the catalog)")
+
+        if not keep_checkpoint:
+            os.remove(self.checkpoint_path)
+        return data
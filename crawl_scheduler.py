@@ -0,0 +1,295 @@
+import os
+import time
+import argparse
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from driver_pool import DriverPool
+from pdp_workers import pdp_concurrency
+from seen_index import SeenIndex
+from run_state import RunState
+from phase_timing import write_report
+
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Retailer key -> scraper script. Each script exposes CATEGORIES_TO_SCRAPE,
+# scrape_category_listing(), scrape_details(), PDP_LIMIT, PDP_PER_CATEGORY and CATALOG_PATH_TEMPLATE.
+RETAILER_SCRIPTS = {
+    "zara": "zara_scripts/zara_scraper.py",
+    "hm": "h&m_scripts/scraper_donna.py",
+    "mango": "mango_scripts/mango_scraper.py",
+    "nike": "nike_scripts/nike_scraper.py",
+    "adidas": "adidas_scripts/adidas_scraper.py",
+    "zalando": "zalando_scripts/scraper_zalando.py",
+}
+
+
+def load_scraper(retailer: str):
+    """Imports a retailer's scraper script as a module (the script folders are not packages)."""
+    path = os.path.join(ROOT_DIR, RETAILER_SCRIPTS[retailer])
+    spec = importlib.util.spec_from_file_location(f"{retailer}_scraper", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Job:
+    """One node of the crawl graph: a listing or PDP task of one retailer."""
+
+    def __init__(self, retailer: str, kind: str, label: str, fn, deps=()):
+        self.retailer = retailer
+        self.kind = kind
+        self.label = label
+        self.fn = fn
+        self.deps = list(deps)
+        self.result = None
+        self.state = "waiting"  # waiting -> running -> done / failed / cancelled
+
+    def ready(self) -> bool:
+        return self.state == "waiting" and all(dep.state == "done" for dep in self.deps)
+
+    def blocked(self) -> bool:
+        return self.state == "waiting" and any(dep.state in ("failed", "cancelled") for dep in self.deps)
+
+
+class RetailerContext:
+    """The scraper module, driver pool and bookkeeping of one retailer inside the scheduler."""
+
+    def __init__(self, retailer: str, module, seen: SeenIndex, supabase_client=None):
+        self.retailer = retailer
+        self.module = module
+        self.seen = seen
+        self.supabase_client = supabase_client
+        self.pool = None
+        self.products = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def get_pool(self) -> DriverPool:
+        with self._lock:
+            if self.pool is None:
+                self.pool = DriverPool(
+                    size=pdp_concurrency(self.retailer),
+                    max_pages=50,
+                    **getattr(self.module, "DRIVER_OPTIONS", {}),
+                )
+            return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.report()
+            self.pool.close()
+
+
+def _listing_job(ctx: RetailerContext, category_info: dict) -> Job:
+    label = f"{ctx.retailer} listing {category_info['role']}"
+    return Job(
+        ctx.retailer,
+        "listing",
+        label,
+        lambda: ctx.module.scrape_category_listing(ctx.get_pool(), category_info, ctx.supabase_client),
+    )
+
+
+def _pdp_job(ctx: RetailerContext, state: RunState, role: str, listing_jobs: list, queued) -> Job:
+    module = ctx.module
+
+    def run():
+        if queued is not None:
+            items = queued
+        else:
+            items = [item for job in listing_jobs for item in (job.result or [])]
+            items = ctx.seen.filter_new(ctx.retailer, items)
+            if module.PDP_LIMIT:
+                items = items[:module.PDP_LIMIT]
+            if not items:
+                print(f"  -> {ctx.retailer}/{role}: no new products. Skipping STEP 2.")
+                return []
+            state.save_queue(items)
+
+        data = module.scrape_details(
+            ctx.get_pool(),
+            items,
+            module.CATALOG_PATH_TEMPLATE.format(role=role),
+            ctx.seen,
+            state,
+            resumed=queued is not None,
+        )
+        ctx.products += len(data)
+        return data
+
+    return Job(ctx.retailer, "pdp", f"{ctx.retailer} PDPs {role}", run, deps=listing_jobs)
+
+
+def build_jobs(ctx: RetailerContext, resume: bool = False) -> list:
+    """
+    Turns a retailer's CATEGORIES_TO_SCRAPE into listing jobs followed by PDP jobs.
+
+    Retailers with PDP_PER_CATEGORY get one PDP job per category; the others get
+    a single PDP job that waits for every listing job, like their main() does.
+    With `resume`, runs that still have unfinished URLs skip their listing jobs.
+    """
+    module = ctx.module
+    categories = module.CATEGORIES_TO_SCRAPE
+    jobs = []
+
+    if module.PDP_PER_CATEGORY:
+        groups = [(f"{ctx.retailer}/{c['role']}", c["role"], [c]) for c in categories]
+    else:
+        groups = [(ctx.retailer, categories[-1]["role"], categories)]
+
+    for run_key, role, group in groups:
+        state = RunState(run_key)
+        queued = state.unfinished() if resume else None
+        listing_jobs = [] if queued is not None else [_listing_job(ctx, c) for c in group]
+        jobs.extend(listing_jobs)
+        jobs.append(_pdp_job(ctx, state, role, listing_jobs, queued))
+
+    return jobs
+
+
+class CrawlScheduler:
+    """
+    Runs the listing and PDP jobs of several retailers on a shared worker pool.
+
+    At most `per_domain` jobs of the same retailer run at once (so each site
+    sees the same load as a standalone run), and free workers are handed to
+    retailers round-robin, so one site's waits never leave the others idle.
+    """
+
+    def __init__(self, max_workers: int = 6, per_domain: int = 1):
+        self.max_workers = max_workers
+        self.per_domain = per_domain
+        self.jobs = []
+        self.contexts = {}
+
+    def add_retailer(self, ctx: RetailerContext, jobs: list):
+        self.contexts[ctx.retailer] = ctx
+        self.jobs.extend(jobs)
+
+    def _next_jobs(self, running: dict, turn: int) -> list:
+        """Picks ready jobs, one retailer at a time in rotating order, within the per-domain limit."""
+        retailers = list(self.contexts)
+        retailers = retailers[turn % len(retailers):] + retailers[:turn % len(retailers)]
+        picked = []
+        free = self.max_workers - sum(running.values())
+        progress = True
+        while free > 0 and progress:
+            progress = False
+            for retailer in retailers:
+                if free == 0:
+                    break
+                if running.get(retailer, 0) >= self.per_domain:
+                    continue
+                job = next((j for j in self.jobs if j.retailer == retailer and j.ready() and j not in picked), None)
+                if job:
+                    picked.append(job)
+                    running[retailer] = running.get(retailer, 0) + 1
+                    free -= 1
+                    progress = True
+        return picked
+
+    def _run_job(self, job: Job):
+        ctx = self.contexts[job.retailer]
+        if ctx.started is None:
+            ctx.started = time.perf_counter()
+        print(f"\n>>> [{job.retailer}] starting {job.label}")
+        return job.fn()
+
+    def _retailer_finished(self, retailer: str) -> bool:
+        return all(j.state in ("done", "failed", "cancelled") for j in self.jobs if j.retailer == retailer)
+
+    def run(self) -> dict:
+        start = time.perf_counter()
+        running = {}
+        futures = {}
+        turn = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                for job in self.jobs:
+                    if job.blocked():
+                        job.state = "cancelled"
+                        print(f"  -> ⚠️ [{job.retailer}] {job.label} cancelled: a listing job it needs failed.")
+
+                for job in self._next_jobs(running, turn):
+                    job.state = "running"
+                    futures[executor.submit(self._run_job, job)] = job
+                turn += 1
+
+                if not futures:
+                    break
+
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job = futures.pop(future)
+                    running[job.retailer] -= 1
+                    try:
+                        job.result = future.result()
+                        job.state = "done"
+                    except Exception as e:
+                        job.state = "failed"
+                        print(f"  -> ❌ [{job.retailer}] {job.label} failed: {e}")
+
+                for retailer, ctx in self.contexts.items():
+                    if ctx.finished is None and self._retailer_finished(retailer):
+                        ctx.finished = time.perf_counter()
+                        ctx.close()
+
+        return self.report(time.perf_counter() - start)
+
+    def report(self, wall_time: float) -> dict:
+        """Prints and returns the catalog refresh time of every retailer."""
+        summary = {}
+        print("\n" + "=" * 60)
+        print("Catalog refresh time per retailer")
+        print("=" * 60)
+        for retailer, ctx in self.contexts.items():
+            jobs = [j for j in self.jobs if j.retailer == retailer]
+            elapsed = (ctx.finished - ctx.started) if ctx.started and ctx.finished else 0.0
+            summary[retailer] = {
+                "refresh_s": round(elapsed, 1),
+                "products": ctx.products,
+                "jobs_done": sum(j.state == "done" for j in jobs),
+                "jobs_failed": sum(j.state in ("failed", "cancelled") for j in jobs),
+            }
+            print(
+                f"  {retailer:<8} {elapsed:8.1f}s  {ctx.products:5d} products  "
+                f"{summary[retailer]['jobs_done']}/{len(jobs)} jobs done"
+            )
+        serial = sum(s["refresh_s"] for s in summary.values())
+        print(f"✅ All retailers refreshed in {wall_time:.1f}s (sum of per-retailer times: {serial:.1f}s).")
+        summary["wall_time_s"] = round(wall_time, 1)
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh every retailer catalog in one scheduled crawl.")
+    parser.add_argument("--retailers", nargs="+", choices=list(RETAILER_SCRIPTS), default=list(RETAILER_SCRIPTS))
+    parser.add_argument("--workers", type=int, default=len(RETAILER_SCRIPTS), help="jobs running at the same time")
+    parser.add_argument("--per-domain", type=int, default=1, help="jobs of the same retailer running at the same time")
+    parser.add_argument("--resume", action="store_true", help="only scrape the products earlier runs did not finish")
+    args = parser.parse_args()
+
+    seen = SeenIndex()
+    supabase_client = None
+    if "hm" in args.retailers:
+        # The H&M listing parser checks Supabase for products already uploaded
+        from supabase_queries import setup_supabase_client
+        supabase_client = setup_supabase_client()
+
+    scheduler = CrawlScheduler(max_workers=args.workers, per_domain=args.per_domain)
+    for retailer in args.retailers:
+        ctx = RetailerContext(retailer, load_scraper(retailer), seen, supabase_client)
+        scheduler.add_retailer(ctx, build_jobs(ctx, resume=args.resume))
+
+    print(f"--- Crawl graph: {len(scheduler.jobs)} jobs for {', '.join(args.retailers)} ---")
+    scheduler.run()
+    write_report("crawl")
+
+
+if __name__ == "__main__":
+    main()
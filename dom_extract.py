@@ -0,0 +1,76 @@
+from phase_timing import span
+
+
+# Reads every field of a spec in one execute_script call.
+# "text" mirrors BeautifulSoup's get_text(strip=True): stripped text nodes joined with "".
+FIELD_EXTRACT_JS = """
+const spec = arguments[0];
+function text(el) {
+    const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+    let out = '';
+    let node;
+    while ((node = walker.nextNode())) {
+        const parent = node.parentNode && node.parentNode.nodeName;
+        if (parent === 'SCRIPT' || parent === 'STYLE') continue;
+        const t = node.nodeValue.trim();
+        if (t) out += t;
+    }
+    return out;
+}
+function value(el, get) {
+    if (get === 'html') return el.innerHTML;
+    if (get.startsWith('@')) return el.getAttribute(get.slice(1));
+    return text(el);
+}
+const result = {};
+for (const [name, field] of Object.entries(spec)) {
+    const get = field.get || 'text';
+    if (field.all) {
+        result[name] = Array.from(document.querySelectorAll(field.selector)).map(el => value(el, get));
+    } else {
+        const el = document.querySelector(field.selector);
+        result[name] = el ? value(el, get) : null;
+    }
+}
+return result;
+"""
+
+
+def extract_fields(driver, spec: dict) -> dict:
+    """
+    Returns the fields of `spec` from the page open in `driver`, in a single round trip.
+
+    `spec` maps a field name to {"selector": css, "get": "text" | "html" | "@attr", "all": bool}.
+    "get" defaults to "text"; with "all" the field is a list over every match,
+    otherwise the first match or None.
+
+    Example:
+        PDP_FIELDS = {
+            "json_ld": {"selector": 'script[type="application/ld+json"]', "get": "html"},
+            "composition": {"selector": "div.product-detail-composition"},
+        }
+        fields = extract_fields(driver, PDP_FIELDS)
+    """
+    with span("extract"):
+        return driver.execute_script(FIELD_EXTRACT_JS, spec) or {}
+
+
+def _soup_value(el, get: str):
+    if get == "html":
+        return el.decode_contents()
+    if get.startswith("@"):
+        return el.get(get[1:])
+    return el.get_text(strip=True)
+
+
+def extract_from_soup(soup, spec: dict) -> dict:
+    """extract_fields() for recorded HTML (HTTP fetch mode, page cache replays, benchmarks)."""
+    result = {}
+    for name, field in spec.items():
+        get = field.get("get", "text")
+        if field.get("all"):
+            result[name] = [_soup_value(el, get) for el in soup.select(field["selector"])]
+        else:
+            el = soup.select_one(field["selector"])
+            result[name] = _soup_value(el, get) if el else None
+    return result
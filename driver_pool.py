@@ -0,0 +1,260 @@
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+import undetected_chromedriver as uc
+
+from rate_control import pop_blocked_url
+
+
+def headless_default() -> bool:
+    """Drivers start headless unless DRIVER_HEADLESS=0 (e.g. to watch the browser while debugging blocks)."""
+    return os.environ.get("DRIVER_HEADLESS", "1").lower() not in ("0", "false", "no")
+
+
+def make_driver(version_main: int = 141, page_load_timeout: int = 60, headless: bool = None):
+    """Configures and initializes an undetectable Chrome driver shared by every retailer scraper."""
+
+    options = uc.ChromeOptions()
+
+    # Headless by default; blocked pages are retried in headed browsers (see DriverPool.run)
+    headless = headless_default() if headless is None else headless
+    options.add_argument("--window-size=1920,1080")
+
+    # --- PERFORMANCE/STABILITY (Keep these) ---
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--log-level=3")
+
+    # uc adds --headless=new itself and patches the HeadlessChrome user agent
+    driver = uc.Chrome(options=options, version_main=version_main, headless=headless)
+
+    # Add a network timeout (separate from script timeout)
+    driver.set_page_load_timeout(page_load_timeout) # Set a high limit for the page to load
+
+    return driver
+
+
+def driver_is_healthy(driver) -> bool:
+    """Returns True if the browser still answers a trivial script call."""
+    try:
+        driver.execute_script("return 1;")
+        return True
+    except Exception:
+        return False
+
+
+class DriverPool:
+    """
+    Keeps N warm Chrome drivers and leases them to callers.
+
+    A driver is recycled (quit and replaced by a fresh one) after it has served
+    `max_pages` leases, or as soon as a lease ends with an exception or the
+    driver fails its health check. Every lease records how long the caller
+    waited for a free driver. If Chrome fails to start a replacement, the
+    slot stays free and the next lease spawns into it; a lease never waits
+    longer than `lease_timeout` seconds.
+
+    Headless pools also own a small pool of `headed_fallback` headed browsers,
+    started on first use: run() repeats a page there when the headless
+    browser got a block or challenge page.
+
+    Usage:
+        with DriverPool(size=2) as pool:
+            with pool.lease() as driver:
+                driver.get(url)
+            data = pool.run(fetch_and_scroll, url, main_category, role)
+    """
+
+    def __init__(self, size: int = 1, max_pages: int = 50, driver_factory=make_driver, headed_fallback: int = 1,
+                 lease_timeout: float = 600, **driver_kwargs):
+        self.size = size
+        self.max_pages = max_pages
+        self.lease_timeout = lease_timeout
+        self.driver_factory = driver_factory
+        self.driver_kwargs = driver_kwargs
+        self.headless = driver_kwargs.get("headless", headless_default())
+        self.headed_fallback = headed_fallback if self.headless else 0
+        self._headed = None
+        self._headed_lock = threading.Lock()
+        self.fallbacks = 0
+
+        self._idle = queue.Queue()
+        self._free_slots = 0
+        self._pages_served = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.lease_waits = []
+        self.recycled = 0
+
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+        print(f"✅ Driver pool ready with {size} warm browser(s).")
+
+    def _spawn(self):
+        driver = self.driver_factory(**self.driver_kwargs)
+        with self._lock:
+            self._pages_served[id(driver)] = 0
+        return driver
+
+    def _retire(self, driver, recycled: bool = True):
+        with self._lock:
+            self._pages_served.pop(id(driver), None)
+            if recycled:
+                self.recycled += 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _replace(self):
+        """Fills a slot whose driver was retired; if Chrome fails to start, the next lease retries."""
+        try:
+            self._idle.put(self._spawn())
+        except Exception as e:
+            print(f"  -> ⚠️ Could not start a replacement driver ({e}). The next lease will retry.")
+            with self._lock:
+                self._free_slots += 1
+
+    def _take(self, timeout: float):
+        """Returns an idle driver, or None after claiming a free slot to spawn into."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                if self._free_slots:
+                    self._free_slots -= 1
+                    return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No driver became free within {timeout}s.")
+            try:
+                # Short waits, so a slot freed by a failed spawn is noticed too
+                return self._idle.get(timeout=min(remaining, 1.0))
+            except queue.Empty:
+                pass
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        """Yields a healthy driver; returns it to the pool (or recycles it) afterwards."""
+        if self._closed:
+            raise RuntimeError("Driver pool is closed.")
+
+        start = time.perf_counter()
+        driver = self._take(self.lease_timeout if timeout is None else timeout)
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.lease_waits.append(waited)
+
+        if driver is not None and not driver_is_healthy(driver):
+            print("  -> ⚠️ Leased driver failed health check. Replacing it.")
+            self._retire(driver)
+            driver = None
+        if driver is None:
+            try:
+                driver = self._spawn()
+            except Exception:
+                with self._lock:
+                    self._free_slots += 1
+                raise
+
+        crashed = False
+        try:
+            yield driver
+        except Exception:
+            crashed = True
+            raise
+        finally:
+            with self._lock:
+                self._pages_served[id(driver)] = self._pages_served.get(id(driver), 0) + 1
+                served = self._pages_served[id(driver)]
+
+            if self._closed:
+                self._retire(driver, recycled=False)
+            elif crashed or served >= self.max_pages or not driver_is_healthy(driver):
+                self._retire(driver)
+                self._replace()
+            else:
+                self._idle.put(driver)
+
+    def _headed_pool(self):
+        with self._headed_lock:
+            if self._headed is None:
+                print(f"  -> Starting {self.headed_fallback} headed fallback browser(s).")
+                self._headed = DriverPool(
+                    size=self.headed_fallback,
+                    max_pages=self.max_pages,
+                    driver_factory=self.driver_factory,
+                    lease_timeout=self.lease_timeout,
+                    **{**self.driver_kwargs, "headless": False},
+                )
+            return self._headed
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Runs fn(driver, *args, **kwargs) on a leased driver and returns its result.
+
+        If a navigation inside `fn` hit a block or challenge page (see
+        rate_control.controlled_get) on a headless driver, `fn` is run once
+        more on a headed fallback browser and that result is returned.
+        """
+        pop_blocked_url()
+        with self.lease() as driver:
+            result = fn(driver, *args, **kwargs)
+        blocked = pop_blocked_url()
+        if not blocked or not self.headed_fallback:
+            return result
+
+        print(f"  -> ⚠️ Blocked in headless mode on {blocked}. Retrying in a headed browser.")
+        with self._lock:
+            self.fallbacks += 1
+        with self._headed_pool().lease() as driver:
+            result = fn(driver, *args, **kwargs)
+        if pop_blocked_url():
+            print(f"  -> ❌ Still blocked in the headed browser on {blocked}.")
+        return result
+
+    def report(self) -> dict:
+        """Summarises lease wait times, recycling and headed fallbacks."""
+        waits = sorted(self.lease_waits)
+        summary = {
+            "leases": len(waits),
+            "recycled": self.recycled,
+            "headless": self.headless,
+            "headed_fallbacks": self.fallbacks,
+            "wait_total_s": round(sum(waits), 3),
+            "wait_max_s": round(waits[-1], 3) if waits else 0.0,
+            "wait_p50_s": round(waits[len(waits) // 2], 3) if waits else 0.0,
+        }
+        print(
+            f"Driver pool: {summary['leases']} leases, {summary['recycled']} recycled, "
+            f"waited {summary['wait_total_s']}s total (max {summary['wait_max_s']}s), "
+            f"{'headless' if self.headless else 'headed'} with {summary['headed_fallbacks']} headed fallback(s)."
+        )
+        return summary
+
+    def close(self):
+        """Quits every idle driver. Drivers still leased are quit when returned."""
+        self._closed = True
+        if self._headed is not None:
+            self._headed.close()
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._retire(driver, recycled=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.report()
+        self.close()
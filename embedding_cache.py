@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+from vector_codec import EMBEDDING_COLUMNS
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache")
+
+
+class EmbeddingCache:
+    """
+    Local copy of product_data, one partition per main category.
+
+    Each partition directory holds a manifest.json and generation directories
+    with one <column>.npy matrix per embedding column (opened memory-mapped)
+    and the other columns in meta.parquet. The manifest names the current
+    generation and the watermark it was fetched at: the category's row count
+    and latest `updated_at`. A refresh writes a new generation and only then
+    swaps the manifest, so a crash mid-refresh leaves the old partition
+    readable. A partition checked less
+    than `max_age` seconds ago is used without touching the network; after
+    that one count query decides whether it is still current, and the
+    category is downloaded again only if rows were added, removed or updated.
+
+    Usage:
+        cache = EmbeddingCache()
+        df = cache.products_in_main_category(client, "tops", columns=["id", "title", "url", "img_embedding"])
+        matrix = cache.matrix("tops", "img_embedding")   # (N, 512) float32, memory-mapped
+    """
+
+    def __init__(self, path: str = None, max_age: float = None, watermark_column: str = "updated_at"):
+        self.path = path or os.environ.get("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_age = max_age if max_age is not None else float(os.environ.get("EMBEDDING_CACHE_MAX_AGE", "300"))
+        self.watermark_column = watermark_column
+        self._lock = threading.Lock()
+
+    # --- PARTITIONS ---
+
+    def _partition_dir(self, table_name: str, main_category: str) -> str:
+        slug = re.sub(r"[^\w.-]+", "_", main_category).strip("_") or "category"
+        digest = hashlib.sha1(main_category.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.path, table_name, f"{slug}-{digest}")
+
+    def _read_manifest(self, part: str):
+        try:
+            with open(os.path.join(part, "manifest.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, part: str, manifest: dict):
+        path = os.path.join(part, "manifest.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _store(self, part: str, df: pd.DataFrame, watermark: dict, all_columns: bool) -> dict:
+        """
+        Writes a partition into a new generation directory, then points the manifest at it.
+
+        Until the manifest is replaced, readers (and a run after a crash) keep
+        seeing the previous generation; older generations are removed afterwards.
+        """
+        generation = f"gen-{time.time_ns()}-{threading.get_ident()}"
+        gen_dir = os.path.join(part, generation)
+        os.makedirs(gen_dir)
+        vector_columns = [name for name in df.columns if name in EMBEDDING_COLUMNS]
+        for name in vector_columns:
+            cells = df[name].tolist()
+            dim = next((len(cell) for cell in cells if cell is not None), 0)
+            matrix = np.full((len(cells), dim), np.nan, dtype=np.float32)
+            for i, cell in enumerate(cells):
+                if cell is not None:
+                    matrix[i] = cell
+            np.save(os.path.join(gen_dir, f"{name}.npy"), matrix)
+
+        df.drop(columns=vector_columns).to_parquet(os.path.join(gen_dir, "meta.parquet"), index=False)
+
+        now = time.time()
+        manifest = {
+            "generation": generation,
+            "columns": list(df.columns),
+            "vector_columns": vector_columns,
+            "all_columns": all_columns,
+            "rows": len(df),
+            "watermark": watermark,
+            "fetched_at": now,
+            "checked_at": now,
+        }
+        self._write_manifest(part, manifest)
+
+        # Generations left by earlier refreshes or crashed ones (open memory maps stay valid on POSIX)
+        for entry in os.listdir(part):
+            if entry.startswith("gen-") and entry != generation:
+                shutil.rmtree(os.path.join(part, entry), ignore_errors=True)
+        return manifest
+
+    def _load(self, part: str, manifest: dict) -> pd.DataFrame:
+        gen_dir = os.path.join(part, manifest["generation"])
+        df = pd.read_parquet(os.path.join(gen_dir, "meta.parquet"))
+        for name in manifest["vector_columns"]:
+            matrix = np.load(os.path.join(gen_dir, f"{name}.npy"), mmap_mode="r")
+            missing = np.isnan(matrix[:, 0]) if matrix.shape[1] else np.ones(len(matrix), dtype=bool)
+            df[name] = pd.Series([None if miss else row for row, miss in zip(matrix, missing)], index=df.index, dtype=object)
+        return df[manifest["columns"]]
+
+    # --- WATERMARK ---
+
+    def watermark(self, supabase_client, table_name: str, main_category: str) -> dict:
+        """Row count and latest watermark_column value of a category (one small request)."""
+        try:
+            response = (
+                supabase_client.table(table_name)
+                .select(self.watermark_column, count="exact")
+                .eq("main_category", main_category)
+                .order(self.watermark_column, desc=True)
+                .limit(1)
+                .execute()
+            )
+            updated_at = response.data[0][self.watermark_column] if response.data else None
+        except Exception as e:
+            # Tables without the column: fall back to the row count alone
+            print(f"  -> ⚠️ No '{self.watermark_column}' watermark on '{table_name}', using the row count only: {e}")
+            response = (
+                supabase_client.table(table_name)
+                .select("id", count="exact")
+                .eq("main_category", main_category)
+                .limit(1)
+                .execute()
+            )
+            updated_at = None
+        return {"rows": response.count, "updated_at": updated_at}
+
+    # --- READS ---
+
+    def products_in_main_category(self, supabase_client, main_category: str, table_name: str = "product_data",
+                                  columns: list = None, offline: bool = False) -> pd.DataFrame:
+        """
+        query_products_in_main_category() served from the local partition when it is current.
+
+        Any request whose columns are a subset of the cached ones is served
+        from the partition. A refresh keeps every column cached so far and adds
+        the requested ones, so callers with different projections share one
+        partition instead of overwriting each other's.
+
+        With offline=True the network is never used: the partition is returned
+        as it is, or an empty DataFrame if there is none.
+        """
+        from supabase_queries import query_products_in_main_category
+
+        start = time.perf_counter()
+        part = self._partition_dir(table_name, main_category)
+        with self._lock:
+            manifest = self._read_manifest(part)
+            watermark = None
+            # Manifests without a generation predate generation directories: fetch again
+            usable = manifest is not None and "generation" in manifest and (
+                manifest["all_columns"] if not columns else set(columns) <= set(manifest["columns"])
+            )
+
+            if usable:
+                current = offline or time.time() - manifest["checked_at"] < self.max_age
+                if not current:
+                    watermark = self.watermark(supabase_client, table_name, main_category)
+                    current = watermark == manifest["watermark"]
+                    if current:
+                        manifest["checked_at"] = time.time()
+                        self._write_manifest(part, manifest)
+                    else:
+                        print(
+                            f"  -> Embedding cache for '{main_category}' is stale "
+                            f"({manifest['watermark']['rows']} -> {watermark['rows']} rows, "
+                            f"updated {manifest['watermark']['updated_at']} -> {watermark['updated_at']}). Refreshing..."
+                        )
+                if current:
+                    df = self._load(part, manifest)
+                    df = df[list(columns)] if columns else df
+                    print(f"✅ Loaded {len(df)} records of '{main_category}' from the embedding cache in {(time.perf_counter() - start) * 1000:.0f} ms.")
+                    return df
+
+            if offline:
+                print(f"❌ No cached partition for '{main_category}' with the requested columns (offline).")
+                return pd.DataFrame(columns=columns or [])
+
+            # Fetch the union of the cached and requested columns (all of them if either side wants all)
+            fetch_columns = None
+            if columns and not (manifest and manifest.get("all_columns")):
+                fetch_columns = list(dict.fromkeys([*(manifest["columns"] if manifest else []), *columns]))
+
+            # Watermark first: rows changed while we download show up as stale next time
+            watermark = watermark or self.watermark(supabase_client, table_name, main_category)
+            df = query_products_in_main_category(supabase_client, main_category, table_name, columns=fetch_columns)
+            self._store(part, df, watermark, all_columns=fetch_columns is None)
+            print(f"  -> Cached {len(df)} records of '{main_category}' ({len(df.columns)} columns) in {(time.perf_counter() - start):.1f}s.")
+            return df[list(columns)] if columns else df
+
+    def matrix(self, main_category: str, column: str, table_name: str = "product_data") -> np.ndarray:
+        """The (N, D) memory-mapped matrix of an embedding column, in the row order of the partition's frame."""
+        part = self._partition_dir(table_name, main_category)
+        manifest = self._read_manifest(part)
+        if not manifest or column not in manifest.get("vector_columns", ()):
+            raise FileNotFoundError(f"No cached '{column}' matrix for '{main_category}'.")
+        return np.load(os.path.join(part, manifest["generation"], f"{column}.npy"), mmap_mode="r")
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def embedding_cache() -> EmbeddingCache:
+    """The process-wide EmbeddingCache."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = EmbeddingCache()
+        return _CACHE
+
+
+def cached_products_in_main_category(supabase_client, main_category: str, table_name: str = "product_data",
+                                     columns: list = None) -> pd.DataFrame:
+    """Drop-in for supabase_queries.query_products_in_main_category backed by the process-wide cache."""
+    return embedding_cache().products_in_main_category(supabase_client, main_category, table_name, columns=columns)
@@ -3,11 +3,11 @@ import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import re
 import json
 import time
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 # --- ADD THESE 4 LINES ---
@@ -16,7 +16,21 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 import undetected_chromedriver as uc
 import random
-from supabase_queries import check_if_value_exists_in_colum, setup_supabase_client
+from supabase_queries import setup_supabase_client, values_existing_in_column
+from driver_pool import DriverPool
+from scroll_loader import GRID_SELECTORS, scroll_until_stable
+from pdp_workers import pdp_concurrency, pdp_fetch_mode, pdp_lean_profile, run_pdp_stage
+from seen_index import SeenIndex
+from checkpoint_writer import CheckpointWriter
+from run_state import RunState, resume_requested
+from http_fetch import NeedsBrowser, make_http_prefetch
+from html_parsing import make_soup
+from rate_control import controlled_get
+from phase_timing import page_source, set_context, timed, write_report
+from page_cache import LISTING, PDP, record_driver_page, record_page
+from page_ready import wait_ready
+from listing_pages import fetch_listing_pages
+from image_urls import canonical_image_url, content_key, srcset_urls
 
 
 
@@ -159,96 +173,42 @@ CATEGORIES_TO_SCRAPE = [
     # }    
 ]
 
-import undetected_chromedriver as uc
-from selenium.webdriver.chrome.options import Options
-
-def make_driver():
-    """Configures and initializes an undetectable Chrome driver for H&M."""
-    
-    options = uc.ChromeOptions()
-    
-    # --- CRUCIAL: TEMPORARILY REMOVE HEADLESS FOR DEBUGGING ---
-    # When debugging blocks, it is essential to see the browser:
-    # options.add_argument("--headless=new") # COMMENT OUT THIS LINE
-    options.add_argument("--window-size=1920,1080")
-    
-    # --- PERFORMANCE/STABILITY (Keep these) ---
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--log-level=3") 
-
-    # --- ADVANCED STEALTH BEHAVIOR ---
-    # This setting can sometimes help with network blocks
-    # options.add_argument("--disable-blink-features=AutomationControlled") # uc handles this, but redundancy can help
-    
-    # NOTE: uc handles the User-Agent and 'webdriver' property spoofing.
-    
-    # Initialize the driver. The argument 'browser_executable_path' is useful 
-    # if the default location is wrong, but typically not needed.
-    # Force driver for Chrome 135
-    driver = uc.Chrome(options=options, version_main=141)
-    
-    # Add a network timeout (separate from script timeout)
-    driver.set_page_load_timeout(60) # Set a high limit for the page to load
-    
-    return driver
-
-
-def fully_scroll(driver, pause=0, max_loops=8):
-    """Scrolls down the page until no new content is loaded."""
 
-    loops = 0
-    while loops < max_loops:
-
-        driver.execute_script("window.scrollBy(0, 850);")
-        time.sleep(pause)
-
-        loops += 1
-        print(f"Loops done: {loops}/{max_loops}")
 
 def pick_image_urls(img_tag):
-    """Extracts and normalizes image URLs from common image attributes."""
+    """
+    Extracts and normalizes image URLs from common image attributes.
+
+    data-src, srcset and src usually hold the same picture at different
+    widths; only the first URL of each distinct image (see image_urls.content_key) is kept.
+    """
     urls = []
+    keys = set()
 
-    def normalize(u: str):
-        if not u:
-            return None
-        u = u.strip()
-        if not u:
-            return None
-        if u.startswith("http://") or u.startswith("https://"):
-            return u
-        # H&M specific normalization
-        return urljoin("https://image.hm.com/", u.lstrip("/"))
+    def add(u: str):
+        u = canonical_image_url(u, "hm")
+        key = content_key(u, "hm") if u else None
+        if key and key not in keys:
+            keys.add(key)
+            urls.append(u)
 
     # data-src
-    ds = img_tag.get("data-src")
-    if ds:
-        u = normalize(ds)
-        if u:
-            urls.append(u)
+    add(img_tag.get("data-src"))
 
     # srcset / data-srcset (first candidate)
-    srcset = img_tag.get("data-srcset") or img_tag.get("srcset")
-    if srcset:
-        first = srcset.split(",")[0].strip().split(" ")[0]
-        u = normalize(first)
-        if u and u not in urls:
-            urls.append(u)
+    candidates = srcset_urls(img_tag.get("data-srcset") or img_tag.get("srcset"))
+    if candidates:
+        add(candidates[0])
 
     # src (fallback)
-    src = img_tag.get("src")
-    if src:
-        u = normalize(src)
-        if u and u not in urls:
-            urls.append(u)
+    add(img_tag.get("src"))
 
     return urls
 
 # --- MODIFIED: Added main_category and role parameters ---
-def scrape_listing_page(html: str, main_category: str, role: str, supabase_client):
+def scrape_listing_page(html: str, main_category: str, role: str, supabase_client=None):
     """Parses the HTML content to extract product details."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     results = []
 
     for li in soup.select('ul[data-elid="product-grid"] li'):
@@ -273,10 +233,6 @@ def scrape_listing_page(html: str, main_category: str, role: str, supabase_clien
             href = link_tag["href"].strip()
             product_link = urljoin(BASE_URL, href)
 
-        if check_if_value_exists_in_colum(supabase_client, "product_data", "url", product_link):
-            # print(f"  -> Skipping already in DB URL: {product_link}")
-            continue
-
 
         # NOTE: Price is stripped of the currency symbol here to be a pure number string
         results.append({
@@ -289,142 +245,116 @@ def scrape_listing_page(html: str, main_category: str, role: str, supabase_clien
             "role": role
         })
 
-    return results
+    # Offline replays (see page_cache) have no client and keep every tile
+    if supabase_client is None:
+        return results
 
-# --- MODIFIED: Added main_category and role parameters ---
-def scrap_images_titles_links(url, main_category, role, supabase_client):
-    """Drives the Selenium browser to fetch and scroll the page."""
-    print(f"Scraping {url}")
-    driver = make_driver()
-    try:
-        driver.get(url)
-        # time.sleep(5)
-        fully_scroll(driver, pause=0.8, max_loops=8)
-        soup_html = driver.page_source
-        
-
-    finally:
-        driver.quit()
+    # One bulk lookup for the whole page instead of one request per tile
+    already_in_db = values_existing_in_column(supabase_client, "product_data", "url", [r["url"] for r in results])
+    if already_in_db:
+        print(f"  -> Skipping {len(already_in_db)} products already in DB.")
 
-    # --- MODIFIED: Pass category data to parser ---
-    return scrape_listing_page(soup_html, main_category, role, supabase_client)
-
-
-def click_desc_button(driver):
+    return [r for r in results if r["url"] not in already_in_db]
 
-    BUTTON_SELECTOR = (By.ID, "toggle-descriptionAccordion")
-    
-   
+def load_listing_html(driver, url):
+    """Opens and scrolls one listing page; run through pool.run() so blocked pages are retried headed."""
+    controlled_get(driver, url)
+    # time.sleep(5)
+    scroll_until_stable(driver, GRID_SELECTORS["hm"], pause=0.8)
+    return page_source(driver)
 
-    # # # 2. Wait until the button is clickable
-    wait = WebDriverWait(driver, 5)
-    
-    button = wait.until(
-        EC.element_to_be_clickable(BUTTON_SELECTOR)
-    )
-    
-    try:
-        # 1. Wait for and find the clickable element
-        button = WebDriverWait(driver, 5).until(
-            EC.element_to_be_clickable(BUTTON_SELECTOR)
-        )
-        
-        # 2. Click it
-        button.click()
-        
-        # 3. Add a short delay and return success
-        # time.sleep(1)
-        return True 
-        
-    except Exception:
-        return False
+# --- MODIFIED: Added main_category and role parameters ---
+@timed("wait")
+def scrap_images_titles_links(pool, url, main_category, role, supabase_client):
+    """Drives a pooled Selenium browser to fetch and scroll the page; returns (items, page html)."""
+    print(f"Scraping {url}")
+    set_context(category=role)
+    soup_html = pool.run(load_listing_html, url)
+    record_page(url, LISTING, html=soup_html, role=role, main_category=main_category)
 
+    # --- MODIFIED: Pass category data to parser ---
+    return scrape_listing_page(soup_html, main_category, role, supabase_client), soup_html
+
+
+PAGE_PARAM_PATTERN = re.compile(r"[?&]page=(\d+)")
+PRODUCT_COUNT_PATTERN = re.compile(r"([\d,.]+)\s+(?:products|items)\b", re.IGNORECASE)
+
+
+def last_listing_page(html: str):
+    """
+    Reads the number of the last listing page from page 1, or None if the page does not say.
+
+    Uses the highest ?page=N link of the pagination widget, else the
+    "N products" counter divided by the tiles on the page.
+    """
+    soup = make_soup(html)
+    pages = [
+        int(match.group(1))
+        for link in soup.select('a[href*="page="]')
+        for match in [PAGE_PARAM_PATTERN.search(link.get("href", ""))]
+        if match
+    ]
+    if pages:
+        return max(pages)
+
+    tiles = len(soup.select(GRID_SELECTORS["hm"]))
+    counter = soup.find(string=PRODUCT_COUNT_PATTERN)
+    if counter and tiles:
+        total = int(re.sub(r"[,.]", "", PRODUCT_COUNT_PATTERN.search(counter).group(1)))
+        return max(1, -(-total // tiles))
+    return None
+
+
+def click_desc_button(driver) -> bool:
+    """Opens the description accordion; returns False if the page has none."""
+    return bool(driver.execute_script(
+        "const button = document.getElementById('toggle-descriptionAccordion');"
+        "if (button) { button.click(); } return button !== null;"
+    ))
+
+# Browser version of page_lists_pieces
+PIECES_JS = """
+return Array.from(document.querySelectorAll('dl[class^="ad91df"] > div[class^="cd043b"] > dt'))
+    .some(dt => dt.textContent.includes('Pieces'));
+"""
+
+@timed("pairs_check")
 def check_if_2_pairs(driver):
+    """True if the description list has a 'Pieces' term (multi-packs are not scraped)."""
+    if not click_desc_button(driver):
+        return False
 
-    if click_desc_button(driver):
-
-        # Correction of your XPath:
-        DT_SELECTOR = (By.XPATH, 
-                    '//dl[starts-with(@class, "ad91df")]/div[starts-with(@class, "cd043b")]/dt[contains(text(), "Pieces")]')
-        
-        print("-> Searching for <dt> tag containing 'Pieces' or 'Pairs'...")
-        
-        
-        try:
-            # 1. Wait for and locate the specific <dt> element
-            wait_dt = WebDriverWait(driver, 0.5)
-            dt_element = wait_dt.until(
-                EC.presence_of_element_located(DT_SELECTOR)
-            )
-            
-            # 2. Extract the text content from the <dt> (the term itself)
-            pairs_term = dt_element.text.strip()
-            
-            # 3. Use the sibling (<dd>) of the parent <div> to get the value
-            # This XPath finds the <dd> element that is a sibling of the <dt>'s parent (the <div>)
-            # This is speculative and might require adjustment based on the exact <dd> location.
-            try:
-                # A more common structure: Find the next sibling of the <dt>
-                # If the structure is <dt>... </dt> <dd>...</dd> inside the div:
-                dd_element = dt_element.find_element(By.XPATH, './following-sibling::dd')
-                pairs_value = dd_element.text.strip()
-                full_data = f"{pairs_term}: {pairs_value}"
-            except:
-                # If no <dd> is found, just use the <dt> text
-                full_data = pairs_term
-
-            return True
-            
-        except Exception as e:
-
-            return False
+    print("-> Searching for <dt> tag containing 'Pieces' or 'Pairs'...")
+    # The list renders when the accordion opens; move on as soon as it is there
+    wait_ready(driver, selector='dl[class^="ad91df"]', timeout=2, idle_ms=200)
+    return bool(driver.execute_script(PIECES_JS))
 
-    return False
    
 
         
 
 
 
+@timed("wait")
 def scrape_product_detail_via_schema(driver, product_url):
     print(f"  -> Fetching details for: {product_url}")
-    details_dict = {} # <-- NOTE: Renamed to avoid confusion
     SCHEMA_ID = 'product-schema'
     MAIN_CONTENT_ID = 'main-content'
     json_string = None
     
     try:
-        driver.get(product_url)
-        wait = WebDriverWait(driver, 5) 
-
-        # 1. WAIT FOR PAGE STABILITY 
-        wait.until(
-            EC.presence_of_element_located((By.ID, MAIN_CONTENT_ID))
-        )
-        print("  -> Main content container found via Presence. Adding buffer...")
-        # time.sleep(1.5) 
-
-        # 2. POPUP/COOKIE BANNER HANDLING (Code omitted for brevity, assumed correct)
-        try:
-            cookie_accept_selector = (By.ID, "onetrust-accept-btn-handler")
-            cookie_button = WebDriverWait(driver, 0.5).until(EC.element_to_be_clickable(cookie_accept_selector))
-            cookie_button.click()
-            print("  -> Cookie banner accepted/closed.")
-            # time.sleep(1) 
-        except Exception:
-            print("  -> No cookie banner detected or could not close it. Continuing.")
-            pass
+        controlled_get(driver, product_url)
+        # 1. WAIT FOR THE SCHEMA AND A QUIET PAGE (the cookie banner is dismissed on the way, see page_ready)
+        if not wait_ready(driver, RETAILER, selector=f"#{SCHEMA_ID}", timeout=5)["ready"]:
+            raise TimeoutError("no product schema on the page")
 
         if  check_if_2_pairs(driver):
             return None
-  
-            
-        # 3. WAIT FOR THE SPECIFIC SCHEMA SCRIPT 
-        schema_element = wait.until(
-            EC.presence_of_element_located((By.ID, SCHEMA_ID))
-        )
+
+        schema_element = driver.find_element(By.ID, SCHEMA_ID)
         print("  -> ✅ Product Schema script found after stabilization.")
         json_string = schema_element.get_attribute('innerHTML')
+        record_driver_page(driver, product_url, json_ld=json_string)
 
             
 
@@ -432,6 +362,13 @@ def scrape_product_detail_via_schema(driver, product_url):
         print(f"  -> ❌ ERROR during navigation/wait: {e}")
         return {} 
         
+    return parse_product_detail(json_string)
+
+
+def parse_product_detail(json_string):
+    """Maps the H&M JSON-LD schema string to our product fields."""
+    details_dict = {}
+
     # --- JSON PROCESSING (The core fix is here) ---
     if json_string:
         try:
@@ -463,121 +400,162 @@ def scrape_product_detail_via_schema(driver, product_url):
     # --- CRITICAL FIX 3: RETURN THE DICTIONARY ---
     return details_dict
 
-def products_already_in_database(filepath):
-    """Loads previously scraped product URLs from a JSON file."""
+def page_lists_pieces(detail_soup):
+    """
+    Static-HTML version of check_if_2_pairs: looks for the 'Pieces' term in the description list.
+
+    Returns None when the list is not in the HTML at all, since the browser
+    path only sees it after clicking the accordion open.
+    """
+    if detail_soup.select_one('dl[class^="ad91df"]') is None:
+        return None
+    for dt in detail_soup.select('dl[class^="ad91df"] > div[class^="cd043b"] > dt'):
+        if "Pieces" in dt.get_text():
+            return True
+    return False
+
+
+def scrape_product_detail_via_http(json_string, html):
+    """HTTP fetch mode: parses a PDP downloaded by http_fetch instead of a live browser."""
+    pieces = page_lists_pieces(make_soup(html))
+    if pieces is None:
+        # The description list only renders client-side here: let the browser open the accordion and check
+        raise NeedsBrowser("description list not in the static HTML")
+    if pieces:
+        return None
+    return parse_product_detail(json_string)
+
+
+# Retailer key used by the shared modules (pdp_workers, seen_index, crawl_scheduler)
+RETAILER = "hm"
+# --- MODIFICATION 1: Set to 5 to test 5 pages per category ---
+MAX_PAGES_PER_CATEGORY = 5
+PDP_LIMIT = None
+# All categories go through one PDP stage into one catalog file, named after the last category
+PDP_PER_CATEGORY = False
+CATALOG_PATH_TEMPLATE = "h&m_catalog/donna/{role}.json"
+# Listing parser used when replaying cached pages (see page_cache)
+LISTING_PARSER = scrape_listing_page
+# Empty results (navigation or wait errors) are not kept: the item is marked failed and retried by --resume
+PDP_KEEP = bool
+
+
+def scrape_category_listing(pool, category_info, supabase_client=None):
+    """STEP 1 for one category: returns the listing items of its first MAX_PAGES_PER_CATEGORY pages."""
+    slug = category_info["slug"]
+    main_cat = category_info["main_category"]
+    role = category_info["role"]
+    set_context(category=role)
+
+    page_urls = []
+    for i in range(1, MAX_PAGES_PER_CATEGORY + 1): 
+        if main_cat in ["shoes"]:
+            page_url = CATEGORY_URL_SHOES_TEMPLATE.format(slug=slug, page=i)
+        elif main_cat in ["accessories"]:
+            if i == 1:
+                page_url = CATEGORY_URL_ACCESORIES_TEMPLATE.format(slug=slug, page="")
+            else:
+                page_url = CATEGORY_URL_ACCESORIES_TEMPLATE.format(slug=slug, page=i)
+        else:
+            page_url = CATEGORY_URL_ABBILIGIMENTO_TEMPLATE.format(slug=slug, page=i)
+        page_urls.append(page_url)
+
+    def fetch_page(page_url):
+        data, html = scrap_images_titles_links(pool, page_url, main_cat, role, supabase_client)
+        print(f"  -> Found {len(data)} items on {page_url} which aren't in Database.")
+        return data, html
+
+    # Page 1 tells how many pages there are; the rest are fetched in parallel on the pooled drivers
+    all_data = fetch_listing_pages(page_urls, fetch_page, last_page=last_listing_page, concurrency=pool.size)
+
+    return all_data
+
+
+def scrape_details(pool, all_data, catalog_path, seen, state, resumed=False):
+    """STEP 2: scrapes the PDPs of `all_data` and writes them to `catalog_path`."""
+    # Finished products are streamed to a JSONL checkpoint and compacted at the end
+    checkpoint = CheckpointWriter(catalog_path, resume=resumed)
+
+    def finish(item, details):
+        checkpoint.append({**item, **details})
+
+    run_pdp_stage(
+        pool,
+        all_data,
+        scrape_product_detail_via_schema,
+        concurrency=pdp_concurrency(RETAILER),
+        on_done=finish,
+        on_status=state.mark,
+        lean=pdp_lean_profile(RETAILER),
+        prefetch=make_http_prefetch(scrape_product_detail_via_http, script_id="product-schema") if pdp_fetch_mode() == "http" else None,
+        keep=PDP_KEEP,
+    )
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    scraped_urls = {item['url'] for item in data if 'url' in item}
-    # print(scraped_urls)
-    print(f"Loaded {len(scraped_urls)} previously scraped product URLs.")
-    return scraped_urls
+    # Read before finish() clears the queue
+    done = state.done_urls()
+    data = state.finish(checkpoint)
+    # Products count as seen only once they are in the catalog file, and only if they were scraped successfully
+    seen.mark_done(RETAILER, [record for record in data if record.get('url') in done])
+    return data
 
 
-def main():
+def main(resume: bool = False):
     """Orchestrates the scraping process."""
     all_data = []
 
     supabase_client = setup_supabase_client()
+
+    # Warm browsers shared by the listing and PDP phases
+    pool = DriverPool(size=pdp_concurrency("hm"), max_pages=50)
+    # Products scraped in earlier runs are not queued again
+    seen = SeenIndex()
     
-    # --- STEP 1: Scrape Listing Pages for URLs and basic info ---
-    print("--- STEP 1: Scraping Listing Pages for URLs and basic info ---")
-
-    # --- MODIFICATION 1: Set to 5 to test 5 pages per category ---
-    MAX_PAGES_PER_CATEGORY = 5
-
-    # --- MODIFIED LOOP STRUCTURE ---
-    for category_info in CATEGORIES_TO_SCRAPE:
-        slug = category_info["slug"]
-        cat_name = category_info["name"]
-        main_cat = category_info["main_category"]
-        role = category_info["role"]
+    # The listing queue and per-URL status survive crashes (see run_state)
+    state = RunState("hm")
+    queued = state.unfinished() if resume else None
+    if queued is not None:
+        print(f"--- Resuming: {len(queued)} unfinished products, skipping STEP 1 ---")
+        all_data = queued
+    else:
+        # --- STEP 1: Scrape Listing Pages for URLs and basic info ---
+        print("--- STEP 1: Scraping Listing Pages for URLs and basic info ---")
+
+        # --- MODIFIED LOOP STRUCTURE ---
+        for category_info in CATEGORIES_TO_SCRAPE:
+            print(f"\n--- Scraping Category: {category_info['name']} ({category_info['slug']}) ---")
+            all_data.extend(scrape_category_listing(pool, category_info, supabase_client))
         
-        print(f"\n--- Scraping Category: {cat_name} ({slug}) ---")
-
-        # Loop through the pages for this category
-        for i in range(1, MAX_PAGES_PER_CATEGORY + 1): 
-            print(f"  -> Loading Page {i}...")
-
-            if main_cat in ["shoes"]:
-                page_url = CATEGORY_URL_SHOES_TEMPLATE.format(slug=slug, page=i)
-            elif main_cat in ["accessories"]:
-                if i == 1:
-                    page_url = CATEGORY_URL_ACCESORIES_TEMPLATE.format(slug=slug, page="")
-                else:
-                    page_url = CATEGORY_URL_ACCESORIES_TEMPLATE.format(slug=slug, page=i)
-            else:
-                page_url = CATEGORY_URL_ABBILIGIMENTO_TEMPLATE.format(slug=slug, page=i)
+        # Now all_data will have (3 pages * 11 categories) = 33 items (if all pages/categories exist)
+        print(f"\nTotal items collected for detailed scraping: {len(all_data)}")
 
+        if not all_data:
+            print("Skipping STEP 2: No product URLs collected due to block/error.")
+            pool.close()
+            return 
 
-            # Pass the category info to the scraper
-            data = scrap_images_titles_links(page_url, main_cat, role, supabase_client) 
-            
-            if not data:
-                print(f"  -> No data found on page {i} for {slug}. Stopping this category.")
-                break 
-
-            print(f"  -> Found {len(data)} items on page which aren't in Database{i}. Adding ALL {len(data)} items to scraping list.")
-            all_data.extend(data) 
-            # --------------------------------------------------
-            
-            # Random delay between listing pages
-            # time.sleep(1 + random.random() * 3)
-    # --- END OF MODIFIED LOOP ---
-        
-    # Now all_data will have (3 pages * 11 categories) = 33 items (if all pages/categories exist)
-    print(f"\nTotal items collected for detailed scraping: {len(all_data)}")
+        all_data = seen.filter_new("hm", all_data)
+        if not all_data:
+            print("Skipping STEP 2: every product is already in the seen index.")
+            pool.close()
+            return
 
-    if not all_data:
-        print("Skipping STEP 2: No product URLs collected due to block/error.")
-        return 
+        state.save_queue(all_data)
 
     # --- STEP 2: Scrape Product Detail Pages (PDP) ---
     print("\n--- STEP 2: Scraping Details from Product Pages ---")
-    
-    driver = make_driver() 
 
-    successful_data = []
-    try:
-        for i, item in enumerate(all_data):
-            # if i > 1:
-            #     break
-            # Added print to show progress
-            print(f"\nProcessing item {i+1}/{len(all_data)} (Category: {item['main_category']})")
-            if not item.get('url'):
-                print("  -> Skipping item, no URL found.")
-                continue
-            
-            # Call the PDP scraping function
-            details = scrape_product_detail_via_schema(driver, item['url'])
-            
-            # # Print the successfully extracted dictionary
-            # print("  -> JSON DETTAGLIATO: ", details)
-            if details is None:
-                print("  -> Item skipped intentionally ('Pairs' item). NOT added to final list.")
-                continue  # Skip this item entirely
-            # Merge the new details into the existing item dictionary
-            else:
-                item.update(details)
-                successful_data.append(item) # ONLY successful items are kept here
-            
-            # Random delay between products to mimic human behavior
-            # time.sleep(1 + random.random() * 1.5) 
+    # The catalog file is named after the last category, as before
+    role = CATEGORIES_TO_SCRAPE[-1]["role"]
 
+    try:
+        scrape_details(pool, all_data, CATALOG_PATH_TEMPLATE.format(role=role), seen, state, resumed=queued is not None)
     finally:
-        driver.quit()
-
-    # --- Final Saving and Preview ---
-    
-    with open(f"h&m_catalog/donna/{role}.json", "w", encoding="utf-8") as f:
-        json.dump(successful_data, f, indent=4, ensure_ascii=False)
-    print(f"\n✅ Test data successfully saved to h&m_catalog/donna/{role}.json")
-
-    # print("\n" + "="*50)
-    # print("--- Final Extracted Data Preview (First Item with Details) ---")
-    # print("="*50)
-    
+        pool.report()
+        pool.close()
     
     print(f"\nCompleted! Total {len(all_data)} products processed.")
+    write_report(RETAILER)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(resume=resume_requested())
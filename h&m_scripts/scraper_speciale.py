@@ -7,7 +7,6 @@ import json
 import time
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 # --- ADD THESE 4 LINES ---
@@ -17,6 +16,9 @@ from selenium.webdriver.common.by import By
 import undetected_chromedriver as uc
 import random
 from supabase_queries import check_if_value_exists_in_colum, setup_supabase_client
+from driver_pool import make_driver
+from html_parsing import make_soup
+from rate_control import controlled_get
 
 # --- NEW: Category configuration based on your schema ---
 CATEGORIES_TO_SCRAPE = [
@@ -28,39 +30,6 @@ CATEGORIES_TO_SCRAPE = [
     }
 ]
 
-import undetected_chromedriver as uc
-from selenium.webdriver.chrome.options import Options
-
-def make_driver():
-    """Configures and initializes an undetectable Chrome driver for H&M."""
-    
-    options = uc.ChromeOptions()
-    
-    # --- CRUCIAL: TEMPORARILY REMOVE HEADLESS FOR DEBUGGING ---
-    # When debugging blocks, it is essential to see the browser:
-    # options.add_argument("--headless=new") # COMMENT OUT THIS LINE
-    options.add_argument("--window-size=1920,1080")
-    
-    # --- PERFORMANCE/STABILITY (Keep these) ---
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--log-level=3") 
-
-    # --- ADVANCED STEALTH BEHAVIOR ---
-    # This setting can sometimes help with network blocks
-    # options.add_argument("--disable-blink-features=AutomationControlled") # uc handles this, but redundancy can help
-    
-    # NOTE: uc handles the User-Agent and 'webdriver' property spoofing.
-    
-    # Initialize the driver. The argument 'browser_executable_path' is useful 
-    # if the default location is wrong, but typically not needed.
-    # Force driver for Chrome 135
-    driver = uc.Chrome(options=options, version_main=141)
-    
-    # Add a network timeout (separate from script timeout)
-    driver.set_page_load_timeout(60) # Set a high limit for the page to load
-    
-    return driver
 
 
 
@@ -73,7 +42,7 @@ def scrape_product_image(driver, product_url):
     image = None
     
     try:
-        driver.get(product_url)
+        controlled_get(driver, product_url)
         wait = WebDriverWait(driver, 5) 
 
         # 1. WAIT FOR PAGE STABILITY 
@@ -84,7 +53,7 @@ def scrape_product_image(driver, product_url):
         
         time.sleep(2)
         soup_html = driver.page_source
-        soup = BeautifulSoup(soup_html, "html.parser")
+        soup = make_soup(soup_html)
 
     except Exception as e:
         print(f"  -> ❌ ERROR during navigation/wait: {e}")
@@ -123,17 +92,6 @@ def scrape_product_image(driver, product_url):
     # # --- CRITICAL FIX 3: RETURN THE DICTIONARY ---
     return image
 
-def products_already_in_database(filepath):
-    """Loads previously scraped product URLs from a JSON file."""
-
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    scraped_urls = {item['url'] for item in data if 'url' in item}
-    # print(scraped_urls)
-    print(f"Loaded {len(scraped_urls)} previously scraped product URLs.")
-    return scraped_urls
-
-
 def main():
     """Orchestrates the scraping process."""
     products = []
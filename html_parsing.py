@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import atexit
+import importlib.util
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+from phase_timing import span
+
+
+# Tree builders BeautifulSoup can use, fastest first. "lxml" is C-backed and keeps
+# the same soup.select()/find() API, so the parsers only swap the constructor.
+PARSER_PREFERENCE = ("lxml", "html.parser")
+
+_PARSE_POOL = None
+
+
+def html_parser() -> str:
+    """Returns the tree builder to use: HTML_PARSER env var, else the first installed one of PARSER_PREFERENCE."""
+    forced = os.environ.get("HTML_PARSER")
+    if forced:
+        return forced
+    for name in PARSER_PREFERENCE:
+        if name == "html.parser" or importlib.util.find_spec(name) is not None:
+            return name
+    return "html.parser"
+
+
+HTML_PARSER = html_parser()
+
+
+def make_soup(html: str, parser: str = None) -> BeautifulSoup:
+    """Drop-in replacement for BeautifulSoup(html, "html.parser")."""
+    with span("soup"):
+        return BeautifulSoup(html, parser or HTML_PARSER)
+
+
+def parse_workers() -> int:
+    """Number of parser processes (HTML_PARSE_WORKERS, default 0 = parse inline)."""
+    return max(0, int(os.environ.get("HTML_PARSE_WORKERS", "0")))
+
+
+def _parse_pool():
+    global _PARSE_POOL
+    if _PARSE_POOL is None:
+        _PARSE_POOL = ProcessPoolExecutor(max_workers=parse_workers())
+        atexit.register(_PARSE_POOL.shutdown)
+    return _PARSE_POOL
+
+
+def submit_parse(parse_fn, *args) -> Future:
+    """
+    Runs `parse_fn(*args)` in the parser process pool and returns its Future.
+
+    `parse_fn` must be a module-level function taking the raw HTML string (a soup
+    cannot be sent to another process). With HTML_PARSE_WORKERS=0 the call runs
+    inline and the returned Future is already done.
+    """
+    if parse_workers():
+        return _parse_pool().submit(parse_fn, *args)
+
+    future = Future()
+    try:
+        future.set_result(parse_fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def parse_html(parse_fn, *args):
+    """Blocking version of submit_parse: keeps BeautifulSoup work off the calling (browser) thread."""
+    with span("parse"):
+        return submit_parse(parse_fn, *args).result()
+
+
+def _bench_parse(html: str, parser: str) -> int:
+    soup = BeautifulSoup(html, parser)
+    return len(soup.select("a[href]")) + len(soup.select("img")) + len(soup.find_all("script"))
+
+
+def benchmark(paths, repeat: int = 3) -> dict:
+    """
+    Times every installed tree builder on recorded pages.
+
+    Each page is parsed `repeat` times and queried with the kind of selectors the
+    scrapers use (links, images, scripts). When HTML_PARSE_WORKERS is set, the
+    whole batch is also parsed through the process pool with the fastest builder.
+
+    Returns:
+        {parser: seconds per page} plus "pool_pages_per_sec" when a pool was used.
+    """
+    pages = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            pages.append(f.read())
+    if not pages:
+        print("❌ No recorded pages to benchmark.")
+        return {}
+
+    megabytes = sum(len(page) for page in pages) / 1e6
+    print(f"Benchmarking {len(pages)} pages ({megabytes:.1f} MB), {repeat} rounds each.")
+
+    results = {}
+    for parser in PARSER_PREFERENCE:
+        if parser != "html.parser" and importlib.util.find_spec(parser) is None:
+            print(f"  -> {parser}: not installed, skipped.")
+            continue
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                _bench_parse(page, parser)
+        per_page = (time.perf_counter() - start) / (repeat * len(pages))
+        results[parser] = per_page
+        print(f"  -> {parser}: {per_page * 1000:.1f} ms/page")
+
+    baseline = results.get("html.parser")
+    fastest = min(results, key=results.get)
+    if baseline and fastest != "html.parser":
+        print(f"✅ {fastest} is {baseline / results[fastest]:.1f}x faster than html.parser.")
+
+    workers = parse_workers()
+    if workers:
+        start = time.perf_counter()
+        futures = [submit_parse(_bench_parse, page, fastest) for _ in range(repeat) for page in pages]
+        for future in futures:
+            future.result()
+        rate = len(futures) / (time.perf_counter() - start)
+        results["pool_pages_per_sec"] = rate
+        print(f"✅ Process pool ({workers} workers, {fastest}): {rate:.1f} pages/sec vs {1 / results[fastest]:.1f} inline.")
+
+    return results
+
+
+if __name__ == "__main__":
+    # python html_parsing.py page1.html page2.html ...   (or a directory of recorded .html pages)
+    targets = []
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            targets.extend(os.path.join(arg, name) for name in sorted(os.listdir(arg)) if name.endswith(".html"))
+        else:
+            targets.append(arg)
+    benchmark(targets)
@@ -0,0 +1,165 @@
+import os
+import re
+import time
+import asyncio
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+
+from html_parsing import submit_parse
+from rate_control import controller_for, domain_key, looks_like_bot_wall
+from page_cache import PDP, record_page
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+JSON_LD_PATTERN = re.compile(
+    r'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def extract_json_ld(html: str, script_id: str = None):
+    """
+    Returns the inner text of the first JSON-LD <script> block in the page, or None.
+
+    If `script_id` is given (H&M uses id="product-schema") only that block is accepted.
+    """
+    for match in JSON_LD_PATTERN.finditer(html):
+        if script_id and f'id="{script_id}"' not in match.group(0)[:200]:
+            continue
+        content = match.group(1).strip()
+        if content:
+            return content
+    return None
+
+
+def rewrite_origin(url: str, origin: str = None) -> str:
+    """Points a retailer URL at another origin (e.g. a local server replaying recorded pages)."""
+    if not origin:
+        return url
+    parts = urlsplit(url)
+    target = urlsplit(origin)
+    return urlunsplit((target.scheme, target.netloc, parts.path, parts.query, ""))
+
+
+# Bot walls on one site after which the HTTP path leaves the rest of its URLs to the browser
+MAX_HTTP_WALLS = int(os.environ.get("PDP_HTTP_MAX_WALLS", "3"))
+
+
+class NeedsBrowser(Exception):
+    """Raised by a prefetch parse_fn when the static HTML lacks content the browser renders."""
+
+
+async def _fetch_all(urls, on_page, concurrency: int, timeout: float, origin: str = None, max_walls: int = MAX_HTTP_WALLS):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"fetched": 0, "failed": 0, "walls": 0, "skipped": 0}
+    walls = {}
+
+    async with httpx.AsyncClient(http2=True, headers=DEFAULT_HEADERS, limits=limits,
+                                 timeout=timeout, follow_redirects=True) as client:
+
+        async def fetch(url):
+            domain = domain_key(url)
+            async with semaphore:
+                # Requests to the same site share its adaptive rate controller
+                controller = controller_for(domain)
+                await controller.acquire_async()
+                if walls.get(domain, 0) >= max_walls:
+                    controller.discard()
+                    stats["skipped"] += 1
+                    return
+                start = time.perf_counter()
+                try:
+                    response = await client.get(rewrite_origin(url, origin))
+                except httpx.HTTPError as e:
+                    print(f"  -> ❌ HTTP fetch failed for {url}: {e}")
+                    stats["failed"] += 1
+                    controller.release(False, time.perf_counter() - start)
+                    return
+
+                if looks_like_bot_wall(response.status_code, response.text):
+                    # Not a failure for the shared controller: the browser stage would pay for the backoff
+                    controller.discard()
+                    stats["walls"] += 1
+                    walls[domain] = walls.get(domain, 0) + 1
+                    if walls[domain] == max_walls:
+                        print(f"  -> ⚠️ {max_walls} bot walls from {domain} over HTTP. Leaving its other PDPs to the browser.")
+                    return
+
+                controller.release(True, time.perf_counter() - start)
+                stats["fetched"] += 1
+                on_page(url, response.status_code, response.text)
+
+        await asyncio.gather(*(fetch(url) for url in urls))
+
+    return stats
+
+
+def fetch_pages(urls, on_page, concurrency: int = 8, timeout: float = 20, origin: str = None) -> dict:
+    """
+    Downloads every URL over one pooled HTTP/2 client and hands each page to `on_page` as it arrives.
+
+    on_page(url, status_code, html) is called for every response that is not a
+    bot wall, so no more than `concurrency` pages are held in memory. After
+    MAX_HTTP_WALLS walls from one site its remaining URLs are not requested.
+
+    Returns:
+        {"fetched", "failed", "walls", "skipped"} counts.
+    """
+    return asyncio.run(_fetch_all(list(urls), on_page, concurrency, timeout, origin))
+
+
+def make_http_prefetch(parse_fn, script_id: str = None, concurrency: int = 8, origin: str = None):
+    """
+    Builds a prefetch step for pdp_workers.run_pdp_stage.
+
+    The returned function downloads the PDPs over HTTP and, as each page
+    arrives, pulls out the JSON-LD block and runs `parse_fn(json_string, html)`
+    on it. URLs whose page is a bot wall, has no JSON-LD, or makes parse_fn
+    raise (e.g. NeedsBrowser) are left out of the result, so run_pdp_stage
+    falls back to the browser for exactly those.
+
+    Set PDP_HTTP_ORIGIN (e.g. http://127.0.0.1:8000) or pass `origin` to replay
+    recorded pages from a local stand-in server instead of the live site.
+    """
+    origin = origin or os.environ.get("PDP_HTTP_ORIGIN")
+
+    def prefetch(urls) -> dict:
+        urls = list(urls)
+        start = time.perf_counter()
+        parsing = {}
+
+        def on_page(url, status_code, html):
+            json_string = extract_json_ld(html, script_id=script_id)
+            if not json_string:
+                return
+            record_page(url, PDP, html=html, json_ld=json_string)
+            # Pages are parsed in the html_parsing process pool when HTML_PARSE_WORKERS is set
+            parsing[url] = submit_parse(parse_fn, json_string, html)
+
+        stats = fetch_pages(urls, on_page, concurrency=concurrency, origin=origin)
+
+        handled = {}
+        for url, future in parsing.items():
+            try:
+                handled[url] = future.result()
+            except NeedsBrowser:
+                pass
+            except Exception as e:
+                print(f"  -> ⚠️ Could not parse the HTTP page of {url}, leaving it to the browser: {e}")
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"✅ HTTP prefetch: {len(handled)}/{len(urls)} PDPs parsed in {elapsed:.1f}s "
+            f"({stats['walls']} bot walls, {stats['skipped']} not tried after walls, "
+            f"{len(urls) - len(handled)} left for the browser)."
+        )
+        return handled
+
+    return prefetch
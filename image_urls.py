@@ -0,0 +1,255 @@
+import os
+import re
+import hashlib
+import threading
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from seen_index import retailer_for_url
+
+
+DEFAULT_IMAGE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_cache")
+
+# Image CDNs reject requests without a browser user agent
+IMAGE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
+    "Accept": "image/avif,image/webp,image/*,*/*;q=0.8",
+}
+
+# Image CDN host fragment -> retailer key (product pages use the hosts in seen_index.RETAILER_HOSTS)
+IMAGE_HOSTS = {
+    "zara.net": "zara",
+    "image.hm.com": "hm",
+    "mango.com": "mango",
+    "static.nike.com": "nike",
+    "assets.adidas.com": "adidas",
+    "ztat.net": "zalando",
+}
+
+# Base URL that relative image paths are resolved against
+IMAGE_BASE_URLS = {
+    "zara": "https://static.zara.net/",
+    "hm": "https://image.hm.com/",
+    "mango": "https://shop.mango.com/",
+    "nike": "https://static.nike.com/",
+    "adidas": "https://assets.adidas.com/",
+    "zalando": "https://img01.ztat.net/",
+}
+
+# Query parameters that only bust caches: dropped from every canonical URL
+CACHE_BUSTING_PARAMS = {
+    "zara": ("ts",),
+    "mango": ("ts",),
+}
+
+# Query parameters that pick a rendition (width, pixel density) of the same asset
+SIZE_PARAMS = {
+    "zara": ("w",),
+    "hm": ("imwidth",),
+    "mango": ("imwidth", "imdensity"),
+    "zalando": ("imwidth",),
+}
+
+# Path segments that pick a rendition, e.g. /a/images/t_web_pw_592_v2/f_auto/<id>/<name>.png (Nike)
+# or /images/w_766,h_766,f_auto,q_auto,fl_lossy,c_fill,g_auto/<id>/<name>.jpg (Adidas)
+TRANSFORM_SEGMENT_PATTERNS = {
+    "nike": re.compile(r"^(t_[\w-]+|[a-z]{1,2}_[^/]*)$"),
+    "adidas": re.compile(r"^[a-z]{1,2}_[^/]*$"),
+}
+
+
+def image_retailer(url: str):
+    """Maps an image URL (CDN or shop host) to its retailer key, or None."""
+    host = urlsplit(url or "").netloc.lower()
+    for fragment, retailer in IMAGE_HOSTS.items():
+        if fragment in host:
+            return retailer
+    return retailer_for_url(url)
+
+
+def srcset_urls(srcset: str) -> list:
+    """URLs of the candidates of a srcset attribute, in the order they are listed."""
+    urls = []
+    for candidate in (srcset or "").split(","):
+        url = candidate.strip().split(" ")[0]
+        if url:
+            urls.append(url)
+    return urls
+
+
+def canonical_image_url(url: str, retailer: str = None, keep_size: bool = True):
+    """
+    Returns the canonical form of an image URL, or None if there is none.
+
+    Relative and protocol-relative URLs are made absolute on the retailer's
+    image host, fragments and cache-busting parameters (Zara/Mango `ts`) are
+    dropped and the remaining query parameters are sorted. With
+    keep_size=False the rendition parameters (`w`, `imwidth`, `imdensity`)
+    go too, which asks the CDN for the full-size original.
+    """
+    if not url or not url.strip():
+        return None
+    url = url.strip()
+    if url.startswith("//"):
+        url = "https:" + url
+    retailer = retailer or image_retailer(url)
+    if not url.startswith(("http://", "https://")):
+        url = urljoin(IMAGE_BASE_URLS.get(retailer, ""), url.lstrip("/"))
+        if not url.startswith(("http://", "https://")):
+            return None
+
+    parts = urlsplit(url)
+    dropped = set(CACHE_BUSTING_PARAMS.get(retailer, ()))
+    if not keep_size:
+        dropped.update(SIZE_PARAMS.get(retailer, ()))
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in dropped)
+    return urlunsplit(("https", parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def _strip_transforms(path: str, retailer: str) -> str:
+    pattern = TRANSFORM_SEGMENT_PATTERNS.get(retailer)
+    if not pattern:
+        return path
+    return "/".join(segment for segment in path.split("/") if not pattern.match(segment))
+
+
+def full_size_image_url(url: str, retailer: str = None):
+    """
+    The URL of the full-size original behind `url`, whatever rendition it asks for.
+
+    Rendition query parameters go (see canonical_image_url with keep_size=False)
+    and so do Nike/Adidas transform path segments, which the CDN then serves untransformed.
+    """
+    retailer = retailer or image_retailer(url)
+    canonical = canonical_image_url(url, retailer, keep_size=False)
+    if canonical is None:
+        return None
+    parts = urlsplit(canonical)
+    return urlunsplit((parts.scheme, parts.netloc, _strip_transforms(parts.path, retailer), parts.query, ""))
+
+
+def content_key(url: str, retailer: str = None):
+    """
+    Identifies the image behind `url` whatever rendition of it the URL asks for.
+
+    Two URLs with the same key are the same picture at different sizes or
+    cache-busting stamps; consumers download and process it once per key.
+    """
+    full_size = full_size_image_url(url, retailer)
+    if full_size is None:
+        return None
+    parts = urlsplit(full_size)
+    return hashlib.sha1(f"{parts.netloc}{parts.path}?{parts.query}".encode("utf-8")).hexdigest()
+
+
+class ImageRegistry:
+    """
+    Downloads each image once per content key and memoizes what is computed from it.
+
+    Whatever rendition a caller passes (often a listing thumbnail), the
+    full-size original is fetched (see full_size_image_url); its bytes are
+    kept under <path>/full/<key[:2]>/<key>, so later runs and other renditions
+    of the same picture reuse them. Results of process() (embeddings, colour histograms)
+    are kept in memory per (key, name). Concurrent callers asking for the
+    same key wait for the one download in flight.
+
+    Usage:
+        images = ImageRegistry()
+        data = images.fetch(item["image_link"])
+        embedding = images.process(item["image_link"], "clip", embed_image_bytes)
+    """
+
+    def __init__(self, path: str = None, timeout: float = 20):
+        self.path = path or os.environ.get("IMAGE_CACHE_DIR", DEFAULT_IMAGE_CACHE_DIR)
+        self.timeout = timeout
+        self.urls = {}
+        self.downloads = 0
+        self.hits = 0
+        self._results = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: str):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _blob_path(self, key: str) -> str:
+        # "full/": blobs cached before every key was fetched at full size may be thumbnails
+        return os.path.join(self.path, "full", key[:2], key)
+
+    def resolve(self, url: str, retailer: str = None):
+        """Returns (content key, full-size URL to fetch) for `url`."""
+        key = content_key(url, retailer)
+        if key is None:
+            return None, None
+        with self._lock:
+            fetch_url = self.urls.setdefault(key, full_size_image_url(url, retailer))
+        return key, fetch_url
+
+    def fetch(self, url: str, retailer: str = None) -> bytes:
+        """Returns the image bytes behind `url`, downloading them only if no rendition was fetched before."""
+        import httpx
+
+        key, fetch_url = self.resolve(url, retailer)
+        if key is None:
+            raise ValueError(f"Not an image URL: {url!r}")
+
+        path = self._blob_path(key)
+        with self._key_lock(key):
+            if os.path.exists(path):
+                with self._lock:
+                    self.hits += 1
+                with open(path, "rb") as f:
+                    return f.read()
+
+            response = httpx.get(fetch_url, headers=IMAGE_HEADERS,
+                                 timeout=self.timeout, follow_redirects=True)
+            response.raise_for_status()
+            data = response.content
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self.downloads += 1
+            return data
+
+    def process(self, url: str, name: str, fn, retailer: str = None):
+        """Returns fn(image bytes), computed once per content key and `name`."""
+        key, _ = self.resolve(url, retailer)
+        if key is None:
+            raise ValueError(f"Not an image URL: {url!r}")
+        with self._lock:
+            if (key, name) in self._results:
+                self.hits += 1
+                return self._results[(key, name)]
+        result = fn(self.fetch(url, retailer))
+        with self._lock:
+            return self._results.setdefault((key, name), result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            summary = {"keys": len(self.urls), "downloads": self.downloads, "hits": self.hits}
+        print(f"✅ Images: {summary['keys']} distinct images, {summary['downloads']} downloaded, {summary['hits']} served from the registry.")
+        return summary
+
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def image_registry() -> ImageRegistry:
+    """The process-wide ImageRegistry."""
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = ImageRegistry()
+        return _REGISTRY
+
+
+def load_image(url: str, retailer: str = None):
+    """Opens the image behind `url` as an RGB PIL image, through the process-wide registry."""
+    from io import BytesIO
+    from PIL import Image
+
+    return Image.open(BytesIO(image_registry().fetch(url, retailer))).convert("RGB")
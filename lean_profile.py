@@ -0,0 +1,139 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+# URL patterns blocked on lean pages: images, media, fonts and third-party analytics.
+# Chrome's Network.setBlockedURLs matches on URL with '*' wildcards.
+LEAN_BLOCKED_URLS = [
+    # Images
+    "*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*",
+    # Media
+    "*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*",
+    # Fonts
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*",
+    # Analytics and ads
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*connect.facebook.com*", "*hotjar.com*", "*criteo.*",
+    "*bing.com/bat*", "*tiktok.com*", "*pinterest.com*", "*snapchat.com*",
+    "*quantummetric.com*", "*contentsquare.net*", "*newrelic.com*", "*nr-data.net*",
+]
+
+# Returns [bytes transferred, navigation load time in ms, resource count] for the current page.
+# Cross-origin resources without Timing-Allow-Origin report 0 bytes, so this is a lower bound.
+PAGE_STATS_JS = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let bytes = nav ? nav.transferSize : 0;
+for (const r of resources) { bytes += r.transferSize || 0; }
+return [bytes, nav ? (nav.loadEventEnd || nav.domContentLoadedEventEnd) : 0, resources.length];
+"""
+
+
+def set_resource_blocking(driver, enabled: bool):
+    """Turns the LEAN_BLOCKED_URLS list on or off for every following navigation of `driver`."""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS if enabled else []})
+
+
+class LeanProfile:
+    """
+    Blocks images, media, fonts and analytics while a PDP is scraped on a shared pooled driver.
+
+    Blocking is switched on for the duration of page() and off again afterwards,
+    so listing pages that rely on lazy-loaded images are untouched. Every
+    `calibrate_every`-th page is loaded without blocking to keep a baseline, and
+    each page reports the bytes and seconds saved against that baseline.
+
+    Usage:
+        lean = LeanProfile()
+        with pool.lease() as driver, lean.page(driver):
+            details = scrape_fn(driver, url)
+        lean.report()
+    """
+
+    def __init__(self, calibrate_every: int = 20):
+        self.calibrate_every = calibrate_every
+        self._lock = threading.Lock()
+        self._pages = 0
+        self.lean_stats = []   # (bytes, seconds) per lean page
+        self.full_stats = []   # (bytes, seconds) per calibration page
+
+    def _baseline(self):
+        with self._lock:
+            if not self.full_stats:
+                return None
+            count = len(self.full_stats)
+            return (
+                sum(b for b, _ in self.full_stats) / count,
+                sum(s for _, s in self.full_stats) / count,
+            )
+
+    @contextmanager
+    def page(self, driver):
+        with self._lock:
+            self._pages += 1
+            calibrating = self.calibrate_every > 0 and self._pages % self.calibrate_every == 1
+
+        set_resource_blocking(driver, not calibrating)
+        start = time.perf_counter()
+        try:
+            yield driver
+        finally:
+            elapsed = time.perf_counter() - start
+            try:
+                transferred, _, _ = driver.execute_script(PAGE_STATS_JS)
+            except Exception:
+                transferred = None
+            finally:
+                # Pooled drivers go on to listing pages: blocking must be off whatever happened above.
+                # If even this fails the error reaches the lease, which recycles the driver.
+                set_resource_blocking(driver, False)
+
+            if transferred is not None:
+                self._record(calibrating, transferred, elapsed)
+
+    def _record(self, calibrating: bool, transferred: int, elapsed: float):
+        if calibrating:
+            with self._lock:
+                self.full_stats.append((transferred, elapsed))
+            print(f"  -> Lean profile: calibration page {transferred / 1e6:.2f} MB in {elapsed:.1f}s (nothing blocked).")
+            return
+
+        with self._lock:
+            self.lean_stats.append((transferred, elapsed))
+        baseline = self._baseline()
+        if baseline:
+            saved_bytes, saved_s = baseline[0] - transferred, baseline[1] - elapsed
+            print(f"  -> Lean profile: {transferred / 1e6:.2f} MB in {elapsed:.1f}s, saved ~{saved_bytes / 1e6:.2f} MB and ~{saved_s:.1f}s.")
+        else:
+            print(f"  -> Lean profile: {transferred / 1e6:.2f} MB in {elapsed:.1f}s.")
+
+    def report(self) -> dict:
+        """Summarises average bytes and seconds per page, lean vs. unblocked."""
+        with self._lock:
+            lean, full = list(self.lean_stats), list(self.full_stats)
+
+        def average(stats):
+            if not stats:
+                return 0.0, 0.0
+            return sum(b for b, _ in stats) / len(stats), sum(s for _, s in stats) / len(stats)
+
+        lean_bytes, lean_s = average(lean)
+        full_bytes, full_s = average(full)
+        summary = {
+            "lean_pages": len(lean),
+            "calibration_pages": len(full),
+            "lean_mb_per_page": round(lean_bytes / 1e6, 3),
+            "lean_s_per_page": round(lean_s, 2),
+            "full_mb_per_page": round(full_bytes / 1e6, 3),
+            "full_s_per_page": round(full_s, 2),
+            "saved_mb_per_page": round((full_bytes - lean_bytes) / 1e6, 3) if full and lean else None,
+            "saved_s_per_page": round(full_s - lean_s, 2) if full and lean else None,
+        }
+        print(
+            f"Lean profile: {summary['lean_pages']} lean pages at {summary['lean_mb_per_page']} MB / {summary['lean_s_per_page']}s, "
+            f"{summary['calibration_pages']} full pages at {summary['full_mb_per_page']} MB / {summary['full_s_per_page']}s "
+            f"(saved {summary['saved_mb_per_page']} MB and {summary['saved_s_per_page']}s per page)."
+        )
+        return summary
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fetch_listing_pages(page_urls: list, fetch_page, last_page=None, concurrency: int = 1) -> list:
+    """
+    Fetches the listing pages of one category, in parallel after the first one.
+
+    Page 1 is fetched alone and `last_page(html)` reads the number of the last
+    page from it (pagination widget or product count). Only pages up to that
+    one are requested, on up to `concurrency` pooled drivers at once. As in
+    the serial loop, the first page that comes back empty ends the category:
+    requests for later pages that have not started yet are cancelled, and
+    pages that already finished are dropped.
+
+    Args:
+        page_urls: URLs of pages 1..MAX_PAGES_PER_CATEGORY, in order.
+        fetch_page: fetch_page(url) -> (items, html), called from worker threads.
+        last_page: Optional function returning the last page number (or None if unknown).
+        concurrency: Pages fetched at the same time (usually the driver pool size).
+
+    Returns:
+        The items of every page before the first empty one, in page order.
+    """
+    if not page_urls:
+        return []
+
+    start = time.perf_counter()
+    items, html = fetch_page(page_urls[0])
+    if not items:
+        print("  -> No data found on page 1. Stopping this category.")
+        return []
+
+    last = last_page(html) if last_page else None
+    remaining = page_urls[1:last] if last else page_urls[1:]
+    if last:
+        print(f"  -> Pagination: {last} pages, fetching {len(remaining)} more (of {len(page_urls) - 1} allowed).")
+
+    all_items = list(items)
+    used = 1
+    skipped = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(fetch_page, url) for url in remaining]
+        for page, future in enumerate(futures, start=2):
+            try:
+                page_items, _ = future.result()
+            except Exception as e:
+                print(f"  -> ❌ Listing page {page} failed: {e}")
+                page_items = []
+
+            if not page_items:
+                print(f"  -> No data found on page {page}. Stopping this category.")
+                skipped = sum(later.cancel() for later in futures[page - 1:])
+                break
+            all_items.extend(page_items)
+            used += 1
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"✅ Listing: {len(all_items)} items from {used} pages in {elapsed:.1f}s "
+        f"({len(page_urls) - 1 - len(remaining)} pages past the end not requested, {skipped} cancelled)."
+    )
+    return all_items
@@ -9,7 +9,6 @@ import json
 import time
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 # --- ADD THESE 4 LINES ---
@@ -19,6 +18,19 @@ from selenium.webdriver.common.by import By
 import undetected_chromedriver as uc
 import random
 from supabase_queries import check_if_value_exists_in_colum, setup_supabase_client
+from driver_pool import DriverPool
+from scroll_loader import GRID_SELECTORS, scroll_until_stable
+from pdp_workers import pdp_concurrency, pdp_lean_profile, run_pdp_stage
+from seen_index import SeenIndex
+from checkpoint_writer import CheckpointWriter
+from run_state import RunState, resume_requested
+from html_parsing import make_soup, parse_html
+from rate_control import controlled_get
+from phase_timing import page_source, set_context, timed, write_report
+from page_cache import LISTING, record_driver_page, record_page
+from dom_extract import extract_fields, extract_from_soup
+from page_ready import element_present, wait_ready
+from image_urls import canonical_image_url, srcset_urls
 
 
 
@@ -91,67 +103,22 @@ CATEGORIES_TO_SCRAPE = [
     }
 ]
 
-import undetected_chromedriver as uc
-from selenium.webdriver.chrome.options import Options
-
-def make_driver():
-    """Configures and initializes an undetectable Chrome driver for H&M."""
-    
-    options = uc.ChromeOptions()
-    
-    # --- CRUCIAL: TEMPORARILY REMOVE HEADLESS FOR DEBUGGING ---
-    # When debugging blocks, it is essential to see the browser:
-    # options.add_argument("--headless=new") # COMMENT OUT THIS LINE
-    options.add_argument("--window-size=1920,1080")
-    
-    # --- PERFORMANCE/STABILITY (Keep these) ---
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--log-level=3") 
-
-    driver = uc.Chrome(options=options, version_main=141)
-    
-    # Add a network timeout (separate from script timeout)
-    driver.set_page_load_timeout(60) # Set a high limit for the page to load
-    
-    return driver
-
 
-def fully_scroll(driver, pause=0, max_loops=8):
-    """Scrolls down the page until no new content is loaded."""
 
-    loops = 0
-    while loops < max_loops:
+@timed("cookies")
+def click_cookies(driver):
+    """Dismisses the cookie banner and the country selector (once per browser session) and waits for the grid."""
+    state = wait_ready(driver, RETAILER, selector=GRID_SELECTORS["mango"], timeout=15)
+    if not state["ready"]:
+        print(f"  -> ⚠️ Product grid not found after {state['waited_ms'] / 1000:.1f}s.")
 
-        driver.execute_script("window.scrollBy(0, 850);")
-        time.sleep(pause)
 
-        loops += 1
-        print(f"Loops done: {loops}/{max_loops}")
 
-def click_cookies(driver):
-    """Clicks the 'Stay on Site' button if the popup appears."""
-    try:
-        cookies = WebDriverWait(driver, 1).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, 'button[class="ButtonBase_button__SOIgU textActionM_className__8McJk ButtonPrimary_default__2Mbr8 CookiesFooter_button__l_Uzv"]'))
-        )
-        cookies.click()
-        print("  -> Cookie banner accepted/closed.")
-        time.sleep(1)  # Allow time for the banner to close
-
-        accept_country = WebDriverWait(driver, 55).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, 'button[class="ButtonBase_button__SOIgU textActionM_className__8McJk ButtonBase_fullWidth__g0ppN ButtonPrimary_default__2Mbr8"]'))
-        )
-        accept_country.click()
-        print("  -> Country selector accepted/closed.")
-    except Exception as e:
-        print(f"{e}")
-        pass
 
 # --- MODIFIED: Added main_category and role parameters ---
 def parse_product_grid(html: str, main_category: str, role: str):
     """Parses the HTML content to extract product details."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     results = []
 
 
@@ -186,94 +153,101 @@ def parse_product_grid(html: str, main_category: str, role: str):
     return results
 
 # --- MODIFIED: Added main_category and role parameters ---
+@timed("wait")
 def fetch_and_scroll(driver, url, main_category, role):
     """Drives the Selenium browser to fetch and scroll the page."""
     print(f"Scraping {url}")
     # driver = make_driver()
     # try:
-    driver.get(url)
+    controlled_get(driver, url)
     click_cookies(driver)
     # time.sleep(5)
-    fully_scroll(driver, pause=0.8, max_loops=7)
-    soup_html = driver.page_source
+    scroll_until_stable(driver, GRID_SELECTORS["mango"], pause=0.8)
+    soup_html = page_source(driver)
+    record_page(url, LISTING, html=soup_html, role=role, main_category=main_category)
         
 
     # finally:
     #     driver.quit()
 
     # --- MODIFIED: Pass category data to parser ---
-    return parse_product_grid(soup_html, main_category, role)
+    return parse_html(parse_product_grid, soup_html, main_category, role)
 
 
         
 
 
 
+@timed("wait")
 def scrape_product_detail_via_schema(driver, product_url):
     print(f"  -> Fetching details for: {product_url}")
 
-    # sensible defaults
-    details = {
-        "title": "N/A",
-        "brand": "Mango",
-        "schema_color": "N/A",
-        "schema_description": "N/A",
-        "material": "N/A",
-        "price": "N/A",
-        "audience": "female",
-    }
-
     try:
-        driver.get(product_url)
-        wait = WebDriverWait(driver, 10)
-
-        # wait until the main product title is present
-        wait.until(
-            EC.presence_of_element_located(
-                (By.CSS_SELECTOR, "h1.ProductDetail_title__Go9C2")
-            )
-        )
+        controlled_get(driver, product_url)
+        # wait until the main product title is present and the page went quiet
+        if not wait_ready(driver, RETAILER, selector="h1.ProductDetail_title__Go9C2", timeout=10)["ready"]:
+            raise TimeoutError("no product title on the page")
 
         # --- open the "See details" / composition sheet (if it exists) ---
-        try:
-            details_btn = wait.until(
-                EC.element_to_be_clickable(
-                    (By.CSS_SELECTOR, "button.ProductDetailsLink_link__mAQy0")
-                )
-            )
-            driver.execute_script("arguments[0].click();", details_btn)
+        if element_present(driver, "button.ProductDetailsLink_link__mAQy0"):
+            driver.execute_script("document.querySelector('button.ProductDetailsLink_link__mAQy0').click();")
 
             # wait for the composition list to appear inside the dialog
-            wait.until(
-                EC.presence_of_element_located(
-                    (By.CSS_SELECTOR, "div[data-dialog-container='true'] ul.Composition_list__JsVcC")
-                )
-            )
-        except Exception:
-            # If there is no button or composition tab for this item, just carry on
-            print("  -> ℹ️ No 'See details' button or composition list found.")
-
-        # now grab the **updated** DOM
-        detail_soup = BeautifulSoup(driver.page_source, "html.parser")
+            if not wait_ready(driver, selector="div[data-dialog-container='true'] ul.Composition_list__JsVcC", timeout=10)["ready"]:
+                print("  -> ℹ️ No composition list found.")
+        else:
+            # If there is no button for this item, just carry on
+            print("  -> ℹ️ No 'See details' button found.")
+
+        # read every field from the **updated** DOM in one round trip
+        fields = extract_fields(driver, PDP_FIELDS)
+        record_driver_page(driver, product_url)
 
     except Exception as e:
         print(f"  -> ❌ ERROR during navigation/wait: {e}")
-        return details
+        return dict(DEFAULT_DETAILS)
+
+    return parse_product_detail(fields)
+
+
+# sensible defaults
+DEFAULT_DETAILS = {
+    "title": "N/A",
+    "brand": "Mango",
+    "schema_color": "N/A",
+    "schema_description": "N/A",
+    "material": "N/A",
+    "price": "N/A",
+    "audience": "female",
+}
+
+
+# Fields read from a PDP whose composition sheet is open (see dom_extract)
+PDP_FIELDS = {
+    "title": {"selector": "h1.ProductDetail_title__Go9C2"},
+    "description": {"selector": "p.Description_descriptionContent__pCRwU"},
+    "price": {"selector": "span.SinglePrice_center__SWK1D"},
+    "colour": {"selector": "span.ColorSelectorPicker_selected__ek_DA img", "get": "@alt"},
+    "composition": {"selector": "ul.Composition_list__JsVcC > li", "all": True},
+    "images": {"selector": 'div[class="CustomCursor_container__EeBvB"] img', "get": "@src", "all": True},
+}
+
+
+def parse_product_detail(fields):
+    """Maps the PDP_FIELDS of a product page to our product fields."""
+    details = dict(DEFAULT_DETAILS)
 
     # ---------- TITLE ----------
-    node = detail_soup.select_one("h1.ProductDetail_title__Go9C2")
-    if node:
-        details["title"] = node.get_text(strip=True)
+    if fields.get("title") is not None:
+        details["title"] = fields["title"]
 
     # ---------- DESCRIPTION ----------
-    node = detail_soup.select_one("p.Description_descriptionContent__pCRwU")
-    if node:
-        details["schema_description"] = node.get_text(strip=True)
+    if fields.get("description") is not None:
+        details["schema_description"] = fields["description"]
 
     # ---------- PRICE ----------
-    node = detail_soup.select_one("span.SinglePrice_center__SWK1D")
-    if node:
-        price_text = node.get_text(strip=True)
+    if fields.get("price") is not None:
+        price_text = fields["price"]
         # clean currency formatting a bit
         for cur in ("US$", "€", "£"):
             price_text = price_text.replace(cur, "")
@@ -281,23 +255,17 @@ def scrape_product_detail_via_schema(driver, product_url):
         details["price"] = price_text
 
     # ---------- COLOUR ----------
-    selected_span = detail_soup.select_one("span.ColorSelectorPicker_selected__ek_DA")
-    if selected_span:
-        img = selected_span.find("img")
-        if img and img.has_attr("alt"):
-            alt_text = img["alt"]  # e.g. "Color Ecru selected"
-            colour = alt_text
-            if colour.lower().startswith("color "):
-                colour = colour[6:]
-            if colour.lower().endswith(" selected"):
-                colour = colour[:-9]
-            details["schema_color"] = colour.strip()
+    alt_text = fields.get("colour")  # e.g. "Color Ecru selected"
+    if alt_text is not None:
+        colour = alt_text
+        if colour.lower().startswith("color "):
+            colour = colour[6:]
+        if colour.lower().endswith(" selected"):
+            colour = colour[:-9]
+        details["schema_color"] = colour.strip()
 
     # ---------- COMPOSITION / MATERIAL ----------
-    comp_items = [
-        li.get_text(strip=True)
-        for li in detail_soup.select("ul.Composition_list__JsVcC > li")
-    ]
+    comp_items = fields.get("composition") or []
     if comp_items:
         details["material"] = ", ".join(comp_items)
 
@@ -307,17 +275,15 @@ def scrape_product_detail_via_schema(driver, product_url):
     
     # The image is inside a div with class 'CustomCursor_container__FcbV8' 
     # and has the 'srcset' attribute with all the different image URLs.
-    # The image is likely loaded after a click/wait, so we use detail_soup.
-    for img in detail_soup.select('div[class="CustomCursor_container__EeBvB"] img'):
-        src = img.get("src")
-        if src:
-            for part in src.split(','):
-                url = part.strip().split(' ')[0] # Get the URL part
-                if url.startswith("http"):
-                    image_links.append(url)
-    final_img = image_links[-2] if image_links else None
-    # Assign the list of links to the details dictionary
-    details["image_link"] = final_img
+    # The image is likely loaded after a click/wait, so it is read from the live DOM.
+    for src in fields.get("images") or []:
+        for url in srcset_urls(src):
+            if url.startswith("http"):
+                image_links.append(url)
+    # The second-to-last srcset candidate is a large rendition without being the original
+    final_img = image_links[-2] if len(image_links) > 1 else (image_links[0] if image_links else None)
+    # Assign the canonical link to the details dictionary
+    details["image_link"] = canonical_image_url(final_img, "mango")
 
 
 
@@ -326,113 +292,143 @@ def scrape_product_detail_via_schema(driver, product_url):
     
     return details
 
-def products_already_in_database(filepath):
-    """Loads previously scraped product URLs from a JSON file."""
+def scrape_product_detail_via_http(json_string, html):
+    """Parses a recorded PDP (see page_cache); Mango pages carry no JSON-LD we use."""
+    return parse_product_detail(extract_from_soup(make_soup(html), PDP_FIELDS))
+
+
+# Retailer key used by the shared modules (pdp_workers, seen_index, crawl_scheduler)
+RETAILER = "mango"
+# --- MODIFICATION 1: Set to 5 to test 5 pages per category ---
+MAX_PAGES_PER_CATEGORY = 1
+# Only the first 81 new products of each category are scraped
+PDP_LIMIT = 81
+# Every category gets its own catalog file and its own PDP stage
+PDP_PER_CATEGORY = True
+CATALOG_PATH_TEMPLATE = "mango_catalog/donna/{role}.json"
+# Listing parser used when replaying cached pages (see page_cache)
+LISTING_PARSER = parse_product_grid
+
+
+def has_details(details) -> bool:
+    """False for the DEFAULT_DETAILS returned when the page failed to load."""
+    return bool(details) and details != DEFAULT_DETAILS
+
+
+# Failed pages are not kept: the item is marked failed, stays out of the catalog and is retried by --resume
+PDP_KEEP = has_details
+
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    scraped_urls = {item['url'] for item in data if 'url' in item}
-    # print(scraped_urls)
-    print(f"Loaded {len(scraped_urls)} previously scraped product URLs.")
-    return scraped_urls
+def scrape_category_listing(pool, category_info, supabase_client=None):
+    """STEP 1 for one category: returns the listing items of its first MAX_PAGES_PER_CATEGORY pages."""
+    all_data = []
 
+    slug = category_info["slug"]
+    main_cat = category_info["main_category"]
+    role = category_info["role"]
+    set_context(category=role)
 
-def main():
+    # Loop through the pages for this category
+    for i in range(1, MAX_PAGES_PER_CATEGORY + 1): 
+        print(f"  -> Loading Page {i}...")
+
+        page_url = CATEGORY_URL_TEMPLATE.format(slug=slug, page=i)
+
+        # Pass the category info to the scraper (retried in a headed browser if blocked)
+        data = pool.run(fetch_and_scroll, page_url, main_cat, role)
+    
+        if not data:
+            print(f"  -> No data found on page {i} for {slug}. Stopping this category.")
+            break 
+
+        # Random delay between listing pages
+        # time.sleep(1 + random.random() * 3)
+        all_data.extend(data)
+
+    return all_data
+
+
+def scrape_details(pool, all_data, catalog_path, seen, state, resumed=False):
+    """STEP 2: scrapes the PDPs of `all_data` and writes them to `catalog_path`."""
+    # Finished products are streamed to a JSONL checkpoint and compacted at the end
+    checkpoint = CheckpointWriter(catalog_path, resume=resumed)
+
+    def finish(item, details):
+        checkpoint.append({**item, **details})
+
+    run_pdp_stage(
+        pool,
+        all_data,
+        scrape_product_detail_via_schema,
+        concurrency=pdp_concurrency(RETAILER),
+        on_done=finish,
+        on_status=state.mark,
+        lean=pdp_lean_profile(RETAILER),
+        keep=PDP_KEEP,
+    )
+
+    # Read before finish() clears the queue
+    done = state.done_urls()
+    data = state.finish(checkpoint)
+    # Products count as seen only once they are in the catalog file, and only if they were scraped successfully
+    seen.mark_done(RETAILER, [record for record in data if record.get('url') in done])
+    return data
+
+
+def main(resume: bool = False):
     """Orchestrates the scraping process."""
-    driver = make_driver()
+    # Warm browsers shared by the listing and PDP phases
+    pool = DriverPool(size=pdp_concurrency("mango"), max_pages=100)
+    # Products scraped in earlier runs are not queued again
+    seen = SeenIndex()
 
     # --- STEP 1: Scrape Listing Pages for URLs and basic info ---
     print("--- STEP 1: Scraping Listing Pages for URLs and basic info ---")
 
-    # --- MODIFICATION 1: Set to 5 to test 5 pages per category ---
-    MAX_PAGES_PER_CATEGORY = 1
-
     # --- MODIFIED LOOP STRUCTURE ---
     for category_info in CATEGORIES_TO_SCRAPE:
-        all_data = []
-        
-        successful_data = []
-
         slug = category_info["slug"]
         cat_name = category_info["name"]
-        main_cat = category_info["main_category"]
         role = category_info["role"]
         
         print(f"\n--- Scraping Category: {cat_name} ({slug}) ---")
 
-        # Loop through the pages for this category
-        for i in range(1, MAX_PAGES_PER_CATEGORY + 1): 
-            print(f"  -> Loading Page {i}...")
-
-            page_url = CATEGORY_URL_TEMPLATE.format(slug=slug, page=i)
-
-            # Pass the category info to the scraper
-            data = fetch_and_scroll(driver, page_url, main_cat, role) 
+        # The listing queue and per-URL status survive crashes (see run_state)
+        state = RunState(f"mango/{role}")
+        queued = state.unfinished() if resume else None
+        if queued is not None:
+            print(f"  -> Resuming: {len(queued)} unfinished products, skipping the listing pages.")
+            all_data = queued
+        else:
+            all_data = scrape_category_listing(pool, category_info)
             
-            if not data:
-                print(f"  -> No data found on page {i} for {slug}. Stopping this category.")
-                break 
+            # Now all_data will have (3 pages * 11 categories) = 33 items (if all pages/categories exist)
+            print(f"\nTotal items collected for detailed scraping: {len(all_data)}")
 
-            # --------------------------------------------------
-            
-            # Random delay between listing pages
-            # time.sleep(1 + random.random() * 3)
-            all_data.extend(data)
-        # --- END OF MODIFIED LOOP ---
-            
-        # Now all_data will have (3 pages * 11 categories) = 33 items (if all pages/categories exist)
-        print(f"\nTotal items collected for detailed scraping: {len(all_data)}")
+            if not all_data:
+                print("Skipping STEP 2: No product URLs collected due to block/error.")
+                pool.close()
+                return 
+
+            all_data = seen.filter_new("mango", all_data)
+            if not all_data:
+                print("  -> No new products in this category. Skipping STEP 2.")
+                continue
 
-        if not all_data:
-            print("Skipping STEP 2: No product URLs collected due to block/error.")
-            return 
+            all_data = all_data[:PDP_LIMIT]
+            state.save_queue(all_data)
 
         # --- STEP 2: Scrape Product Detail Pages (PDP) ---
         print("\n--- STEP 2: Scraping Details from Product Pages ---")
-        
-    
-
-        for i, item in enumerate(all_data):
-            if i > 80:
-                break
-            # Added print to show progress
-            print(f"\nProcessing item {i+1}/{len(all_data)} (Category: {item['main_category']})")
-            if not item.get('url'):
-                print("  -> Skipping item, no URL found.")
-                continue
-            
-            # Call the PDP scraping function
-            details = scrape_product_detail_via_schema(driver, item['url'])
-            
-            # # Print the successfully extracted dictionary
-            # print("  -> JSON DETTAGLIATO: ", details)
-            if details is None:
-                print("  -> Item skipped intentionally ('Pairs' item). NOT added to final list.")
-                continue  # Skip this item entirely
-            # Merge the new details into the existing item dictionary
-            else:
-                item.update(details)
-                successful_data.append(item) # ONLY successful items are kept here
-            
-            # Random delay between products to mimic human behavior
-            # time.sleep(1 + random.random() * 1.5) 
 
-            with open(f"mango_catalog/donna/{role}.json", "w", encoding="utf-8") as f:
-                json.dump(successful_data, f, indent=4, ensure_ascii=False)
-            print(f"\n✅ Test data successfully saved to mango_catalog/donna/{role}.json")
+        scrape_details(pool, all_data, CATALOG_PATH_TEMPLATE.format(role=role), seen, state, resumed=queued is not None)
 
-            print("\n" + "="*50)
-            print("--- Final Extracted Data Preview (First Item with Details) ---")
-            print("="*50)
-                
-            
         print(f"\nCompleted! Total {len(all_data)} products processed.")
-        
-    driver.quit()
+            
+    pool.report()
+    pool.close()
+    write_report(RETAILER)
 
-    # --- Final Saving and Preview ---
-    
-   
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(resume=resume_requested())
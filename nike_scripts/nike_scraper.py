@@ -9,7 +9,6 @@ import json
 import time
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 # --- ADD THESE 4 LINES ---
@@ -19,6 +18,20 @@ from selenium.webdriver.common.by import By
 import undetected_chromedriver as uc
 import random
 from supabase_queries import check_if_value_exists_in_colum, setup_supabase_client
+from driver_pool import DriverPool
+from scroll_loader import GRID_SELECTORS, scroll_until_stable
+from pdp_workers import pdp_concurrency, pdp_fetch_mode, pdp_lean_profile, run_pdp_stage
+from seen_index import SeenIndex
+from checkpoint_writer import CheckpointWriter
+from run_state import RunState, resume_requested
+from http_fetch import make_http_prefetch
+from html_parsing import make_soup, parse_html
+from rate_control import controlled_get
+from phase_timing import page_source, set_context, timed, write_report
+from page_cache import LISTING, record_driver_page, record_page
+from dom_extract import extract_fields, extract_from_soup
+from page_ready import wait_ready
+from image_urls import canonical_image_url
 
 
 
@@ -37,68 +50,26 @@ CATEGORIES_TO_SCRAPE = [
     }
 ]
 
-import undetected_chromedriver as uc
-from selenium.webdriver.chrome.options import Options
-
-def make_driver():
-    """Configures and initializes an undetectable Chrome driver for H&M."""
-    
-    options = uc.ChromeOptions()
-    
-    # --- CRUCIAL: TEMPORARILY REMOVE HEADLESS FOR DEBUGGING ---
-    # When debugging blocks, it is essential to see the browser:
-    # options.add_argument("--headless=new") # COMMENT OUT THIS LINE
-    options.add_argument("--window-size=1920,1080")
-    
-    # --- PERFORMANCE/STABILITY (Keep these) ---
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--log-level=3") 
-
-    driver = uc.Chrome(options=options, version_main=141)
-    
-    # Add a network timeout (separate from script timeout)
-    driver.set_page_load_timeout(60) # Set a high limit for the page to load
-    
-    return driver
-
-
-def fully_scroll(driver, pause=0, max_loops=8):
-    """Scrolls down the page until no new content is loaded."""
-
-    loops = 0
-    while loops < max_loops:
-
-        driver.execute_script("window.scrollBy(0, 850);")
-        time.sleep(pause)
 
-        loops += 1
-        print(f"Loops done: {loops}/{max_loops}")
 
+@timed("cookies")
 def click_cookies(driver):
-    """Clicks the 'Stay on Site' button if the popup appears."""
-    try:
-        cookies = WebDriverWait(driver, 2).until(
-            EC.element_to_be_clickable((By.CSS_SELECTOR, 'button[class="nds-btn modal-actions-accept-btn css-1snynq4 ex41m6f0 btn-primary-dark  btn-md"]'))
-        )
-        cookies.click()
-        print("  -> Cookie banner accepted/closed.")
-        time.sleep(1)  # Allow time for the banner to close
-    except Exception as e:
-        print(f"{e}")
-        pass
+    """Dismisses the cookie banner (once per browser session) and waits for the grid."""
+    state = wait_ready(driver, RETAILER, selector=GRID_SELECTORS["nike"], timeout=10)
+    if not state["ready"]:
+        print(f"  -> ⚠️ Product grid not found after {state['waited_ms'] / 1000:.1f}s.")
 
 # --- MODIFIED: Added main_category and role parameters ---
 def parse_product_grid(html: str, main_category: str, role: str):
     """Parses the HTML content to extract product details."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     results = []
 
     for div in soup.select('div.product-grid__items > div.product-card'):
 
         # Selects the specific primary image tag
         img_tag = div.select_one('img.product-card__hero-image')
-        image = img_tag.get('src') if img_tag else None
+        image = canonical_image_url(img_tag.get('src'), "nike") if img_tag else None
 
         # Selects the specific link tag
         link_tag = div.select_one('a[class="product-card__link-overlay"]')
@@ -122,50 +93,51 @@ def parse_product_grid(html: str, main_category: str, role: str):
     return results
 
 # --- MODIFIED: Added main_category and role parameters ---
+@timed("wait")
 def fetch_and_scroll(driver, url, main_category, role):
     """Drives the Selenium browser to fetch and scroll the page."""
     print(f"Scraping {url}")
     # driver = make_driver()
     # try:
-    driver.get(url)
+    controlled_get(driver, url)
     click_cookies(driver)
     # time.sleep(5)
-    fully_scroll(driver, pause=0.8, max_loops=7)
-    soup_html = driver.page_source
+    scroll_until_stable(driver, GRID_SELECTORS["nike"], pause=0.8)
+    soup_html = page_source(driver)
+    record_page(url, LISTING, html=soup_html, role=role, main_category=main_category)
         
 
     # finally:
     #     driver.quit()
 
     # --- MODIFIED: Pass category data to parser ---
-    return parse_product_grid(soup_html, main_category, role)
+    return parse_html(parse_product_grid, soup_html, main_category, role)
 
 
         
 
 
 
+@timed("wait")
 def scrape_product_detail_via_schema(driver, product_url):
     print(f"  -> Fetching details for: {product_url}")
-    details_dict = {} # <-- NOTE: Renamed to avoid confusion
     SCHEMA_ID = 'product-schema'
     MAIN_CONTENT_ID = 'main-content'
     json_string = None
     
     try:
-        driver.get(product_url)
-        wait = WebDriverWait(driver, 5) 
+        controlled_get(driver, product_url)
 
 
             
-        schema_element = wait.until(
-            # CHANGE IS HERE: Use By.CSS_SELECTOR to find the script by its type attribute
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'script[type="application/ld+json"]')) 
-        )
+        # Moves on as soon as the schema is in the DOM and the page went quiet (see page_ready)
+        if not wait_ready(driver, RETAILER, selector='script[type="application/ld+json"]', timeout=5)["ready"]:
+            raise TimeoutError("no JSON-LD schema on the page")
 
         print("  -> ✅ Product Schema script found after stabilization.")
-        json_string = schema_element.get_attribute('innerHTML')
-        detail_soup = BeautifulSoup(driver.page_source, "html.parser")
+        # JSON-LD and the description list in one round trip, without serializing the DOM
+        fields = extract_fields(driver, PDP_FIELDS)
+        record_driver_page(driver, product_url, json_ld=fields["json_ld"])
 
             
 
@@ -173,6 +145,23 @@ def scrape_product_detail_via_schema(driver, product_url):
         print(f"  -> ❌ ERROR during navigation/wait: {e}")
         return {} 
         
+    return parse_product_detail(fields["json_ld"], fields)
+
+
+# Fields read from a PDP (see dom_extract)
+PDP_FIELDS = {
+    "json_ld": {"selector": 'script[type="application/ld+json"]', "get": "html"},
+    "color": {"selector": "li[data-testid='product-description-color-description']"},
+    "style": {"selector": 'li[data-testid="product-description-style-color"]'},
+    "description": {"selector": 'p[data-testid="product-description"]'},
+    "price": {"selector": 'span[data-testid="currentPrice-container"]'},
+}
+
+
+def parse_product_detail(json_string, fields):
+    """Maps the JSON-LD schema string and the PDP_FIELDS read from the product description list to our product fields."""
+    details_dict = {}
+
     # --- JSON PROCESSING (The core fix is here) ---
     if json_string:
         try:
@@ -185,29 +174,15 @@ def scrape_product_detail_via_schema(driver, product_url):
             
                     # Materiale
 
-            color = detail_soup.select_one("li[data-testid='product-description-color-description']")
-            color = color.get_text(strip=True) if color else "N/A"
-
-            id = detail_soup.select_one('li[data-testid="product-description-style-color"]')
-            id = id.get_text(strip=True) if id else "N/A"
-            # if not color:
-            # #     # Use .contents to get a list of all children (including text nodes)
-            # #     # The color text is the last item in this list
-            # #     all_content = color.contents
-                
-            # #     # Filter out comments and whitespace, and take the last piece of text
-            # #     color_description = next((item.strip() for item in reversed(all_content) if isinstance(item, str) and item.strip()), "N/A")
-            # # else:
-            #     color = "N/A"
+            color = fields.get("color") or "N/A"
 
-            description_element = detail_soup.select_one('p[data-testid="product-description"]')
+            id = fields.get("style") or "N/A"
 
-            # 2. Extract the text and clean it up
-            description_text = description_element.get_text(strip=True) if description_element else "N/A"
+            description_text = fields.get("description") or "N/A"
 
-            price =  detail_soup.select_one('span[data-testid="currentPrice-container"]')
+            price = fields.get("price")
             if price:
-                price = price.get_text(strip=True).replace("$", "").replace(",", "")
+                price = price.replace("$", "").replace(",", "")
             else:
                 price = "N/A"
 
@@ -230,113 +205,137 @@ def scrape_product_detail_via_schema(driver, product_url):
     # --- CRITICAL FIX 3: RETURN THE DICTIONARY ---
     return details_dict
 
-def products_already_in_database(filepath):
-    """Loads previously scraped product URLs from a JSON file."""
+def scrape_product_detail_via_http(json_string, html):
+    """HTTP fetch mode: parses a PDP from its JSON-LD string and raw HTML."""
+    return parse_product_detail(json_string, extract_from_soup(make_soup(html), PDP_FIELDS))
+
+
+# Retailer key used by the shared modules (pdp_workers, seen_index, crawl_scheduler)
+RETAILER = "nike"
+# --- MODIFICATION 1: Set to 5 to test 5 pages per category ---
+MAX_PAGES_PER_CATEGORY = 1
+# Only the first 51 new products of each category are scraped
+PDP_LIMIT = 51
+# Every category gets its own catalog file and its own PDP stage
+PDP_PER_CATEGORY = True
+CATALOG_PATH_TEMPLATE = "nike_catalog/donna/{role}.json"
+# Listing parser used when replaying cached pages (see page_cache)
+LISTING_PARSER = parse_product_grid
+# Empty results (navigation or wait errors) are not kept: the item is marked failed and retried by --resume
+PDP_KEEP = bool
+
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    scraped_urls = {item['url'] for item in data if 'url' in item}
-    # print(scraped_urls)
-    print(f"Loaded {len(scraped_urls)} previously scraped product URLs.")
-    return scraped_urls
+def scrape_category_listing(pool, category_info, supabase_client=None):
+    """STEP 1 for one category: returns the listing items of its first MAX_PAGES_PER_CATEGORY pages."""
+    all_data = []
 
+    slug = category_info["slug"]
+    main_cat = category_info["main_category"]
+    role = category_info["role"]
+    set_context(category=role)
 
-def main():
+    # Loop through the pages for this category
+    for i in range(1, MAX_PAGES_PER_CATEGORY + 1): 
+        print(f"  -> Loading Page {i}...")
+
+        page_url = CATEGORY_URL_TEMPLATE.format(slug=slug, page=i)
+
+        # Pass the category info to the scraper (retried in a headed browser if blocked)
+        data = pool.run(fetch_and_scroll, page_url, main_cat, role)
+    
+        if not data:
+            print(f"  -> No data found on page {i} for {slug}. Stopping this category.")
+            break 
+
+        # Random delay between listing pages
+        # time.sleep(1 + random.random() * 3)
+        all_data.extend(data)
+
+    return all_data
+
+
+def scrape_details(pool, all_data, catalog_path, seen, state, resumed=False):
+    """STEP 2: scrapes the PDPs of `all_data` and writes them to `catalog_path`."""
+    # Finished products are streamed to a JSONL checkpoint and compacted at the end
+    checkpoint = CheckpointWriter(catalog_path, resume=resumed)
+
+    def finish(item, details):
+        checkpoint.append({**item, **details})
+
+    run_pdp_stage(
+        pool,
+        all_data,
+        scrape_product_detail_via_schema,
+        concurrency=pdp_concurrency(RETAILER),
+        on_done=finish,
+        on_status=state.mark,
+        lean=pdp_lean_profile(RETAILER),
+        prefetch=make_http_prefetch(scrape_product_detail_via_http) if pdp_fetch_mode() == "http" else None,
+        keep=PDP_KEEP,
+    )
+
+    # Read before finish() clears the queue
+    done = state.done_urls()
+    data = state.finish(checkpoint)
+    # Products count as seen only once they are in the catalog file, and only if they were scraped successfully
+    seen.mark_done(RETAILER, [record for record in data if record.get('url') in done])
+    return data
+
+
+def main(resume: bool = False):
     """Orchestrates the scraping process."""
-    driver = make_driver()
+    # Warm browsers shared by the listing and PDP phases
+    pool = DriverPool(size=pdp_concurrency("nike"), max_pages=100)
+    # Products scraped in earlier runs are not queued again
+    seen = SeenIndex()
 
     # --- STEP 1: Scrape Listing Pages for URLs and basic info ---
     print("--- STEP 1: Scraping Listing Pages for URLs and basic info ---")
 
-    # --- MODIFICATION 1: Set to 5 to test 5 pages per category ---
-    MAX_PAGES_PER_CATEGORY = 1
-
     # --- MODIFIED LOOP STRUCTURE ---
     for category_info in CATEGORIES_TO_SCRAPE:
-        all_data = []
-        
-        successful_data = []
-
         slug = category_info["slug"]
         cat_name = category_info["name"]
-        main_cat = category_info["main_category"]
         role = category_info["role"]
         
         print(f"\n--- Scraping Category: {cat_name} ({slug}) ---")
 
-        # Loop through the pages for this category
-        for i in range(1, MAX_PAGES_PER_CATEGORY + 1): 
-            print(f"  -> Loading Page {i}...")
-
-            page_url = CATEGORY_URL_TEMPLATE.format(slug=slug, page=i)
-
-            # Pass the category info to the scraper
-            data = fetch_and_scroll(driver, page_url, main_cat, role) 
+        # The listing queue and per-URL status survive crashes (see run_state)
+        state = RunState(f"nike/{role}")
+        queued = state.unfinished() if resume else None
+        if queued is not None:
+            print(f"  -> Resuming: {len(queued)} unfinished products, skipping the listing pages.")
+            all_data = queued
+        else:
+            all_data = scrape_category_listing(pool, category_info)
             
-            if not data:
-                print(f"  -> No data found on page {i} for {slug}. Stopping this category.")
-                break 
+            # Now all_data will have (3 pages * 11 categories) = 33 items (if all pages/categories exist)
+            print(f"\nTotal items collected for detailed scraping: {len(all_data)}")
 
-            # --------------------------------------------------
-            
-            # Random delay between listing pages
-            # time.sleep(1 + random.random() * 3)
-            all_data.extend(data)
-        # --- END OF MODIFIED LOOP ---
-            
-        # Now all_data will have (3 pages * 11 categories) = 33 items (if all pages/categories exist)
-        print(f"\nTotal items collected for detailed scraping: {len(all_data)}")
+            if not all_data:
+                print("Skipping STEP 2: No product URLs collected due to block/error.")
+                pool.close()
+                return 
 
-        if not all_data:
-            print("Skipping STEP 2: No product URLs collected due to block/error.")
-            return 
+            all_data = seen.filter_new("nike", all_data)
+            if not all_data:
+                print("  -> No new products in this category. Skipping STEP 2.")
+                continue
+
+            all_data = all_data[:PDP_LIMIT]
+            state.save_queue(all_data)
 
         # --- STEP 2: Scrape Product Detail Pages (PDP) ---
         print("\n--- STEP 2: Scraping Details from Product Pages ---")
-        
-    
-
-        for i, item in enumerate(all_data):
-            if i > 50:
-                break
-            # Added print to show progress
-            print(f"\nProcessing item {i+1}/{len(all_data)} (Category: {item['main_category']})")
-            if not item.get('url'):
-                print("  -> Skipping item, no URL found.")
-                continue
-            
-            # Call the PDP scraping function
-            details = scrape_product_detail_via_schema(driver, item['url'])
-            
-            # # Print the successfully extracted dictionary
-            # print("  -> JSON DETTAGLIATO: ", details)
-            if details is None:
-                print("  -> Item skipped intentionally ('Pairs' item). NOT added to final list.")
-                continue  # Skip this item entirely
-            # Merge the new details into the existing item dictionary
-            else:
-                item.update(details)
-                successful_data.append(item) # ONLY successful items are kept here
-            
-            # Random delay between products to mimic human behavior
-            # time.sleep(1 + random.random() * 1.5) 
 
-            with open(f"nike_catalog/donna/{role}.json", "w", encoding="utf-8") as f:
-                json.dump(successful_data, f, indent=4, ensure_ascii=False)
-            print(f"\n✅ Test data successfully saved to nike_catalog/donna/{role}.json")
+        scrape_details(pool, all_data, CATALOG_PATH_TEMPLATE.format(role=role), seen, state, resumed=queued is not None)
 
-            print("\n" + "="*50)
-            print("--- Final Extracted Data Preview (First Item with Details) ---")
-            print("="*50)
-                
-            
         print(f"\nCompleted! Total {len(all_data)} products processed.")
-        
-    driver.quit()
+            
+    pool.report()
+    pool.close()
+    write_report(RETAILER)
 
-    # --- Final Saving and Preview ---
-    
-   
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(resume=resume_requested())
@@ -0,0 +1,267 @@
+import os
+import gzip
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+from seen_index import retailer_for_url
+from phase_timing import page_source
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_cache")
+
+LISTING = "listing"
+PDP = "pdp"
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def recording() -> bool:
+    """True when PAGE_CACHE_RECORD is set: every scraped page is also written to the page cache."""
+    return os.environ.get("PAGE_CACHE_RECORD", "").lower() in ("1", "true", "yes")
+
+
+class PageCache:
+    """
+    Content-addressed, gzip-compressed store of the pages the scrapers parsed.
+
+    Page HTML and JSON-LD strings are stored once per distinct content under
+    blobs/<sha256[:2]>/<sha256>.gz. A SQLite index maps (url, fetched_at) to
+    those blobs, plus the listing category a page belongs to, so a page
+    fetched on every run costs one row per run and one blob per change.
+
+    Usage:
+        cache = PageCache()
+        cache.record("https://www.zara.com/...", PDP, html=page_html, json_ld=json_string)
+        for snapshot in cache.snapshots("zara", kind=PDP):
+            html, json_ld = cache.load(snapshot)
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.environ.get("PAGE_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.blob_dir = os.path.join(self.path, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.path, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS snapshots (
+                retailer      TEXT NOT NULL,
+                url           TEXT NOT NULL,
+                kind          TEXT NOT NULL,
+                role          TEXT,
+                main_category TEXT,
+                fetched_at    REAL NOT NULL,
+                html_sha      TEXT,
+                json_ld_sha   TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS snapshots_url ON snapshots (retailer, kind, url, fetched_at)")
+        self._conn.commit()
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.blob_dir, sha[:2], sha + ".gz")
+
+    def _put(self, content: str):
+        """Stores `content` unless an identical blob exists and returns its sha256."""
+        if content is None:
+            return None
+        data = content.encode("utf-8")
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            os.replace(tmp_path, path)
+        return sha
+
+    def _get(self, sha: str):
+        if not sha:
+            return None
+        with open(self._blob_path(sha), "rb") as f:
+            return gzip.decompress(f.read()).decode("utf-8")
+
+    def record(self, url: str, kind: str, html: str = None, json_ld: str = None,
+               role: str = None, main_category: str = None, fetched_at: float = None):
+        """Adds one snapshot of `url`. `kind` is LISTING (with its role/main_category) or PDP."""
+        html_sha, json_ld_sha = self._put(html), self._put(json_ld)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO snapshots (retailer, url, kind, role, main_category, fetched_at, html_sha, json_ld_sha) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (retailer_for_url(url) or "unknown", url, kind, role, main_category,
+                 fetched_at or time.time(), html_sha, json_ld_sha),
+            )
+            self._conn.commit()
+
+    def snapshots(self, retailer: str, kind: str = None, as_of: float = None) -> list:
+        """
+        Returns the latest snapshot of every URL of `retailer` (fetched at or before `as_of`).
+
+        Each snapshot is a dict with url, kind, role, main_category, fetched_at,
+        html_sha and json_ld_sha, in fetch order.
+        """
+        where = "retailer = ? AND fetched_at <= ?"
+        params = [retailer, as_of or time.time()]
+        if kind:
+            where += " AND kind = ?"
+            params.append(kind)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, kind, role, main_category, fetched_at, html_sha, json_ld_sha FROM snapshots "
+                f"WHERE rowid IN (SELECT MAX(rowid) FROM snapshots WHERE {where} GROUP BY kind, url, role) "
+                "ORDER BY rowid",
+                params,
+            ).fetchall()
+        keys = ("url", "kind", "role", "main_category", "fetched_at", "html_sha", "json_ld_sha")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def load(self, snapshot: dict):
+        """Returns (html, json_ld) of a snapshot; either may be None."""
+        return self._get(snapshot["html_sha"]), self._get(snapshot["json_ld_sha"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT retailer, kind, COUNT(*), COUNT(DISTINCT url) FROM snapshots GROUP BY retailer, kind"
+            ).fetchall()
+        blobs = [os.path.join(root, name) for root, _, names in os.walk(self.blob_dir) for name in names]
+        summary = {
+            "snapshots": {f"{retailer}/{kind}": {"snapshots": count, "urls": urls} for retailer, kind, count, urls in rows},
+            "blobs": len(blobs),
+            "blob_mb": round(sum(os.path.getsize(path) for path in blobs) / 1e6, 2),
+        }
+        for key, counts in summary["snapshots"].items():
+            print(f"  -> {key}: {counts['snapshots']} snapshots of {counts['urls']} URLs")
+        print(f"✅ Page cache at {self.path}: {summary['blobs']} blobs, {summary['blob_mb']} MB compressed.")
+        return summary
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _cache() -> PageCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = PageCache()
+        return _CACHE
+
+
+def record_page(url: str, kind: str, html: str = None, json_ld: str = None, role: str = None, main_category: str = None):
+    """PageCache.record() on the process-wide cache; does nothing unless PAGE_CACHE_RECORD is set."""
+    if not recording() or not url:
+        return
+    try:
+        _cache().record(url, kind, html=html, json_ld=json_ld, role=role, main_category=main_category)
+    except Exception as e:
+        print(f"  -> ⚠️ Page cache: could not record {url}: {e}")
+
+
+def record_driver_page(driver, url: str, json_ld: str = None):
+    """Records the PDP open in `driver`; the DOM is only serialized when recording is on."""
+    if recording():
+        record_page(url, PDP, html=page_source(driver), json_ld=json_ld)
+
+
+def replay(retailer: str, out_dir: str = None, as_of: float = None, cache: PageCache = None) -> dict:
+    """
+    Re-derives a retailer's catalog JSON from cached pages, without a browser or network.
+
+    Listing snapshots go through the scraper's LISTING_PARSER and every listing
+    item is joined with the latest snapshot of its PDP through
+    scrape_product_detail_via_http(json_ld, html), the same functions a live run uses.
+    Catalogs are written under `out_dir` with the scraper's CATALOG_PATH_TEMPLATE
+    (default: page_cache/replay, pass the repo root to overwrite the live catalogs).
+
+    Returns:
+        {catalog path: number of products}
+    """
+    from crawl_scheduler import load_scraper
+
+    cache = cache or PageCache()
+    out_dir = out_dir or os.path.join(cache.path, "replay")
+    module = load_scraper(retailer)
+    keep = getattr(module, "PDP_KEEP", lambda details: details is not None)
+    start = time.perf_counter()
+
+    items_by_role = {}
+    seen_urls = set()
+    for snapshot in cache.snapshots(retailer, kind=LISTING, as_of=as_of):
+        html, _ = cache.load(snapshot)
+        for item in module.LISTING_PARSER(html, snapshot["main_category"], snapshot["role"]) or []:
+            if item.get("url") and item["url"] not in seen_urls:
+                seen_urls.add(item["url"])
+                items_by_role.setdefault(snapshot["role"], []).append(item)
+
+    pdps = {snapshot["url"]: snapshot for snapshot in cache.snapshots(retailer, kind=PDP, as_of=as_of)}
+
+    if module.PDP_PER_CATEGORY:
+        groups = list(items_by_role.items())
+    else:
+        roles = [c["role"] for c in module.CATEGORIES_TO_SCRAPE]
+        groups = [(roles[-1], [item for items in items_by_role.values() for item in items])]
+
+    written = {}
+    missing = 0
+    for role, items in groups:
+        records = []
+        for item in items:
+            snapshot = pdps.get(item["url"])
+            if snapshot is None:
+                missing += 1
+                continue
+            html, json_ld = cache.load(snapshot)
+            details = module.scrape_product_detail_via_http(json_ld, html or "")
+            if keep(details):
+                records.append({**item, **details})
+
+        path = os.path.join(out_dir, module.CATALOG_PATH_TEMPLATE.format(role=role))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=4, ensure_ascii=False)
+        written[path] = len(records)
+        print(f"  -> {path}: {len(records)} products")
+
+    elapsed = time.perf_counter() - start
+    total = sum(written.values())
+    print(
+        f"✅ Replayed {retailer}: {total} products from {len(seen_urls)} listing items in {elapsed:.1f}s "
+        f"({missing} items without a cached PDP)."
+    )
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the page cache or rebuild catalogs from it offline.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = sub.add_parser("replay", help="re-derive catalog JSON from cached pages")
+    replay_parser.add_argument("retailers", nargs="+")
+    replay_parser.add_argument("--out", help="root directory for the catalogs (default: page_cache/replay)")
+    replay_parser.add_argument("--as-of", type=float, help="only use snapshots fetched before this unix time")
+
+    sub.add_parser("stats", help="snapshot and blob counts")
+    args = parser.parse_args()
+
+    cache = PageCache()
+    if args.command == "stats":
+        cache.stats()
+    else:
+        for retailer in args.retailers:
+            replay(retailer, out_dir=args.out, as_of=args.as_of, cache=cache)
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
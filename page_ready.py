@@ -0,0 +1,125 @@
+import threading
+
+from phase_timing import span
+
+
+# Consent banners and interstitials each retailer may put over a page. Each one is
+# clicked at most once per browser session: once its choice is stored in the
+# session's cookies it does not come back, so later pages stop looking for it.
+KNOWN_OVERLAYS = {
+    "zara": [
+        {"name": "cookies", "selector": 'button[id="onetrust-accept-btn-handler"]'},
+        {"name": "geolocation", "selector": 'button[class="zds-button geolocation-modal__button zds-button--primary zds-button--small"]'},
+        {"name": "zoom-view", "selector": 'button[data-qa-action="view-option-selector-button"][aria-label="Switch to zoom 3"]'},
+    ],
+    "mango": [
+        {"name": "cookies", "selector": 'button[class="ButtonBase_button__SOIgU textActionM_className__8McJk ButtonPrimary_default__2Mbr8 CookiesFooter_button__l_Uzv"]'},
+        {"name": "country", "selector": 'button[class="ButtonBase_button__SOIgU textActionM_className__8McJk ButtonBase_fullWidth__g0ppN ButtonPrimary_default__2Mbr8"]'},
+    ],
+    "nike": [
+        {"name": "cookies", "selector": 'button[class="nds-btn modal-actions-accept-btn css-1snynq4 ex41m6f0 btn-primary-dark  btn-md"]'},
+    ],
+    "hm": [
+        {"name": "cookies", "selector": "#onetrust-accept-btn-handler"},
+    ],
+    "adidas": [
+        {"name": "cookies", "selector": "#onetrust-accept-btn-handler"},
+    ],
+    "zalando": [
+        {"name": "cookies", "selector": "#uc-btn-accept-banner"},
+    ],
+}
+
+# Resolves once `selector` is in the DOM (if given) and the page has been quiet for
+# `idle_ms`: document loaded, no nodes added/removed and no network request finished.
+# Known overlays are clicked the moment they become visible. If the page keeps
+# changing, it resolves `settle_ms` after `selector` appeared; in any case after `timeout_ms`.
+READY_JS = """
+const [selector, overlays, idleMs, settleMs, timeoutMs, done] = arguments;
+const start = performance.now();
+let lastActivity = start;
+let foundAt = null;
+const clicked = [];
+const pending = overlays.slice();
+
+const mutations = new MutationObserver(() => { lastActivity = performance.now(); });
+mutations.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+let network = null;
+try {
+    network = new PerformanceObserver(() => { lastActivity = performance.now(); });
+    network.observe({type: 'resource'});
+} catch (e) {}
+
+function visible(el) {
+    const rect = el.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0 && !el.disabled;
+}
+
+function tick() {
+    const now = performance.now();
+    for (let i = pending.length - 1; i >= 0; i--) {
+        const el = document.querySelector(pending[i].selector);
+        if (el && visible(el)) {
+            el.click();
+            clicked.push(pending[i].name);
+            pending.splice(i, 1);
+            lastActivity = now;
+        }
+    }
+    const found = !selector || document.querySelector(selector) !== null;
+    if (found && foundAt === null) foundAt = now;
+    const quiet = document.readyState === 'complete' && now - lastActivity >= idleMs;
+    const settled = found && (quiet || (selector && now - foundAt >= settleMs));
+    if (settled || (!selector && quiet) || now - start >= timeoutMs) {
+        mutations.disconnect();
+        if (network) network.disconnect();
+        done({ready: found, quiet: quiet, waited_ms: Math.round(now - start), clicked: clicked});
+        return;
+    }
+    setTimeout(tick, 50);
+}
+tick();
+"""
+
+_handled = {}  # browser session id -> names of the overlays already dismissed in it
+_handled_lock = threading.Lock()
+
+
+def pending_overlays(driver, retailer: str) -> list:
+    """The retailer's KNOWN_OVERLAYS not yet dismissed in this driver's session."""
+    with _handled_lock:
+        handled = _handled.get(driver.session_id, set())
+    return [overlay for overlay in KNOWN_OVERLAYS.get(retailer, ()) if overlay["name"] not in handled]
+
+
+def wait_ready(driver, retailer: str = None, selector: str = None, timeout: float = 10,
+               idle_ms: int = 500, settle_ms: int = 1500) -> dict:
+    """
+    Waits until the page open in `driver` is usable, dismissing known overlays on the way.
+
+    Returns as soon as `selector` is present and the DOM/network went quiet
+    (see READY_JS), instead of sleeping for a fixed time. A missing element
+    costs at most `timeout` seconds once, not once per WebDriverWait.
+
+    Returns:
+        {"ready": selector found, "quiet": page idle, "waited_ms": int, "clicked": [overlay names]}
+    """
+    overlays = pending_overlays(driver, retailer) if retailer else []
+    try:
+        driver.set_script_timeout(timeout + 5)
+        with span("ready"):
+            state = driver.execute_async_script(READY_JS, selector, overlays, idle_ms, settle_ms, int(timeout * 1000))
+    except Exception as e:
+        print(f"  -> ⚠️ Readiness check failed: {e}")
+        return {"ready": False, "quiet": False, "waited_ms": int(timeout * 1000), "clicked": []}
+
+    if state["clicked"]:
+        with _handled_lock:
+            _handled.setdefault(driver.session_id, set()).update(state["clicked"])
+        print(f"  -> Dismissed overlays: {', '.join(state['clicked'])}")
+    return state
+
+
+def element_present(driver, selector: str) -> bool:
+    """Checks for `selector` right now, without waiting."""
+    return bool(driver.execute_script("return document.querySelector(arguments[0]) !== null;", selector))
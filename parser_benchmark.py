@@ -0,0 +1,447 @@
+import os
+import io
+import sys
+import glob
+import gzip
+import json
+import time
+import argparse
+import tracemalloc
+from contextlib import redirect_stdout
+from html import escape
+from urllib.parse import urlsplit
+
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(ROOT_DIR, "benchmark_fixtures")
+# Absolute timings only mean something on the machine that measured them: the baseline is local (gitignored)
+BASELINE_PATH = os.path.join(FIXTURE_DIR, "baseline.json")
+
+RETAILERS = ("zara", "hm", "mango", "nike", "adidas", "zalando")
+
+# Fixture "source" values: real pages from the page cache, or the fallback built from catalog JSON
+RECORDED_SOURCE = "page_cache"
+SYNTHETIC_SOURCE = "synthetic fallback (built from catalog JSON, not recorded pages)"
+
+# Catalogs the synthetic fallback fixtures are built from
+CATALOG_GLOBS = {
+    "zara": "zara_catalog/**/*.json",
+    "hm": "h&m_catalog/**/*.json",
+    "mango": "mango_catalog/**/*.json",
+    "nike": "nike_catalog/**/*.json",
+    "adidas": "adidas_catalog/**/*.json",
+    "zalando": "zalando_catalog/**/*.json",
+}
+
+# JSON-LD block id the PDP parser expects (see make_http_prefetch calls)
+JSON_LD_SCRIPT_IDS = {"hm": "product-schema"}
+
+# Allowed slowdown (records/sec) or growth (peak memory) before a result is flagged
+DEFAULT_TOLERANCE = 0.2
+
+
+# --- FIXTURES ---
+
+def fixture_path(retailer: str) -> str:
+    return os.path.join(FIXTURE_DIR, f"{retailer}.json.gz")
+
+
+def save_fixture(retailer: str, fixture: dict):
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    with gzip.open(fixture_path(retailer), "wt", encoding="utf-8") as f:
+        json.dump(fixture, f, ensure_ascii=False)
+    print(
+        f"✅ {retailer}: {len(fixture['listing'])} listing pages and {len(fixture['pdps'])} PDPs "
+        f"({fixture['source']}) written to {fixture_path(retailer)}"
+    )
+
+
+def load_fixture(retailer: str) -> dict:
+    """{source, listing: [{url, role, main_category, html}], pdps: [{url, html, json_ld}]}"""
+    with gzip.open(fixture_path(retailer), "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def is_synthetic(fixture: dict) -> bool:
+    return fixture.get("source") != RECORDED_SOURCE
+
+
+def record_fixture(retailer: str, max_pdps: int = 25) -> bool:
+    """
+    Replaces a retailer's fixture with real pages from the page cache (see page_cache).
+
+    If the cache has none and the retailer has no fixture yet, the synthetic
+    fallback is built instead; a recorded fixture is never replaced by it.
+    """
+    from page_cache import LISTING, PDP, PageCache
+
+    cache = PageCache()
+    listing = []
+    for snapshot in cache.snapshots(retailer, kind=LISTING):
+        html, _ = cache.load(snapshot)
+        listing.append({"url": snapshot["url"], "role": snapshot["role"],
+                        "main_category": snapshot["main_category"], "html": html})
+    pdps = []
+    for snapshot in cache.snapshots(retailer, kind=PDP)[:max_pdps]:
+        html, json_ld = cache.load(snapshot)
+        pdps.append({"url": snapshot["url"], "html": html, "json_ld": json_ld})
+    cache.close()
+
+    if not listing or not pdps:
+        print(f"⚠️ {retailer}: the page cache has no listing pages or PDPs. Record a run with PAGE_CACHE_RECORD=1 first.")
+        if not os.path.exists(fixture_path(retailer)):
+            synthesize_fixture(retailer)
+        return False
+    save_fixture(retailer, {"source": RECORDED_SOURCE, "listing": listing, "pdps": pdps})
+    return True
+
+
+def _catalog_records(retailer: str, count: int) -> list:
+    records, urls = [], set()
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, CATALOG_GLOBS[retailer]), recursive=True)):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for record in data if isinstance(data, list) else []:
+            if isinstance(record, dict) and record.get("url") and record["url"] not in urls:
+                urls.add(record["url"])
+                records.append(record)
+                if len(records) == count:
+                    return records
+    return records
+
+
+def _text(record: dict, key: str, default: str = "") -> str:
+    value = record.get(key)
+    return escape(str(value)) if value not in (None, "") else default
+
+
+def _image(record: dict) -> str:
+    images = record.get("image_link") or record.get("images") or ""
+    if isinstance(images, list):
+        images = images[0] if images else ""
+    return escape(images)
+
+
+def _page(title: str, body: str, records: list) -> str:
+    """Wraps `body` in the navigation, footer and inline state that make up most of a real page's weight."""
+    nav = "".join(f'<li class="nav__item"><a class="nav__link" href="/c/{i}">Category {i}</a></li>' for i in range(150))
+    state = json.dumps({"products": records}, ensure_ascii=False).replace("</", "<\\/")
+    footer = "".join(f'<div class="footer__col"><a href="/help/{i}">Help topic {i}</a></div>' for i in range(60))
+    return (
+        f"<!DOCTYPE html><html><head><title>{escape(title)}</title></head><body>"
+        f'<header><nav><ul class="nav">{nav}</ul></nav></header>'
+        f"<main-wrapper>{body}</main-wrapper>"
+        f"<footer>{footer}</footer>"
+        f"<script>window.__PRELOADED_STATE__ = {state};</script>"
+        "</body></html>"
+    )
+
+
+def _json_ld(data, script_id: str = None) -> str:
+    attr = f' id="{script_id}"' if script_id else ""
+    return f'<script{attr} type="application/ld+json">{json.dumps(data, ensure_ascii=False)}</script>'
+
+
+def _listing_tile(retailer: str, r: dict) -> str:
+    url, title, image = escape(r["url"]), _text(r, "title", "Product"), _image(r)
+    if retailer == "zara":
+        return (
+            f'<li class="product-grid-product"><a class="product-link product-grid-product__link link" href="{url}">'
+            f'<img class="media-image__image media__wrapper--media" src="{image}" alt="{title}"></a>'
+            f'<div class="product-grid-product-info"><a class="product-link _item product-grid-product-info__name link" href="{url}">'
+            f'<h3>{title}</h3></a><span class="money-amount__main">{_text(r, "price")} USD</span></div></li>'
+        )
+    if retailer == "hm":
+        return (
+            f'<li><article><a href="{escape(urlsplit(r["url"]).path)}"><img src="{image}" data-src="{image}" '
+            f'srcset="{image} 1x"></a><h2>{title}</h2><span>$ {_text(r, "price")}</span></article></li>'
+        )
+    if retailer == "mango":
+        return (
+            f'<div class="virtual-item"><a class="ProductImage_imageWrapper__JfhWa" href="{url}">'
+            f'<img src="{image}" alt="{title}"></a><p class="ProductTitle">{title}</p></div>'
+        )
+    if retailer == "nike":
+        return (
+            f'<div class="product-card"><a class="product-card__link-overlay" href="{url}">{title}</a>'
+            f'<img class="product-card__hero-image" src="{image}" alt="{title}">'
+            f'<div class="product-card__title">{title}</div><div class="product-price">${_text(r, "price")}</div></div>'
+        )
+    if retailer == "adidas":
+        return (
+            f'<article data-testid="plp-product-card"><a data-testid="product-card-image-link" href="{url}">'
+            f'<img data-testid="product-card-primary-image" src="{image}" alt="{title}"></a>'
+            f'<p data-testid="product-card-title">{title}</p></article>'
+        )
+    return (
+        f'<article class="z5x6ht _0xLoFW JT3_zV"><a class="CKDt_l _LM JT3_zV" href="{url}">'
+        f'<img src="{image}" alt="{title}"><h3>{_text(r, "brand")}</h3><h3>{title}</h3></a></article>'
+    )
+
+
+def _listing_html(retailer: str, records: list) -> str:
+    tiles = "".join(_listing_tile(retailer, r) for r in records)
+    containers = {
+        "zara": '<ul class="product-grid__product-list">{}</ul>',
+        "hm": '<ul data-elid="product-grid">{}</ul>',
+        "mango": '<div class="virtual-list">{}</div>',
+        "nike": '<div class="product-grid__items">{}</div>',
+        "adidas": '<main data-testid="product-grid">{}</main>',
+        "zalando": "<div>{}</div>",
+    }
+    return _page(f"{retailer} listing", containers[retailer].format(tiles), records)
+
+
+def _pdp_html(retailer: str, r: dict):
+    """Returns (html, json_ld string) of a synthesized PDP for catalog record `r`."""
+    title, color = _text(r, "title", "Product"), _text(r, "schema_color")
+    description, material, price = _text(r, "schema_description"), _text(r, "material"), _text(r, "price")
+    brand = r.get("brand") if isinstance(r.get("brand"), str) else retailer.title()
+    offer = {"price": r.get("price"), "priceCurrency": "USD"}
+
+    if retailer == "zara":
+        data = [{"@type": "Product", "sku": r.get("id"), "name": r.get("title"), "color": r.get("schema_color"),
+                 "description": r.get("schema_description"), "brand": brand, "offers": offer}]
+        body = f'<h1>{title}</h1><div class="product-detail-composition">Composition: {material}</div>'
+    elif retailer == "hm":
+        data = {"@type": "Product", "name": r.get("title"), "color": r.get("schema_color"),
+                "description": r.get("schema_description"), "material": r.get("material"), "pattern": r.get("pattern"),
+                "brand": {"name": brand}, "category": {"name": r.get("category")}, "offers": [offer],
+                "audience": {"suggestedGender": r.get("audience") or "female"}}
+        body = (
+            f'<h1>{title}</h1><dl class="ad91df5"><div class="cd043b2"><dt>Description</dt><dd>{description}</dd></div>'
+            f'<div class="cd043b2"><dt>Material</dt><dd>{material}</dd></div></dl>'
+        )
+        return _page(r.get("title") or "", _json_ld(data, "product-schema") + body, [r]), json.dumps(data)
+    elif retailer == "mango":
+        images = "".join(f'<img src="{_image(r)}?w={w}" alt="{title}">' for w in (320, 640, 1024))
+        parts = "".join(f"<li>{escape(part.strip())}</li>" for part in str(r.get("material") or "").split(","))
+        body = (
+            f'<h1 class="ProductDetail_title__Go9C2">{title}</h1>'
+            f'<p class="Description_descriptionContent__pCRwU">{description}</p>'
+            f'<span class="SinglePrice_center__SWK1D">US${price}</span>'
+            f'<span class="ColorSelectorPicker_selected__ek_DA"><img alt="Color {color} selected" src="{_image(r)}"></span>'
+            f'<div class="CustomCursor_container__EeBvB">{images}</div>'
+            f'<div data-dialog-container="true"><ul class="Composition_list__JsVcC">{parts}</ul></div>'
+        )
+        return _page(r.get("title") or "", body, [r]), None
+    elif retailer == "nike":
+        data = {"@type": "Product", "name": r.get("title"), "color": r.get("schema_color"), "offers": offer}
+        body = (
+            f'<h1>{title}</h1><p data-testid="product-description">{description}</p>'
+            f'<ul><li data-testid="product-description-color-description">Shown: {color}</li>'
+            f'<li data-testid="product-description-style-color">Style: {_text(r, "id")}</li></ul>'
+            f'<span data-testid="currentPrice-container">${price}</span>'
+        )
+    elif retailer == "adidas":
+        data = {"@type": "Product", "sku": r.get("id"), "name": r.get("title"), "color": r.get("schema_color"),
+                "description": r.get("schema_description"), "material": r.get("material"),
+                "brand": {"name": brand}, "offers": offer}
+        body = f'<div id="main-content"><h1>{title}</h1><p>{description}</p></div>'
+    else:
+        data = {"@type": "Product", "name": r.get("title"), "image": r.get("images"), "color": r.get("schema_color"),
+                "description": r.get("schema_description"), "manufacturer": r.get("brand"),
+                "offers": [{"price": r.get("price"), "priceCurrency": "EUR"}]}
+        body = f'<div id="z-pdp-main-content"><h1>{title}</h1></div>'
+
+    return _page(r.get("title") or "", _json_ld(data) + body, [r]), json.dumps(data)
+
+
+def synthesize_fixture(retailer: str, listing_items: int = 60, max_pdps: int = 25):
+    """
+    Builds a fallback fixture from the retailer's catalog JSON, for when no pages were recorded.
+
+    The markup only follows the selectors the parsers use, padded with
+    navigation and inline state to a plausible page weight, so its timings are
+    not representative of real pages. Use record_fixture() once real pages are
+    in the page cache.
+    """
+    records = _catalog_records(retailer, listing_items)
+    if not records:
+        print(f"❌ {retailer}: no catalog records to build a fixture from.")
+        return
+    role = records[0].get("role") or "all"
+    main_category = records[0].get("main_category") or "all"
+
+    listing = [{"url": f"synthetic://{retailer}/listing", "role": role, "main_category": main_category,
+                "html": _listing_html(retailer, records)}]
+    pdps = []
+    for record in records[:max_pdps]:
+        html, json_ld = _pdp_html(retailer, record)
+        pdps.append({"url": record["url"], "html": html, "json_ld": json_ld})
+    save_fixture(retailer, {"source": SYNTHETIC_SOURCE, "listing": listing, "pdps": pdps})
+
+
+# --- BENCHMARK ---
+
+def _measure(fn, inputs: list, repeat: int) -> dict:
+    """
+    Runs fn(*args) over `inputs` `repeat` times; returns records/sec of the fastest pass
+    (the least disturbed by other load on the machine) and, from one extra traced pass, peak memory.
+    """
+    sink = io.StringIO()  # the parsers print debug lines per product
+    records = 0
+    elapsed = None
+    with redirect_stdout(sink):
+        fn(*inputs[0])  # warm-up (imports, selector compilation)
+        for _ in range(repeat):
+            records = 0
+            start = time.perf_counter()
+            for args in inputs:
+                records += fn(*args)
+                sink.seek(0)
+                sink.truncate()
+            took = time.perf_counter() - start
+            elapsed = took if elapsed is None else min(elapsed, took)
+
+        tracemalloc.start()
+        for args in inputs:
+            fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "inputs": len(inputs),
+        "records": records,
+        "records_per_sec": round(records / elapsed, 1) if elapsed else 0.0,
+        "ms_per_input": round(elapsed * 1000 / len(inputs), 2),
+        "peak_mb": round(peak / 1e6, 2),
+    }
+
+
+def bench_retailer(retailer: str, repeat: int = 10) -> dict:
+    """Times the retailer's listing parser and PDP JSON-LD extraction + field mapping on its fixture."""
+    from crawl_scheduler import load_scraper
+    from html_parsing import HTML_PARSER
+    from http_fetch import NeedsBrowser, extract_json_ld
+
+    module = load_scraper(retailer)
+    fixture = load_fixture(retailer)
+    script_id = JSON_LD_SCRIPT_IDS.get(retailer)
+
+    def listing(html, main_category, role):
+        return len(module.LISTING_PARSER(html, main_category, role) or [])
+
+    def pdp(html):
+        try:
+            details = module.scrape_product_detail_via_http(extract_json_ld(html, script_id=script_id), html)
+        except NeedsBrowser:
+            return 0
+        return 1 if details else 0
+
+    if is_synthetic(fixture):
+        print(f"⚠️ {retailer}: synthetic fallback fixture, timings are not representative of real pages. "
+              "Record pages with PAGE_CACHE_RECORD=1 and run 'python parser_benchmark.py record'.")
+    return {
+        "source": fixture["source"],
+        "html_parser": HTML_PARSER,
+        "listing": _measure(listing, [(p["html"], p["main_category"], p["role"]) for p in fixture["listing"]], repeat),
+        "pdp": _measure(pdp, [(p["html"],) for p in fixture["pdps"]], repeat),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """
+    Returns a message for every stage that is slower or uses more memory than the baseline allows.
+
+    Retailers whose baseline was measured on another kind of fixture (recorded
+    vs. synthetic) or another HTML parser are not compared.
+    """
+    regressions = []
+    for retailer, stages in results.items():
+        base_stages = baseline.get(retailer, {})
+        if base_stages and (base_stages.get("source"), base_stages.get("html_parser", stages["html_parser"])) != (stages["source"], stages["html_parser"]):
+            print(f"⚠️ {retailer}: the baseline was measured on a different fixture or parser. Not compared; rerun with --update-baseline.")
+            continue
+        for stage in ("listing", "pdp"):
+            current, base = stages[stage], baseline.get(retailer, {}).get(stage)
+            if not base:
+                continue
+            if current["records_per_sec"] < base["records_per_sec"] * (1 - tolerance):
+                regressions.append(
+                    f"{retailer} {stage}: {current['records_per_sec']} records/sec vs baseline {base['records_per_sec']}"
+                )
+            if base["peak_mb"] and current["peak_mb"] > base["peak_mb"] * (1 + tolerance):
+                regressions.append(f"{retailer} {stage}: peak {current['peak_mb']} MB vs baseline {base['peak_mb']} MB")
+    return regressions
+
+
+def run(retailers, repeat: int = 10, tolerance: float = DEFAULT_TOLERANCE, update_baseline: bool = False) -> bool:
+    """Benchmarks `retailers`, prints the table and returns False if a regression was flagged."""
+    results = {}
+    for retailer in retailers:
+        if not os.path.exists(fixture_path(retailer)):
+            print(f"⚠️ {retailer}: no fixture, run 'python parser_benchmark.py record' first.")
+            continue
+        results[retailer] = bench_retailer(retailer, repeat=repeat)
+
+    print("\n" + "=" * 72)
+    print(f"{'retailer':<9}{'stage':<9}{'inputs':>7}{'records':>9}{'records/s':>12}{'ms/input':>10}{'peak MB':>9}")
+    print("=" * 72)
+    for retailer, stages in results.items():
+        for stage in ("listing", "pdp"):
+            s = stages[stage]
+            print(f"{retailer:<9}{stage:<9}{s['inputs']:>7}{s['records']:>9}{s['records_per_sec']:>12}"
+                  f"{s['ms_per_input']:>10}{s['peak_mb']:>9}")
+    synthetic = [retailer for retailer, stages in results.items() if stages["source"] != RECORDED_SOURCE]
+    if synthetic:
+        print(f"⚠️ Synthetic fallback fixtures: {', '.join(synthetic)}")
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=4)
+        print(f"✅ Baseline updated: {BASELINE_PATH}")
+        return True
+
+    if not baseline:
+        print("⚠️ No baseline on this machine yet. Run with --update-baseline to store one (it is not committed).")
+        return True
+
+    regressions = compare(results, baseline, tolerance)
+    for message in regressions:
+        print(f"❌ REGRESSION {message}")
+    if not regressions:
+        print(f"✅ No regressions against the baseline (tolerance {tolerance:.0%}).")
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the listing and PDP parsers on recorded fixtures.")
+    sub = parser.add_subparsers(dest="command")
+
+    run_parser = sub.add_parser("run", help="time the parsers and compare with the baseline (default)")
+    run_parser.add_argument("retailers", nargs="*", default=list(RETAILERS))
+    run_parser.add_argument("--repeat", type=int, default=10)
+    run_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    run_parser.add_argument("--update-baseline", action="store_true")
+
+    for command, help_text in (("record", "build fixtures from the page cache (synthetic fallback if it is empty)"),
+                               ("synthesize", "build synthetic fallback fixtures from the catalog JSON")):
+        fixture_parser = sub.add_parser(command, help=help_text)
+        fixture_parser.add_argument("retailers", nargs="*", default=list(RETAILERS))
+
+    args = parser.parse_args()
+    if args.command == "record":
+        for retailer in args.retailers:
+            record_fixture(retailer)
+    elif args.command == "synthesize":
+        for retailer in args.retailers:
+            synthesize_fixture(retailer)
+    else:
+        ok = run(getattr(args, "retailers", None) or RETAILERS, repeat=getattr(args, "repeat", 10),
+                 tolerance=getattr(args, "tolerance", DEFAULT_TOLERANCE),
+                 update_baseline=getattr(args, "update_baseline", False))
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
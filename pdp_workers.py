@@ -0,0 +1,152 @@
+import os
+import time
+import random
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+from run_state import DONE, FAILED, SKIPPED
+from lean_profile import LeanProfile
+from rate_control import report_controllers
+from phase_timing import set_context
+
+
+# Number of browsers working on product detail pages at the same time, per retailer.
+# Override at run time with e.g. PDP_CONCURRENCY_ZARA=4.
+PDP_CONCURRENCY = {
+    "zara": 2,
+    "hm": 3,
+    "mango": 2,
+    "nike": 2,
+    "adidas": 2,
+    "zalando": 1,
+}
+
+
+def pdp_concurrency(retailer: str) -> int:
+    """Returns the configured PDP concurrency for a retailer (env var wins over the default table)."""
+    value = os.environ.get(f"PDP_CONCURRENCY_{retailer.upper()}")
+    if value:
+        return max(1, int(value))
+    return PDP_CONCURRENCY.get(retailer, 1)
+
+
+def pdp_fetch_mode() -> str:
+    """'browser' (default) always navigates with Selenium; PDP_FETCH_MODE=http tries a plain HTTP fetch of the JSON-LD first."""
+    return os.environ.get("PDP_FETCH_MODE", "browser").lower()
+
+
+def pdp_lean_profile(retailer: str):
+    """
+    Returns a LeanProfile when PDP_LEAN_<RETAILER>=1 (or PDP_LEAN=1) is set, else None.
+
+    Opt-in, since some retailers only render the fields we need after images load.
+    """
+    value = os.environ.get(f"PDP_LEAN_{retailer.upper()}", os.environ.get("PDP_LEAN", "0"))
+    return LeanProfile() if value.lower() in ("1", "true", "yes") else None
+
+
+def run_pdp_stage(pool, items, scrape_fn, concurrency: int = 1, keep=bool, pause=None, prefetch=None, on_done=None, on_status=None, lean=None):
+    """
+    Scrapes the product detail page of every item on `concurrency` pooled drivers.
+
+    Results are merged back in the original order of `items`, exactly like the
+    serial loop did: items without a URL are skipped, `keep(details)` decides
+    whether an item makes it into the output (H&M returns None for 'Pairs',
+    failed pages return empty details), and kept items are updated in place
+    with their details.
+
+    Args:
+        pool: The DriverPool to lease browsers from. It should hold at least `concurrency` drivers.
+        items: The listing dicts collected in STEP 1.
+        scrape_fn: The retailer's scrape_product_detail_via_schema(driver, url).
+        concurrency: Number of PDPs in flight at once.
+        keep: Predicate applied to each details result (the retailer's PDP_KEEP). Results it
+            rejects are left out of the output and reported as skipped (None) or failed.
+        pause: Optional (min, max) seconds each worker sleeps after a product.
+        prefetch: Optional function urls -> {url: details} (see http_fetch.make_http_prefetch).
+            URLs it returns are not opened in the browser; the rest fall back to scrape_fn.
+        on_done: Optional callback on_done(item, details), called from the worker thread
+            as soon as a kept item finishes (e.g. appending it to the checkpoint).
+        on_status: Optional callback on_status(item, status) with the run_state status of
+            every item: 'done' if kept, 'skipped' if scrape_fn returned None, 'failed' otherwise.
+        lean: Optional lean_profile.LeanProfile that blocks images, media, fonts and
+            analytics while each PDP is open in the browser (see pdp_lean_profile).
+
+    Returns:
+        The list of successfully enriched items, in listing order.
+    """
+    total = len(items)
+    start = time.perf_counter()
+
+    prefetched = {}
+    if prefetch:
+        try:
+            prefetched = prefetch([item['url'] for item in items if item.get('url')])
+        except Exception as e:
+            print(f"  -> ❌ ERROR during HTTP prefetch, falling back to the browser for every item: {e}")
+
+    def browse(driver, url):
+        with (lean.page(driver) if lean else nullcontext()):
+            return scrape_fn(driver, url)
+
+    def scrape(item):
+        if item['url'] in prefetched:
+            details = prefetched[item['url']]
+            # Pages the HTTP path could not parse get a second chance in the browser
+            if details is None or keep(details):
+                return details
+        details = pool.run(browse, item['url'])
+        if pause:
+            time.sleep(random.uniform(*pause))
+        return details
+
+    def work(index, item):
+        print(f"\nProcessing item {index + 1}/{total} (Category: {item.get('main_category')})")
+        set_context(url=item.get('url'), category=item.get('role'))
+        if not item.get('url'):
+            print("  -> Skipping item, no URL found.")
+            return None
+        try:
+            details = scrape(item)
+        except Exception:
+            if on_status:
+                on_status(item, FAILED)
+            raise
+        if keep(details):
+            if on_done:
+                on_done(item, details)
+            status = DONE
+        else:
+            status = SKIPPED if details is None else FAILED
+        if on_status:
+            on_status(item, status)
+        return details
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(work, i, item) for i, item in enumerate(items)]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"  -> ❌ ERROR in PDP worker: {e}")
+                results.append({})
+    elapsed = time.perf_counter() - start
+
+    successful_data = []
+    for item, details in zip(items, results):
+        if not item.get('url'):
+            continue
+        if not keep(details):
+            print(f"  -> Item skipped ({item['url']}). NOT added to final list.")
+            continue
+        item.update(details)
+        successful_data.append(item)
+
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"\n✅ PDP stage: {len(successful_data)}/{total} items kept in {elapsed:.1f}s ({rate:.2f} items/sec, concurrency {concurrency}).")
+    if lean:
+        lean.report()
+    report_controllers()
+
+    return successful_data
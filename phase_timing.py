@@ -0,0 +1,168 @@
+import os
+import json
+import math
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+from seen_index import retailer_for_url
+
+
+DEFAULT_REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "timing_reports")
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_local = threading.local()
+_lock = threading.Lock()
+_spans = []  # (retailer, category, url, phase, seconds)
+
+
+def set_context(**fields):
+    """
+    Sets the url/category/retailer that spans on this thread are filed under.
+
+    The context is sticky: controlled_get() sets the URL on every navigation, and
+    the listing/PDP stages set the category, so every phase until the next page
+    belongs to that page.
+    """
+    context = getattr(_local, "context", {})
+    _local.context = {**context, **fields}
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def span(phase: str):
+    """
+    Times one phase of the current page.
+
+    Spans nest: each phase is charged only its own time, so a page function
+    wrapped as "wait" ends up with the time that was not spent in get, cookies,
+    page_source, parse, ... spans inside it (i.e. explicit waits and sleeps).
+    """
+    stack = _stack()
+    frame = [0.0]  # time spent in child spans
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        if stack:
+            stack[-1][0] += elapsed
+        _record(phase, max(0.0, elapsed - frame[0]))
+
+
+def _record(phase: str, seconds: float):
+    context = getattr(_local, "context", {})
+    url = context.get("url")
+    retailer = context.get("retailer") or retailer_for_url(url) or "unknown"
+    with _lock:
+        _spans.append((retailer, context.get("category") or "-", url, phase, seconds))
+
+
+def timed(phase: str):
+    """Decorator version of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(phase):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def page_source(driver) -> str:
+    """driver.page_source, timed as the 'page_source' phase (DOM serialization can take seconds)."""
+    with span("page_source"):
+        return driver.page_source
+
+
+def _quantile(values: list, q: float) -> float:
+    """Nearest-rank quantile of a sorted list."""
+    index = min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))
+    return values[index]
+
+
+def summary() -> dict:
+    """{retailer: {category: {phase: {count, total_s, p50_s, p95_s, p99_s}}}}"""
+    with _lock:
+        spans = list(_spans)
+
+    grouped = {}
+    for retailer, category, _, phase, seconds in spans:
+        grouped.setdefault(retailer, {}).setdefault(category, {}).setdefault(phase, []).append(seconds)
+
+    result = {}
+    for retailer, categories in grouped.items():
+        for category, phases in categories.items():
+            for phase, values in phases.items():
+                values.sort()
+                stats = {"count": len(values), "total_s": round(sum(values), 3)}
+                for q in QUANTILES:
+                    stats[f"p{int(q * 100)}_s"] = round(_quantile(values, q), 3)
+                result.setdefault(retailer, {}).setdefault(category, {})[phase] = stats
+    return result
+
+
+def _prometheus_text(stats: dict) -> str:
+    lines = [
+        "# HELP scraper_phase_seconds Time spent per scraping phase and page.",
+        "# TYPE scraper_phase_seconds summary",
+    ]
+    for retailer, categories in stats.items():
+        for category, phases in categories.items():
+            for phase, values in phases.items():
+                labels = f'retailer="{retailer}",category="{category}",phase="{phase}"'
+                for q in QUANTILES:
+                    lines.append(f'scraper_phase_seconds{{{labels},quantile="{q}"}} {values[f"p{int(q * 100)}_s"]}')
+                lines.append(f"scraper_phase_seconds_sum{{{labels}}} {values['total_s']}")
+                lines.append(f"scraper_phase_seconds_count{{{labels}}} {values['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(name: str, report_dir: str = None, prometheus_path: str = None) -> str:
+    """
+    Writes the JSON run report (summary + per-URL spans) and returns its path.
+
+    A Prometheus text-format file is written too when `prometheus_path` is given
+    or TIMING_PROMETHEUS_FILE is set (e.g. for node_exporter's textfile collector).
+    """
+    report_dir = report_dir or os.environ.get("TIMING_REPORT_DIR", DEFAULT_REPORT_DIR)
+    os.makedirs(report_dir, exist_ok=True)
+
+    stats = summary()
+    with _lock:
+        spans = [
+            {"retailer": r, "category": c, "url": u, "phase": p, "seconds": round(s, 4)}
+            for r, c, u, p, s in _spans
+        ]
+
+    path = os.path.join(report_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"name": name, "created_at": time.time(), "summary": stats, "spans": spans}, f, indent=2)
+    print(f"✅ Timing report written to {path}")
+
+    prometheus_path = prometheus_path or os.environ.get("TIMING_PROMETHEUS_FILE")
+    if prometheus_path:
+        tmp_path = prometheus_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(_prometheus_text(stats))
+        os.replace(tmp_path, prometheus_path)
+        print(f"✅ Prometheus metrics written to {prometheus_path}")
+
+    for retailer, categories in stats.items():
+        totals = {}
+        for phases in categories.values():
+            for phase, values in phases.items():
+                totals[phase] = totals.get(phase, 0.0) + values["total_s"]
+        ranked = ", ".join(f"{phase} {seconds:.1f}s" for phase, seconds in sorted(totals.items(), key=lambda kv: -kv[1]))
+        print(f"  -> {retailer}: {ranked}")
+
+    return path
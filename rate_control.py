@@ -0,0 +1,242 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from seen_index import retailer_for_url
+from phase_timing import set_context, span
+
+
+# Status codes and page fragments that mean we got an anti-bot page instead of the product
+BLOCK_STATUS_CODES = {401, 403, 429, 503}
+BOT_WALL_MARKERS = (
+    "captcha",
+    "px-captcha",
+    "access denied",
+    "_incapsula_resource",
+    "cf-chl",
+    "please verify you are a human",
+    "request unsuccessful",
+)
+
+# Challenge pages specific to the anti-bot vendor in front of each retailer
+RETAILER_WALL_MARKERS = {
+    "zara": ("reference #", "errors.edgesuite.net"),        # Akamai
+    "hm": ("reference #", "errors.edgesuite.net"),          # Akamai
+    "nike": ("reference #", "errors.edgesuite.net"),        # Akamai
+    "adidas": ("reference #", "errors.edgesuite.net"),      # Akamai
+    "mango": ("captcha-delivery.com",),                      # DataDome
+    "zalando": ("captcha-delivery.com",),                    # DataDome
+}
+
+# Full-page consent interstitials (a dismissible cookie banner is not a wall)
+CONSENT_WALL_MARKERS = (
+    "before you continue",
+    "to continue, please accept",
+)
+
+# Returns the page title, the start of the visible text and the iframe sources (challenge
+# widgets are usually iframes), enough to spot a wall page
+PAGE_HEAD_JS = """
+const frames = Array.from(document.querySelectorAll('iframe')).map(f => f.src).join(' ');
+return document.title + ' ' + (document.body ? document.body.innerText.slice(0, 3000) : '') + ' ' + frames;
+"""
+
+_blocked = threading.local()
+
+
+def looks_like_bot_wall(status_code: int, html: str) -> bool:
+    """Returns True if the response is a block/challenge page rather than a real PDP."""
+    if status_code in BLOCK_STATUS_CODES:
+        return True
+    head = html[:20000].lower()
+    return any(marker in head for marker in BOT_WALL_MARKERS)
+
+
+def looks_like_consent_wall(text: str) -> bool:
+    head = text[:20000].lower()
+    return any(marker in head for marker in CONSENT_WALL_MARKERS)
+
+
+def domain_key(url: str) -> str:
+    """Retailer key for known sites (so www/www2/shop hosts share a controller), else the host."""
+    return retailer_for_url(url) or urlsplit(url).netloc.lower()
+
+
+class DomainController:
+    """
+    AIMD concurrency and pacing for one site.
+
+    The concurrency window starts at `initial` and grows by about one request per
+    round of fast, clean responses (additive increase). A timeout, bot challenge
+    or consent wall halves it and doubles the pause between request starts
+    (multiplicative decrease). A response slower than `slow_factor` times the
+    running average latency holds the window where it is.
+
+    Usage:
+        controller = controller_for("zara")
+        with controller.request() as outcome:
+            driver.get(url)
+            outcome["ok"] = not page_is_wall(driver)
+    """
+
+    def __init__(self, domain: str, max_concurrency: int = 8, min_concurrency: int = 1, initial: int = 1,
+                 backoff: float = 0.5, base_delay: float = 1.0, max_delay: float = 60.0, slow_factor: float = 2.0):
+        self.domain = domain
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.backoff = backoff
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.slow_factor = slow_factor
+
+        self.window = float(initial)
+        self.delay = 0.0
+        self.in_flight = 0
+        self.latency_avg = None
+        self.ok = 0
+        self.failures = 0
+        self.slow = 0
+
+        self._next_start = 0.0
+        self._cond = threading.Condition()
+
+    def _reserve(self) -> float:
+        """Takes a slot (lock held) and returns how long to wait before starting the request."""
+        self.in_flight += 1
+        now = time.monotonic()
+        start_at = max(now, self._next_start)
+        self._next_start = start_at + self.delay
+        return start_at - now
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.window):
+                self._cond.wait()
+            wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """asyncio version of acquire() for http_fetch."""
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.window):
+                    wait = self._reserve()
+                    break
+            await asyncio.sleep(0.05)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def discard(self):
+        """Returns a slot without judging the response (e.g. a wall page the HTTP path gives up on)."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, ok: bool, latency: float):
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self.ok += 1
+                slow = self.latency_avg is not None and latency > self.slow_factor * self.latency_avg
+                self.latency_avg = latency if self.latency_avg is None else 0.8 * self.latency_avg + 0.2 * latency
+                if slow:
+                    self.slow += 1
+                else:
+                    self.window = min(self.max_concurrency, self.window + 1.0 / self.window)
+                    self.delay = self.delay * 0.8 if self.delay > 0.05 else 0.0
+            else:
+                self.failures += 1
+                self.window = max(self.min_concurrency, self.window * self.backoff)
+                self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+                print(f"  -> ⚠️ Rate control [{self.domain}]: backing off to {int(self.window)} in flight, {self.delay:.1f}s between requests.")
+            self._cond.notify_all()
+
+    @contextmanager
+    def request(self):
+        """Wraps one fetch. Exceptions (e.g. timeouts) count as failures; set outcome['ok'] = False for wall pages."""
+        self.acquire()
+        start = time.perf_counter()
+        outcome = {"ok": True}
+        try:
+            yield outcome
+        except Exception:
+            self.release(False, time.perf_counter() - start)
+            raise
+        self.release(outcome["ok"], time.perf_counter() - start)
+
+    def report(self) -> dict:
+        with self._cond:
+            summary = {
+                "domain": self.domain,
+                "window": round(self.window, 2),
+                "delay_s": round(self.delay, 2),
+                "ok": self.ok,
+                "failures": self.failures,
+                "slow": self.slow,
+                "latency_avg_s": round(self.latency_avg, 2) if self.latency_avg is not None else None,
+            }
+        print(
+            f"Rate control [{self.domain}]: window {summary['window']}, delay {summary['delay_s']}s, "
+            f"{summary['ok']} ok / {summary['failures']} failed / {summary['slow']} slow, avg {summary['latency_avg_s']}s."
+        )
+        return summary
+
+
+_CONTROLLERS = {}
+_CONTROLLERS_LOCK = threading.Lock()
+
+
+def controller_for(domain: str) -> DomainController:
+    """Returns the process-wide controller of a domain (RATE_MAX_CONCURRENCY_<DOMAIN> caps its window, default 8)."""
+    with _CONTROLLERS_LOCK:
+        if domain not in _CONTROLLERS:
+            env_name = "RATE_MAX_CONCURRENCY_" + "".join(c if c.isalnum() else "_" for c in domain.upper())
+            max_concurrency = int(os.environ.get(env_name, os.environ.get("RATE_MAX_CONCURRENCY", "8")))
+            _CONTROLLERS[domain] = DomainController(domain, max_concurrency=max_concurrency)
+        return _CONTROLLERS[domain]
+
+
+def page_is_wall(driver, retailer: str = None) -> bool:
+    """Checks the page currently open in `driver` for bot-challenge and consent-wall markers."""
+    try:
+        text = driver.execute_script(PAGE_HEAD_JS) or ""
+    except Exception:
+        return False
+    if looks_like_bot_wall(200, text) or looks_like_consent_wall(text):
+        return True
+    head = text.lower()
+    return any(marker in head for marker in RETAILER_WALL_MARKERS.get(retailer, ()))
+
+
+def pop_blocked_url():
+    """Returns (and clears) the last URL this thread hit a wall page on, or None."""
+    url = getattr(_blocked, "url", None)
+    _blocked.url = None
+    return url
+
+
+def controlled_get(driver, url: str):
+    """
+    driver.get(url) paced by the site's DomainController; wall pages and timeouts make it back off.
+
+    A wall page is also remembered for the calling thread, so DriverPool.run()
+    can repeat the page in a headed browser (see pop_blocked_url).
+    """
+    set_context(url=url)
+    domain = domain_key(url)
+    with controller_for(domain).request() as outcome, span("get"):
+        driver.get(url)
+        if page_is_wall(driver, domain):
+            print(f"  -> ⚠️ Wall page detected on {url}")
+            outcome["ok"] = False
+            _blocked.url = url
+
+
+def report_controllers() -> list:
+    with _CONTROLLERS_LOCK:
+        controllers = list(_CONTROLLERS.values())
+    return [controller.report() for controller in controllers]
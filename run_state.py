@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape_state.sqlite3")
+
+# Per-URL status of a queued product
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"  # H&M 'Pairs' products, which we never keep
+
+UNFINISHED = (PENDING, FAILED)
+
+
+def resume_requested(argv=None) -> bool:
+    """Parses the scrapers' command line: `python zara_scraper.py --resume`."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip the listing phase and only scrape the products a previous run did not finish",
+    )
+    return parser.parse_args(argv).resume
+
+
+class RunState:
+    """
+    Persists the listing queue of one scraper run and the status of every queued URL.
+
+    STEP 1 saves its items with save_queue(); STEP 2 reports each product through
+    mark(). If the run dies, `--resume` reloads the queue with unfinished() and
+    only the pending/failed products go back to the browsers.
+
+    Usage:
+        state = RunState("zara/coats")
+        queued = state.unfinished() if resume else None
+        if queued is None:
+            ...  # STEP 1
+            state.save_queue(all_data)
+        run_pdp_stage(..., on_status=state.mark)
+        state.finish(checkpoint)
+    """
+
+    def __init__(self, run_key: str, path: str = DEFAULT_STATE_PATH):
+        self.run_key = run_key
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS queue (
+                run        TEXT NOT NULL,
+                position   INTEGER NOT NULL,
+                url        TEXT NOT NULL,
+                item       TEXT NOT NULL,
+                status     TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (run, url)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def save_queue(self, items: list):
+        """Replaces the queue of this run with the listing items, all pending."""
+        now = time.time()
+        rows = []
+        for position, item in enumerate(items):
+            if item.get('url'):
+                rows.append((self.run_key, position, item['url'], json.dumps(item, ensure_ascii=False), PENDING, now))
+        with self._lock:
+            self._conn.execute("DELETE FROM queue WHERE run = ?", (self.run_key,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO queue (run, position, url, item, status, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        print(f"  -> Run state: queued {len(rows)} products for '{self.run_key}'.")
+
+    def mark(self, item: dict, status: str):
+        """Records the outcome of one product; safe to call from PDP worker threads."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE queue SET status = ?, updated_at = ? WHERE run = ? AND url = ?",
+                (status, time.time(), self.run_key, item['url']),
+            )
+            self._conn.commit()
+
+    def urls(self) -> list:
+        """Every queued URL, in listing order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM queue WHERE run = ? ORDER BY position", (self.run_key,)
+            ).fetchall()
+        return [url for (url,) in rows]
+
+    def done_urls(self) -> set:
+        """URLs whose product was scraped and kept (status 'done')."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM queue WHERE run = ? AND status = ?", (self.run_key, DONE)
+            ).fetchall()
+        return {url for (url,) in rows}
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM queue WHERE run = ? GROUP BY status", (self.run_key,)
+            ).fetchall()
+        return dict(rows)
+
+    def unfinished(self):
+        """
+        Returns the pending and failed listing items, in listing order.
+
+        Returns None when no queue was saved for this run, so the caller knows it
+        has to run the listing phase.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item, status FROM queue WHERE run = ? ORDER BY position", (self.run_key,)
+            ).fetchall()
+        if not rows:
+            return None
+        return [json.loads(item) for item, status in rows if status in UNFINISHED]
+
+    def finish(self, checkpoint) -> list:
+        """
+        Compacts the run's checkpoint into the catalog file.
+
+        While products are still unfinished the queue and the checkpoint are kept,
+        so the next `--resume` retries them and the catalog still gets every
+        product of the run. Otherwise the queue is cleared.
+        """
+        left = self.unfinished() or []
+        data = checkpoint.compact(order=self.urls(), keep_checkpoint=bool(left))
+        print(f"  -> Run state for '{self.run_key}': {self.counts()}")
+        if left:
+            print(f"  -> {len(left)} products unfinished. Rerun with --resume to retry them.")
+        else:
+            self.clear()
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM queue WHERE run = ?", (self.run_key,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,64 @@
+import time
+
+from phase_timing import timed
+
+
+# CSS selector matching one product tile on each retailer's listing grid
+GRID_SELECTORS = {
+    "zara": "ul.product-grid__product-list > li",
+    "hm": 'ul[data-elid="product-grid"] li',
+    "mango": "div.virtual-list div.virtual-item",
+    "nike": "div.product-grid__items > div.product-card",
+    "adidas": 'main[data-testid="product-grid"] article[data-testid="plp-product-card"]',
+    "zalando": 'article[class*="z5x6ht"]',
+}
+
+# Returns [tile count, document height, scrolled to bottom]
+GRID_STATE_JS = """
+return [
+    document.querySelectorAll(arguments[0]).length,
+    document.documentElement.scrollHeight,
+    window.scrollY + window.innerHeight >= document.documentElement.scrollHeight - 2
+];
+"""
+
+# Scrolls one step and reports the grid state in the same round trip
+SCROLL_STEP_JS = "window.scrollBy(0, arguments[1]);" + GRID_STATE_JS
+
+
+@timed("scroll")
+def scroll_until_stable(driver, tile_selector: str, step: int = 850, pause: float = 0.8,
+                        max_loops: int = 40, patience: int = 2, poll: float = 0.1):
+    """
+    Scrolls the listing page until the product grid stops growing.
+
+    After every scroll step the page is polled for up to `pause` seconds and the
+    next step starts as soon as new tiles (or a taller document) show up. The
+    loop stops once we are at the bottom of the page and `patience` consecutive
+    steps added nothing, or after `max_loops` steps.
+
+    Returns:
+        The number of tiles each step added.
+    """
+    tiles, height, _ = driver.execute_script(GRID_STATE_JS, tile_selector)
+    added_per_step = []
+    stalled = 0
+
+    for loop in range(1, max_loops + 1):
+        new_tiles, new_height, at_bottom = driver.execute_script(SCROLL_STEP_JS, tile_selector, step)
+
+        deadline = time.monotonic() + pause
+        while new_tiles == tiles and new_height == height and time.monotonic() < deadline:
+            time.sleep(poll)
+            new_tiles, new_height, at_bottom = driver.execute_script(GRID_STATE_JS, tile_selector)
+
+        added_per_step.append(new_tiles - tiles)
+        grew = new_tiles > tiles or new_height > height
+        tiles, height = new_tiles, new_height
+
+        stalled = 0 if grew or not at_bottom else stalled + 1
+        if stalled >= patience:
+            break
+
+    print(f"  -> Scrolled {len(added_per_step)} steps, {tiles} tiles loaded (added per step: {added_per_step}).")
+    return added_per_step
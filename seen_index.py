@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import urlsplit
+
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrape_index.sqlite3")
+
+# Host fragment -> retailer key used across the scrapers
+RETAILER_HOSTS = {
+    "zara.com": "zara",
+    "hm.com": "hm",
+    "mango.com": "mango",
+    "nike.com": "nike",
+    "adidas.com": "adidas",
+    "zalando.": "zalando",
+}
+
+
+def retailer_for_url(url: str):
+    """Maps a product URL to its retailer key, or None for unknown hosts."""
+    host = urlsplit(url or "").netloc.lower()
+    for fragment, retailer in RETAILER_HOSTS.items():
+        if fragment in host:
+            return retailer
+    return None
+
+
+class SeenIndex:
+    """
+    Local on-disk index of products we already scraped, keyed by retailer, URL and SKU.
+
+    Lookups hit an in-memory set loaded from SQLite, so checking a listing tile
+    is O(1). Products are recorded once they are in the catalog file (after
+    CheckpointWriter.compact) and only if their PDP finished with status 'done'
+    in RunState, so a crash or a failed page never hides a product for good.
+    The SKU (product id) is stored with each URL for reconciling with product_data.
+
+    Usage:
+        seen = SeenIndex()
+        all_data = seen.filter_new("zara", all_data)
+        ...
+        done = state.done_urls()
+        data = state.finish(checkpoint)
+        seen.mark_done("zara", [record for record in data if record['url'] in done])
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS seen (
+                retailer   TEXT NOT NULL,
+                url        TEXT NOT NULL,
+                sku        TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (retailer, url)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS seen_sku ON seen (retailer, sku)")
+        self._conn.commit()
+
+        self._urls = {}
+        for retailer, url in self._conn.execute("SELECT retailer, url FROM seen"):
+            self._urls.setdefault(retailer, set()).add(url)
+
+    def has_url(self, retailer: str, url: str) -> bool:
+        return url in self._urls.get(retailer, ())
+
+    def filter_new(self, retailer: str, items: list) -> list:
+        """Drops listing items whose URL is already in the index."""
+        new_items = [item for item in items if not self.has_url(retailer, item.get('url'))]
+        skipped = len(items) - len(new_items)
+        if skipped:
+            print(f"  -> Seen index: skipping {skipped} already scraped {retailer} products.")
+        return new_items
+
+    def _add_rows(self, rows: list):
+        """rows: list of (retailer, url, sku)."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO seen (retailer, url, sku, updated_at) VALUES (?, ?, ?, ?)",
+                [(retailer, url, sku, now) for retailer, url, sku in rows],
+            )
+            self._conn.commit()
+            for retailer, url, sku in rows:
+                self._urls.setdefault(retailer, set()).add(url)
+
+    @staticmethod
+    def _rows(retailer: str, items: list) -> list:
+        return [(retailer, item['url'], str(item['id']) if item.get('id') else None) for item in items if item.get('url')]
+
+    def mark_done(self, retailer: str, items: list):
+        """Records finished products (URL and, when known, SKU/id) once they are saved in the catalog file."""
+        self._add_rows(self._rows(retailer, items))
+
+    def import_catalog(self, retailer: str, filepath: str) -> int:
+        """Seeds the index from an existing catalog JSON file (replaces products_already_in_database)."""
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        rows = self._rows(retailer, data)
+        self._add_rows(rows)
+        print(f"Loaded {len(rows)} previously scraped {retailer} product URLs into the seen index.")
+        return len(rows)
+
+    def sync_from_supabase(self, supabase_client, table_name: str = "product_data", page_size: int = 1000) -> int:
+        """
+        Reconciles the index with the database in one bulk pass over (id, url).
+
+        Rows for unknown hosts are ignored.
+        """
+        rows = []
+        offset = 0
+        while True:
+            response = (
+                supabase_client.table(table_name)
+                .select("id, url")
+                .range(offset, offset + page_size - 1)
+                .execute()
+            )
+            chunk = response.data
+            if not chunk:
+                break
+            for record in chunk:
+                retailer = retailer_for_url(record.get('url'))
+                if retailer:
+                    rows.append((retailer, record['url'], str(record['id']) if record.get('id') else None))
+            if len(chunk) < page_size:
+                break
+            offset += page_size
+
+        self._add_rows(rows)
+        print(f"✅ Seen index synced with '{table_name}': {len(rows)} products.")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild the seen index from product_data or from catalog files.")
+    parser.add_argument(
+        "--catalog",
+        nargs=2,
+        action="append",
+        metavar=("RETAILER", "PATH"),
+        help="seed from a catalog JSON already on disk instead of Supabase, e.g. --catalog zara zara_catalog/donna/coats.json",
+    )
+    args = parser.parse_args()
+
+    index = SeenIndex()
+    if args.catalog:
+        for retailer, path in args.catalog:
+            index.import_catalog(retailer, path)
+    else:
+        # Rebuild the local index from product_data, e.g. after a manual upload to Supabase
+        from supabase_queries import setup_supabase_client
+
+        index.sync_from_supabase(setup_supabase_client())
+    index.close()
@@ -1,9 +1,17 @@
 import os
 import json
+import time
+import random
+import threading
 import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from vector_codec import EMBEDDING_COLUMNS, decode_matrix, encode_record, is_missing
+
+
 def setup_supabase_client() -> Client:
     """
     Initializes and returns the Supabase client instance using the provided URL and key.
@@ -32,53 +40,150 @@ def setup_supabase_client() -> Client:
         return None 
 
 
+def setup_postgrest_client(url: str = None, key: str = None):
+    """
+    Client for a plain PostgREST server, e.g. a local one in front of a throwaway Postgres.
+
+    It exposes the same table(...) query builder as the Supabase client, so
+    the readers and upsert_records() can be run against it. Reads
+    POSTGREST_URL (default http://localhost:3000) and POSTGREST_KEY (a JWT, optional).
+    """
+    from postgrest import SyncPostgrestClient
+
+    load_dotenv()
+    url = url or os.environ.get("POSTGREST_URL", "http://localhost:3000")
+    key = key or os.environ.get("POSTGREST_KEY")
+    headers = {"Authorization": f"Bearer {key}"} if key else {}
+    client = SyncPostgrestClient(url, headers=headers)
+    print(f"✅ PostgREST client initialized for {url}.")
+    return client
+
+
+
+def _chunk_values(values: list, max_items: int, max_chars: int) -> list:
+    """Splits values into chunks small enough for one PostgREST `in.(...)` query string."""
+    chunks = []
+    current = []
+    current_chars = 0
+    for value in values:
+        size = len(str(value)) + 3  # quotes and comma
+        if current and (len(current) >= max_items or current_chars + size > max_chars):
+            chunks.append(current)
+            current = []
+            current_chars = 0
+        current.append(value)
+        current_chars += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def values_existing_in_column(supabase_client: Client, table_name: str, column_name: str, values, chunk_size: int = 200, max_chars: int = 6000, max_workers: int = 4) -> set:
+    """
+    Returns the subset of `values` already present in `table_name.column_name`.
+
+    The values are split into chunks sent as `in_` filters (bounded by item count and
+    query-string length), and the chunks run concurrently, so checking thousands of
+    values costs a handful of requests instead of one per value.
+
+    Args:
+        supabase_client: The initialized Supabase Client.
+        table_name: The table to look in (e.g. "product_data").
+        column_name: The column to match against (e.g. "url" or "id").
+        values: Iterable of values to check. None values are ignored.
+        chunk_size: Maximum number of values per request.
+        max_chars: Approximate maximum length of the filter per request.
+        max_workers: Number of chunk requests in flight at once.
+
+    Returns:
+        A set with the input values that exist in the column.
+    """
+    unique_values = list(dict.fromkeys(v for v in values if v is not None))
+    if not unique_values:
+        return set()
+
+    chunks = _chunk_values(unique_values, chunk_size, max_chars)
+
+    def fetch_chunk(chunk):
+        try:
+            response = (
+                supabase_client.table(table_name)
+                .select(column_name)
+                .in_(column_name, chunk)
+                .execute()
+            )
+            return {str(row[column_name]) for row in response.data}
+        except Exception as e:
+            print(f"❌ Error during bulk existence check on '{table_name}.{column_name}': {e}")
+            return set()
+
+    found = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for chunk_found in executor.map(fetch_chunk, chunks):
+            found.update(chunk_found)
+
+    # Hand back the caller's own values (ids may come back as int while we sent str)
+    return {value for value in unique_values if str(value) in found}
+
 
 def check_if_value_exists_in_colum(supabase_client: Client, table_name: str, column_name: str, value: str) -> bool:
-    
+    """Single-value wrapper around values_existing_in_column."""
+    return value in values_existing_in_column(supabase_client, table_name, column_name, [value])
 
-    try:
-        # print(f"Starting single match existence check on '{table_name}' for {column_name} = '{value}'...")
-        
-        # 1. Select only the column we're filtering on (minimal payload)
-        # 2. Filter for the matching value
-        # 3. Limit to 1 (stop searching after first match)
-        # 4. Use maybe_single() to handle 0 or 1 result gracefully
-        response = (
-            supabase_client.table(table_name)
-            .select(column_name)  
-            .eq(column_name, value)
-            .limit(1)  
-            .maybe_single()
-            .execute()
-        )
-        
-        
-        # response.data will be a dictionary (the matching record) or None (no match).
-        exists = response.data is not None
-        
-
-        return exists
-            
-    except Exception as e:
-        # print(f"❌ Error during existence check: {e}")
-        return False
-            
 
 
-def query_products_in_main_category(supabase_client: Client, main_category: str, table_name: str) -> pd.DataFrame:
+def _select_list(columns) -> str:
+    """PostgREST select string for a column list (None selects every column)."""
+    return ",".join(columns) if columns else "*"
+
+
+def _column_dtypes(columns, dtypes) -> dict:
+    """Embedding columns default to float32 vectors; `dtypes` overrides (None keeps a column as sent)."""
+    defaults = {name: "float32" for name in EMBEDDING_COLUMNS if not columns or name in columns}
+    return {**defaults, **(dtypes or {})}
+
+
+def _vector_cells(values, dtype) -> list:
+    """One 1-D ndarray per row (views into a single decoded matrix), None where the row has no vector."""
+    values = list(values)
+    matrix = decode_matrix(values, dtype)
+    return [None if is_missing(value) else row for row, value in zip(matrix, values)]
+
+
+def _apply_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """Decodes embedding columns and casts the other columns named in `dtypes`."""
+    for name, dtype in dtypes.items():
+        if name not in df.columns or dtype is None:
+            continue
+        if name in EMBEDDING_COLUMNS:
+            df[name] = pd.Series(_vector_cells(df[name], dtype), index=df.index, dtype=object)
+        else:
+            df[name] = df[name].astype(dtype)
+    return df
+
+
+def query_products_in_main_category(supabase_client: Client, main_category: str, table_name: str,
+                                    columns: list = None, dtypes: dict = None) -> pd.DataFrame:
+    """
+    Returns the products of a main category.
+
+    `columns` limits the columns fetched (default: all). Embedding columns come
+    back as float32 ndarrays; `dtypes` maps column names to other dtypes
+    (None leaves a column as sent). The other readers take the same two arguments.
+    """
 
     print(f"Querying records in main category: '{main_category}'...")
     
     response = (
         supabase_client.table(table_name)
-        .select("*")  # Select all columns
+        .select(_select_list(columns))
         .eq("main_category", main_category)  # Filter by main category
         .execute()
     )
     
     # Convert the response data to a pandas DataFrame
     data = response.data
-    df = pd.DataFrame(data)
+    df = _apply_dtypes(pd.DataFrame(data), _column_dtypes(columns, dtypes))
     
     print(f"✅ Retrieved {len(df)} records in main category '{main_category}'.")
 
@@ -86,74 +191,368 @@ def query_products_in_main_category(supabase_client: Client, main_category: str,
     return df
 
 
-def query_product_url(supabase_client: Client, url: str, table_name: str) -> pd.DataFrame:
+def query_product_url(supabase_client: Client, url: str, table_name: str,
+                      columns: list = None, dtypes: dict = None) -> pd.DataFrame:
 
     print(f"Querying record with url: '{url}'...")
     
     response = (
         supabase_client.table(table_name)
-        .select("*")  # Select all columns
+        .select(_select_list(columns))
         .eq("url", url)  # Filter by main category
         .execute()
     )
     
     # Convert the response data to a pandas DataFrame
     data = response.data
-    df = pd.DataFrame(data)
+    df = _apply_dtypes(pd.DataFrame(data), _column_dtypes(columns, dtypes))
     
     print(f"✅ Retrieved {len(df)} record with url '{url}'.")
 
     
     return df
 
-def query_products_in_role(supabase_client: Client, role: str, table_name: str) -> pd.DataFrame:
+def query_products_in_role(supabase_client: Client, role: str, table_name: str,
+                           columns: list = None, dtypes: dict = None) -> pd.DataFrame:
 
     print(f"Querying records in role: '{role}'...")
 
     response = (
         supabase_client.table(table_name)
-        .select("*")  # Select all columns
+        .select(_select_list(columns))
         .eq("role", role)  # Filter by main category
         .execute()
     )
 
     # Convert the response data to a pandas DataFrame
     data = response.data
-    df = pd.DataFrame(data)
+    df = _apply_dtypes(pd.DataFrame(data), _column_dtypes(columns, dtypes))
 
     print(f"✅ Retrieved {len(df)} records in main category '{role}'.")
 
 
     return df
 
-def load_table(supabase_client: Client, table_name: str, page_size: int = 1000):
-    all_data = []
-    offset = 0
-    total_loaded = 0
+def _key_ranges(supabase_client: Client, table_name: str, key: str, page_size: int):
+    """
+    Yields the (first, last) `key` of consecutive pages of `table_name` (keyset pagination).
 
+    Only the key column is read, ordered by key and continuing after the last
+    key seen, so each step is an index range scan instead of an OFFSET that
+    gets slower with every page.
+    """
+    last = None
     while True:
-        response = (
+        query = supabase_client.table(table_name).select(key).order(key).limit(page_size)
+        if last is not None:
+            query = query.gt(key, last)
+        keys = [row[key] for row in query.execute().data]
+        if not keys:
+            return
+        yield keys[0], keys[-1]
+        if len(keys) < page_size:
+            return
+        last = keys[-1]
+
+
+def _append_columns(columns: dict, rows: list, loaded: int, vector_dtypes: dict) -> int:
+    """
+    Appends a page of row dicts to per-column lists (padding columns first seen late with None).
+
+    Embedding columns in `vector_dtypes` are decoded page by page, so their text is freed early.
+    """
+    for row in rows[:1]:
+        for name in row:
+            columns.setdefault(name, [None] * loaded)
+    for name, values in columns.items():
+        page = [row.get(name) for row in rows]
+        if name in vector_dtypes:
+            page = _vector_cells(page, vector_dtypes[name])
+        values.extend(page)
+    return len(rows)
+
+
+def load_table(supabase_client: Client, table_name: str, page_size: int = 1000, key: str = "id", max_workers: int = 4,
+               columns: list = None, dtypes: dict = None) -> pd.DataFrame:
+    """
+    Loads a whole table into a DataFrame.
+
+    Page boundaries come from a keyset scan on `key` (see _key_ranges) and the
+    pages themselves are fetched as `key` ranges, up to `max_workers` at once,
+    while the scan goes on. Pages are consumed in key order and streamed into
+    one list per column, so the rows never sit in memory as a list of dicts
+    next to the finished frame.
+
+    Args:
+        supabase_client: The initialized Supabase Client.
+        table_name: The table to load (e.g. "product_data").
+        page_size: Rows per request.
+        key: A unique, indexed column to paginate on.
+        max_workers: Page requests in flight at once.
+        columns: Columns to fetch (default: all).
+        dtypes: Column -> dtype; embedding columns default to float32 vectors (None keeps the text).
+
+    Returns:
+        The table as a DataFrame, ordered by `key`.
+    """
+    start = time.perf_counter()
+    dtypes = _column_dtypes(columns, dtypes)
+    vector_dtypes = {name: dtype for name, dtype in dtypes.items() if name in EMBEDDING_COLUMNS and dtype is not None}
+    select = _select_list(columns) if not columns or key in columns else _select_list([key, *columns])
+
+    def fetch_page(first, last):
+        return (
             supabase_client.table(table_name)
-            .select("*")
-            .range(offset, offset + page_size - 1)  # Fetch records from offset to offset + page_size - 1
+            .select(select)
+            .gte(key, first)
+            .lte(key, last)
+            .order(key)
             .execute()
+            .data
         )
-        
-        chunk = response.data
-        
-        if not chunk:
-            break  # Exit loop if no more data is returned
-
-        all_data.extend(chunk)
-        total_loaded += len(chunk)
-        
+
+    buffers = {}
+    total_loaded = 0
+    pending = deque()
+
+    def consume():
+        nonlocal total_loaded
+        total_loaded += _append_columns(buffers, pending.popleft().result(), total_loaded, vector_dtypes)
         print(f"Loaded {total_loaded} records so far...")
-        
-        if len(chunk) < page_size:
-            break # Last page was partial, so we are done
-            
-        offset += page_size
-
-    df = pd.DataFrame(all_data)
-    print(f"✅ Loaded total of {len(df)} records from table '{table_name}'.")
-    return df
\ No newline at end of file
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for first, last in _key_ranges(supabase_client, table_name, key, page_size):
+            pending.append(executor.submit(fetch_page, first, last))
+            # Bound the pages held in memory to the ones in flight
+            while len(pending) > max_workers:
+                consume()
+        while pending:
+            consume()
+
+    df = pd.DataFrame({
+        name: pd.Series(values, dtype=object) if name in vector_dtypes else values
+        for name, values in buffers.items()
+    })
+    df = _apply_dtypes(df, {name: dtype for name, dtype in dtypes.items() if name not in vector_dtypes})
+    if columns and key not in columns and key in df.columns:
+        df = df.drop(columns=[key])
+    elapsed = time.perf_counter() - start
+    print(
+        f"✅ Loaded total of {len(df)} records from table '{table_name}' in {elapsed:.1f}s "
+        f"({len(df) / elapsed if elapsed else 0:.0f} rows/sec)."
+    )
+    return df
+
+
+# --- WRITES ---
+
+# Postgres errors worth retrying: serialization failure, deadlock, statement timeout, lock not available
+TRANSIENT_PG_CODES = {"40001", "40P01", "57014", "55P03"}
+# SQLSTATE classes worth retrying: connection exception, insufficient resources
+TRANSIENT_PG_CLASSES = ("08", "53")
+# PostgREST errors worth retrying: cannot reach the database, schema cache loading, connection pool timeout
+TRANSIENT_PGRST_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+# HTTP statuses worth retrying: request timeout, rate limit, gateway errors
+TRANSIENT_HTTP_STATUSES = {408, 429, 502, 503, 504}
+# SQLSTATE classes caused by the rows themselves (data exception, integrity constraint violation):
+# only these are worth splitting a chunk for
+ROW_ERROR_PG_CLASSES = ("22", "23")
+
+DEFAULT_QUARANTINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_quarantine")
+
+
+def _http_status(error: Exception):
+    """HTTP status of a failed request, if the error carries one."""
+    # postgrest's APIError puts the status in `code` when the body is not a JSON error (e.g. a gateway page)
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, "response", None)  # httpx.HTTPStatusError
+    return getattr(response, "status_code", None)
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    True for errors a retry can fix (timeouts, rate limits, gateway errors, lock conflicts), not bad rows.
+
+    Decided on the exception type, the HTTP status and the PostgreSQL/PostgREST
+    error code only, never on the message, which can quote row values.
+    """
+    import httpx
+
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError)):
+        return True
+    status = _http_status(error)
+    if status is not None:
+        return status in TRANSIENT_HTTP_STATUSES
+    code = getattr(error, "code", None)
+    if not isinstance(code, str):
+        return False
+    return code in TRANSIENT_PG_CODES or code in TRANSIENT_PGRST_CODES or code[:2] in TRANSIENT_PG_CLASSES
+
+
+def _is_row_error(error: Exception) -> bool:
+    """True if the database rejected some rows (bad value, constraint), not the request as a whole."""
+    code = getattr(error, "code", None)
+    return isinstance(code, str) and code[:2] in ROW_ERROR_PG_CLASSES
+
+
+def _payload_size(rows: list) -> int:
+    return len(json.dumps(rows, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _chunk_records(records: list, max_rows: int, max_bytes: int) -> list:
+    """Splits records into chunks of at most `max_rows` rows and about `max_bytes` of JSON (a bigger row goes alone)."""
+    chunks = []
+    current = []
+    current_bytes = 0
+    for record in records:
+        size = _payload_size([record])
+        if current and (len(current) >= max_rows or current_bytes + size > max_bytes):
+            chunks.append(current)
+            current = []
+            current_bytes = 0
+        current.append(record)
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def upsert_records(supabase_client: Client, table_name: str, records: list, on_conflict: str = "id",
+                   chunk_rows: int = 500, max_bytes: int = 1_000_000, max_workers: int = 4,
+                   retries: int = 4, backoff: float = 1.0, quarantine_path: str = None) -> dict:
+    """
+    Upserts records in size-bounded chunks, several at once, keeping bad rows out of the way.
+
+    Records are deduplicated on `on_conflict` (the last one wins), their
+    embedding columns encoded (see vector_codec.encode_record), and split
+    into chunks of at most `chunk_rows` rows and about `max_bytes` of JSON.
+    Up to `max_workers` chunks are in flight. A transient failure (timeout,
+    rate limit, gateway error, deadlock) is retried up to `retries` times
+    with exponential backoff. A chunk rejected for its rows (SQLSTATE
+    classes 22/23, e.g. a constraint or a bad value) is split in halves
+    until the offending rows are isolated. Any other error (auth, unknown
+    table or column, RLS) would fail every row alike: it stops the upsert,
+    and the chunks not sent yet are quarantined without a request. Bad rows,
+    chunks still failing after every retry and aborted chunks are written
+    with their error to a JSONL quarantine file instead of failing the whole batch.
+
+    Works with any client exposing table(name).upsert(rows, on_conflict=...).execute(),
+    e.g. setup_postgrest_client() against a local PostgREST.
+
+    Returns:
+        {"rows", "upserted", "quarantined", "quarantine_path", "aborted", "requests", "retries",
+         "bytes_sent", "elapsed_s", "rows_per_s"}
+    """
+    start = time.perf_counter()
+    key_columns = [name.strip() for name in on_conflict.split(",")]
+    unique = {}
+    unkeyed = []  # sent as they are; the database decides (and they get quarantined if rejected)
+    for record in records:
+        key = tuple(record.get(name) for name in key_columns)
+        if None in key:
+            unkeyed.append(record)
+        else:
+            unique[key] = record
+    duplicates = len(records) - len(unique) - len(unkeyed)
+    if duplicates:
+        print(f"  -> {duplicates} duplicate '{on_conflict}' values dropped (last record kept).")
+    rows = [encode_record(record) for record in [*unique.values(), *unkeyed]]
+    chunks = _chunk_records(rows, chunk_rows, max_bytes)
+    print(f"Upserting {len(rows)} records into '{table_name}' in {len(chunks)} chunks ({max_workers} in flight)...")
+
+    lock = threading.Lock()
+    stats = {"upserted": 0, "requests": 0, "retries": 0, "bytes_sent": 0}
+    quarantined = []
+    aborted = []  # the error that stopped the upsert, if any
+
+    def send(chunk):
+        """One upsert request with retries; returns (error, transient) of the last attempt, or (None, False)."""
+        size = _payload_size(chunk)
+        for attempt in range(retries + 1):
+            with lock:
+                stats["requests"] += 1
+                stats["bytes_sent"] += size
+            try:
+                supabase_client.table(table_name).upsert(chunk, on_conflict=on_conflict).execute()
+                return None, False
+            except Exception as e:
+                if not _is_transient(e):
+                    return e, False
+                if attempt == retries:
+                    return e, True
+                delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                print(f"  -> ⚠️ Transient error on {len(chunk)} rows ({e}). Retrying in {delay:.1f}s...")
+                with lock:
+                    stats["retries"] += 1
+                time.sleep(delay)
+
+    def quarantine(chunk, error, reason):
+        print(f"  -> ❌ Quarantined {len(chunk)} row(s) ({reason}): {error}")
+        with lock:
+            quarantined.extend({"error": str(error), "record": record} for record in chunk)
+
+    def write(chunk):
+        if aborted:
+            quarantine(chunk, aborted[0], "not sent, upsert aborted")
+            return
+        error, transient = send(chunk)
+        if error is None:
+            with lock:
+                stats["upserted"] += len(chunk)
+            return
+        if transient:
+            quarantine(chunk, error, "still failing after retries")
+            return
+        if not _is_row_error(error):
+            # Not about these rows: splitting would fail the same way ~2n times
+            with lock:
+                first = not aborted
+                if first:
+                    aborted.append(error)
+            if first:
+                print(f"  -> ❌ Upsert into '{table_name}' aborted, the request itself was rejected: {error}")
+            quarantine(chunk, error, "request rejected")
+            return
+        if len(chunk) == 1:
+            quarantine(chunk, error, "rejected")
+            return
+        # The database rejected some rows: split the chunk to isolate them
+        half = len(chunk) // 2
+        write(chunk[:half])
+        write(chunk[half:])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(write, chunks))
+
+    if quarantined:
+        quarantine_path = quarantine_path or os.path.join(
+            DEFAULT_QUARANTINE_DIR, f"{table_name}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(quarantine_path)), exist_ok=True)
+        with open(quarantine_path, "a", encoding="utf-8") as f:
+            for entry in quarantined:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    elapsed = time.perf_counter() - start
+    report = {
+        "rows": len(rows),
+        "upserted": stats["upserted"],
+        "quarantined": len(quarantined),
+        "quarantine_path": quarantine_path if quarantined else None,
+        "aborted": str(aborted[0]) if aborted else None,
+        "requests": stats["requests"],
+        "retries": stats["retries"],
+        "bytes_sent": stats["bytes_sent"],
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(stats["upserted"] / elapsed) if elapsed else 0,
+    }
+    print(
+        f"{'✅' if not quarantined else '⚠️'} Upserted {report['upserted']}/{report['rows']} records into '{table_name}' "
+        f"in {report['elapsed_s']}s ({report['rows_per_s']} rows/sec, {report['bytes_sent'] / 1e6:.1f} MB sent "
+        f"in {report['requests']} requests, {report['retries']} retries)."
+    )
+    if quarantined:
+        print(f"  -> {len(quarantined)} rows quarantined in {quarantine_path}")
+    return report
@@ -0,0 +1,184 @@
+import os
+import ast
+import json
+import time
+import base64
+import argparse
+
+import numpy as np
+
+
+# Vector columns of product_data
+EMBEDDING_COLUMNS = ("embedding", "detail_embedding", "img_embedding")
+
+PGVECTOR = "pgvector"
+# Tag -> element dtype of base64 payloads ("f16:<base64>"); text columns only, pgvector columns need PGVECTOR
+BINARY_DTYPES = {"f16": np.float16, "f32": np.float32}
+FORMATS = (PGVECTOR, *BINARY_DTYPES)
+
+
+def vector_format() -> str:
+    """
+    Storage format for written vectors: VECTOR_FORMAT=pgvector (default), f32 or f16.
+
+    pgvector stays the default because it is the only format a vector column
+    accepts. Decoding it is roughly as fast as json.loads per row (0.6-1.5x
+    in our benchmark runs); only f16/f32 in a text column decode 10-40x faster.
+    """
+    fmt = os.environ.get("VECTOR_FORMAT", PGVECTOR).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown VECTOR_FORMAT {fmt!r} (expected one of {', '.join(FORMATS)})")
+    return fmt
+
+
+def encode_vector(vector, fmt: str = None):
+    """Encodes one vector (list or ndarray) for storage; None stays None."""
+    if vector is None:
+        return None
+    fmt = fmt or vector_format()
+    if fmt == PGVECTOR:
+        return json.dumps(np.asarray(vector, dtype=np.float32).tolist(), separators=(",", ":"))
+    data = np.ascontiguousarray(vector, dtype=BINARY_DTYPES[fmt]).tobytes()
+    return f"{fmt}:{base64.b64encode(data).decode('ascii')}"
+
+
+def encode_record(record: dict, columns=EMBEDDING_COLUMNS, fmt: str = None) -> dict:
+    """Copy of `record` with its vector columns encoded (see encode_vector)."""
+    fmt = fmt or vector_format()
+    return {
+        key: encode_vector(value, fmt) if key in columns and not isinstance(value, str) else value
+        for key, value in record.items()
+    }
+
+
+def is_missing(value) -> bool:
+    """None, or the NaN pandas puts in empty cells."""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _kind(value) -> str:
+    if not isinstance(value, str):
+        return "array"
+    if value.startswith("["):
+        return PGVECTOR
+    tag = value[:3]
+    if tag in BINARY_DTYPES and value[3:4] == ":":
+        return tag
+    raise ValueError(f"Unrecognized vector encoding: {value[:20]!r}...")
+
+
+def _decode_group(kind: str, values: list, dtype) -> np.ndarray:
+    """Decodes values of one encoding into an (n, D) matrix in one step."""
+    if kind == PGVECTOR:
+        # Every row must have as many elements as the first, or the joined text reshapes silently
+        if len({value.count(",") for value in values}) > 1:
+            raise ValueError("Vectors of different lengths in one column")
+        flat = np.fromstring(",".join(value.strip()[1:-1] for value in values), dtype=dtype, sep=",")
+    elif kind in BINARY_DTYPES:
+        chunks = [base64.b64decode(value[4:]) for value in values]
+        if len({len(chunk) for chunk in chunks}) > 1:
+            raise ValueError("Vectors of different lengths in one column")
+        flat = np.frombuffer(b"".join(chunks), dtype=BINARY_DTYPES[kind]).astype(dtype)
+    else:
+        return np.asarray(values, dtype=dtype)
+    if flat.size % len(values):
+        raise ValueError("Malformed vector text in one column")
+    return flat.reshape(len(values), -1)
+
+
+def decode_matrix(values, dtype=np.float32) -> np.ndarray:
+    """
+    Decodes a column of stored vectors into one contiguous (N, D) matrix.
+
+    Accepts pgvector text ("[0.1,0.2,...]"), tagged base64 ("f16:...",
+    "f32:...") and lists/arrays, even mixed in one column. Each encoding is
+    parsed in a single vectorized call over all its rows (np.fromstring on
+    the joined text, np.frombuffer on the joined bytes) instead of one
+    json.loads per row; the large gain is on f16/f32, pgvector text is
+    roughly as fast as json.loads. Rows without a vector are NaN, rows of
+    different lengths raise ValueError.
+    """
+    values = list(values)
+    groups = {}
+    for index, value in enumerate(values):
+        if not is_missing(value):
+            groups.setdefault(_kind(value), []).append(index)
+    if not groups:
+        return np.empty((len(values), 0), dtype=dtype)
+
+    if len(groups) == 1 and sum(len(indexes) for indexes in groups.values()) == len(values):
+        return _decode_group(next(iter(groups)), values, dtype)
+
+    blocks = {kind: _decode_group(kind, [values[i] for i in indexes], dtype) for kind, indexes in groups.items()}
+    dims = {block.shape[1] for block in blocks.values()}
+    if len(dims) > 1:
+        raise ValueError(f"Vectors of different lengths in one column: {sorted(dims)}")
+    matrix = np.full((len(values), dims.pop()), np.nan, dtype=dtype)
+    for kind, indexes in groups.items():
+        matrix[indexes] = blocks[kind]
+    return matrix
+
+
+# --- BENCHMARK ---
+
+def _time(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(rows: int = 2000, dim: int = 512, repeat: int = 3) -> list:
+    """
+    Times the per-row parsing used so far against decode_matrix on the same vectors.
+
+    Returns one {"method", "rows_per_s", "bytes_per_row", "max_error"} dict per method.
+    """
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    pgvector = [encode_vector(v, PGVECTOR) for v in vectors]
+    encoded = {fmt: [encode_vector(v, fmt) for v in vectors] for fmt in BINARY_DTYPES}
+
+    cases = [
+        ("json.loads per row", pgvector, lambda: np.stack([np.array(json.loads(t), dtype=np.float32) for t in pgvector])),
+        ("ast.literal_eval per row", pgvector, lambda: np.stack([np.array(ast.literal_eval(t), dtype=np.float32) for t in pgvector])),
+        ("decode_matrix pgvector", pgvector, lambda: decode_matrix(pgvector)),
+        *((f"decode_matrix {fmt}", column, (lambda column=column: decode_matrix(column))) for fmt, column in encoded.items()),
+    ]
+
+    results = []
+    for method, column, decode in cases:
+        elapsed = _time(decode, repeat)
+        error = float(np.abs(decode() - vectors).max())
+        results.append({
+            "method": method,
+            "rows_per_s": round(rows / elapsed),
+            "bytes_per_row": round(sum(len(value) for value in column) / rows),
+            "max_error": error,
+        })
+
+    baseline = results[0]["rows_per_s"]
+    print(f"Vector decoding, {rows} x {dim} (best of {repeat}):")
+    for result in results:
+        print(
+            f"  -> {result['method']:<26} {result['rows_per_s']:>9} rows/s  "
+            f"x{result['rows_per_s'] / baseline:<6.1f} {result['bytes_per_row']:>6} B/row  max error {result['max_error']:.1e}"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding decoding: per-row JSON parsing vs decode_matrix.")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    benchmark(rows=args.rows, dim=args.dim, repeat=args.repeat)
+
+
+if __name__ == "__main__":
+    main()
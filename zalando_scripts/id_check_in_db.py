@@ -14,10 +14,11 @@ supabase_client = supa.setup_supabase_client()
 
 # db_ids = supa.load_table(supabase_client, 'product_data')
 
+existing_ids = supa.values_existing_in_column(supabase_client, 'product_data', 'id', [item['id'] for item in data])
+
 for item in data:
     id_value = item['id']
-    exists = supa.check_if_value_exists_in_colum(supabase_client, 'product_data', id_value, 'id')
-    if  exists:
+    if id_value in existing_ids:
         # print(f"ID {id_value} not found in database.")
     # else:
         print(f"ID {id_value} already exists in database.")
\ No newline at end of file
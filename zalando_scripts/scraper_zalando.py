@@ -4,7 +4,6 @@ from urllib.parse import urljoin
 import re
 import os
 
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -17,6 +16,19 @@ import sys
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(parent_dir)
 
+from driver_pool import DriverPool
+from scroll_loader import scroll_until_stable
+from pdp_workers import pdp_concurrency, pdp_fetch_mode, pdp_lean_profile, run_pdp_stage
+from seen_index import SeenIndex
+from checkpoint_writer import CheckpointWriter
+from run_state import RunState, resume_requested
+from http_fetch import make_http_prefetch
+from html_parsing import make_soup, parse_html
+from rate_control import controlled_get
+from phase_timing import page_source, set_context, timed, write_report
+from page_cache import LISTING, PDP, record_driver_page, record_page
+from page_ready import wait_ready
+
 
 BASE_URL = "https://www.zalando.it"
 ZALANDO_URL = "https://www.zalando.it/sneakers-basse-uomo/" 
@@ -40,74 +52,34 @@ SCHEMA_SELECTOR = 'script[type="application/ld+json"]'
 MAIN_CONTENT_ID = 'z-pdp-main-content' 
 
 # --- DRIVER CONFIGURATION ---
-def make_driver():
-    """Configures and initializes an undetectable Chrome driver with default settings."""
-    
-    options = uc.ChromeOptions()
-    
-    print("  -> Using undetected_chromedriver's default User Agent.")
-    
-    # options.add_argument("--headless=new") 
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--log-level=3") 
-
-    driver = uc.Chrome(options=options, version_main=135)
-    driver.set_page_load_timeout(90)
-    
-    return driver
+# Zalando is pinned to Chrome 135 and needs a longer page-load timeout.
+DRIVER_OPTIONS = {"version_main": 135, "page_load_timeout": 90}
 
 # --- HELPER FUNCTIONS ---
 
+@timed("wait")
 def initial_wait_for_products(driver):
-    """Waits for the first product elements to load, checking for VISIBILITY."""
-    try:
-        # Timeout is 60s
-        WebDriverWait(driver, 60).until( 
-            EC.visibility_of_element_located((By.CSS_SELECTOR, PRODUCT_GRID_SELECTOR))
-        )
-        print("  -> Initial product grid element IS VISIBLE.")
-        time.sleep(random.uniform(2, 4)) 
+    """Waits until the first product elements are in the DOM and the page went quiet (the cookie banner is dismissed on the way)."""
+    # Timeout is 60s, but the wait ends as soon as the grid is there (see page_ready)
+    state = wait_ready(driver, RETAILER, selector=PRODUCT_GRID_SELECTOR, timeout=60)
+    if state["ready"]:
+        print(f"  -> Initial product grid found after {state['waited_ms'] / 1000:.1f}s.")
         return True
-    except Exception:
-        print("  -> ❌ CRITICAL: Initial product grid element not VISIBLE after 60s. Page is blocked or selector is incorrect.")
-        return False
+    print("  -> ❌ CRITICAL: Initial product grid element not found after 60s. Page is blocked or selector is incorrect.")
+    return False
 
 
 def zalando_scroll_and_load(driver, max_scrolls=15):
-    """Scrolls down to load all products on Zalando's infinite scroll page."""
+    """Scrolls down Zalando's infinite scroll page until the grid stops growing."""
     
     print("-> Starting infinite scroll...")
-    scroll_count = 0
-    
-    driver.execute_script("window.scrollTo(0, 100);")
-    time.sleep(random.uniform(1, 2))
-    
-    # last_height = driver.execute_script("return document.body.scrollHeight")
-    
-    while scroll_count < max_scrolls:
-        driver.execute_script("window.scrollTo(0, 100);")
-        
-        scroll_time = random.uniform(1, 2) 
-        time.sleep(scroll_time)
-        
-        # new_height = driver.execute_script("return document.body.scrollHeight")
-        
-        # if new_height == last_height:
-        #     print(f"-> Scroll count {scroll_count}: Reached end of page or no new items loaded.")
-        #     break
-            
-        # last_height = new_height
-        scroll_count += 1
-        print(f"-> Scroll count {scroll_count}/{max_scrolls} completed. New content loaded.")
-    
+    scroll_until_stable(driver, PRODUCT_GRID_SELECTOR, pause=2, max_loops=max_scrolls)
     print("-> Infinite scroll finished.")
-    return driver.page_source
+    return page_source(driver)
 
 def scrape_zalando_listing(html: str, main_category: str, role: str):
     """Parses Zalando's HTML to extract product details."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
     results = []
     
     # Use the newly corrected selector
@@ -133,42 +105,36 @@ def scrape_zalando_listing(html: str, main_category: str, role: str):
 
     return results
 
+@timed("wait")
 def scrape_product_detail_via_schema(driver, product_url):
     """Fetches a single Zalando product page and extracts data from the JSON-LD schema."""
     print(f"  -> Fetching details for: {product_url}")
-    details_dict = {} 
     json_string = None
     
     try:
-        driver.get(product_url)
-        wait = WebDriverWait(driver, 10) 
-
-        # 1. WARM-UP WAIT (Buffer for PDP rendering)
-        print("  -> Applying 3-second buffer for PDP rendering...")
-        time.sleep(3) 
+        controlled_get(driver, product_url)
+        # 1. CRITICAL WAIT: Wait ONLY for the SCHEMA SCRIPT (The actual data) and a quiet page.
+        #    The cookie banner is dismissed on the way, once per browser session (see page_ready).
+        if not wait_ready(driver, RETAILER, selector=SCHEMA_SELECTOR, timeout=10)["ready"]:
+            raise TimeoutError("no JSON-LD schema on the page")
 
-        # 2. POPUP/COOKIE BANNER HANDLING (Re-check for PDP)
-        try:
-            cookie_accept_selector = (By.ID, "uc-btn-accept-banner")
-            cookie_button = WebDriverWait(driver, 5).until(EC.element_to_be_clickable(cookie_accept_selector))
-            cookie_button.click()
-            print("  -> Cookie banner accepted/closed.")
-            time.sleep(random.uniform(1, 2)) 
-        except Exception:
-            pass 
-
-        # 3. CRITICAL WAIT: Wait ONLY for the SCHEMA SCRIPT (The actual data)
-        schema_element = wait.until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, SCHEMA_SELECTOR))
-        )
+        schema_element = driver.find_element(By.CSS_SELECTOR, SCHEMA_SELECTOR)
         print("  -> ✅ Product Schema script found.")
         json_string = schema_element.get_attribute('innerHTML')
+        record_driver_page(driver, product_url, json_ld=json_string)
 
             
     except Exception as e:
         print(f"  -> ❌ ERROR during navigation/wait: {e}")
         return {} 
         
+    return parse_product_detail(json_string)
+
+
+def parse_product_detail(json_string):
+    """Maps the Zalando JSON-LD schema string to our product fields."""
+    details_dict = {}
+
     # --- JSON PROCESSING ---
     if json_string:
         try:
@@ -213,124 +179,177 @@ def scrape_product_detail_via_schema(driver, product_url):
 
     return details_dict
 
+def scrape_product_detail_via_http(json_string, html):
+    """HTTP fetch mode: parses a PDP downloaded by http_fetch instead of a live browser."""
+    return parse_product_detail(json_string)
+
+
+# Retailer key used by the shared modules (pdp_workers, seen_index, crawl_scheduler)
+RETAILER = "zalando"
 MAX_PAGES = 5
+PDP_LIMIT = None
+# All categories go through one PDP stage into one catalog file
+PDP_PER_CATEGORY = False
+CATALOG_PATH_TEMPLATE = "zalando_catalog/sneakers-basse-uomo.json"
+# Listing parser used when replaying cached pages (see page_cache)
+LISTING_PARSER = scrape_zalando_listing
+# Empty results are dropped
+PDP_KEEP = bool
+
+
+def load_listing_html(driver, url):
+    """Opens and scrolls one listing page; run through pool.run() so blocked pages are retried headed."""
+    print(f"  -> Loading URL: {url}")
+    controlled_get(driver, url)
+
+    # --- DEBUG: PRINT HTML SOURCE (Set to print 10001-15000 in last step) ---
+    # print("\n--- DEBUG: PRINTING PAGE HTML SOURCE (Chars 10001 to 15000) ---")
+    # print(driver.page_source[10000:15000]) 
+    # print("----------------------------------------------------------\n")
+    # -----------------------------------
+
+    # # 2. Handle Cookie Banner (First priority to clear overlays)
+    # try:
+    #     cookie_accept_selector = (By.ID, "uc-btn-accept-banner")
+    #     # Increased cookie wait slightly, in case it's delayed
+    #     cookie_button = WebDriverWait(driver, 15).until(EC.element_to_be_clickable(cookie_accept_selector))
+    #     cookie_button.click()
+    #     print("  -> ✅ Cookie banner accepted/closed.")
+    #     time.sleep(random.uniform(2, 4)) 
+    # except Exception:
+    #     print("  -> Cookie button not found or not clickable within 15s. Proceeding.")
+    #     pass
+
+    # # 3. AGGRESSIVE BRUTE-FORCE WAIT FOR CONTENT INJECTION
+    # print("  -> 🛑 Applying 30-second aggressive wait for product content to load...")
+    # time.sleep(30)
+
+    # 4. WAIT FOR PRODUCTS TO APPEAR (Should now succeed with the new selector)
+    if not initial_wait_for_products(driver):
+        # Now that we have the correct HTML, if this still fails, the anti-bot measures are extremely aggressive.
+        return None
+
+    # 5. Scroll to load all products
+    return zalando_scroll_and_load(driver)
+
+
+def scrape_category_listing(pool, category_info, supabase_client=None):
+    """STEP 1 for one category: loads its first MAX_PAGES listing pages via infinite scroll."""
+    all_data = []
+
+    cat_name = category_info["name"]
+    main_cat = category_info["main_category"]
+    role = category_info["role"]
+    set_context(category=role)
+
+    for page in range(MAX_PAGES):
+        url = category_info["url"]
+
+        try:
+            if page > 0:
+                url = f"{url}?p={page + 1}"
+            soup_html = pool.run(load_listing_html, url)
+            if soup_html is None:
+                continue
+
+            record_page(url, LISTING, html=soup_html, role=role, main_category=main_cat)
+    
+            # 6. Parse the HTML
+            data = parse_html(scrape_zalando_listing, soup_html, main_cat, role) 
+    
+            if not data:
+                print(f"  -> ❌ WARNING: No product data found. Check selectors or if the page blocked you.")
+        
+            print(f"  -> Found {len(data)} items for {cat_name}.")
+            all_data.extend(data) 
+
+        except Exception as e:
+            print(f"  -> ❌ CRITICAL ERROR during Zalando listing scraping: {e}")
+
+    return all_data
+
+
+def scrape_details(pool, all_data, catalog_path, seen, state, resumed=False):
+    """STEP 2: scrapes the PDPs of `all_data` and writes them to `catalog_path`."""
+    # Finished products are streamed to a JSONL checkpoint and compacted at the end
+    checkpoint = CheckpointWriter(catalog_path, resume=resumed)
+
+    def finish(item, details):
+        checkpoint.append({**item, **details})
+
+    # Empty results are dropped, and each worker keeps the 2-3s pause between products
+    run_pdp_stage(
+        pool,
+        all_data,
+        scrape_product_detail_via_schema,
+        concurrency=pdp_concurrency(RETAILER),
+        on_done=finish,
+        on_status=state.mark,
+        lean=pdp_lean_profile(RETAILER),
+        prefetch=make_http_prefetch(scrape_product_detail_via_http) if pdp_fetch_mode() == "http" else None,
+        keep=PDP_KEEP,
+        pause=(2, 3),
+    )
+
+    # Read before finish() clears the queue
+    done = state.done_urls()
+    data = state.finish(checkpoint)
+    # Products count as seen only once they are in the catalog file, and only if they were scraped successfully
+    seen.mark_done(RETAILER, [record for record in data if record.get('url') in done])
+    return data
 
 # --- MAIN EXECUTION LOGIC ---
-def main():
+def main(resume: bool = False):
     """Orchestrates the Zalando scraping process."""
     all_data = []
+
+    # Warm browsers shared by the listing and PDP phases
+    pool = DriverPool(size=pdp_concurrency("zalando"), max_pages=50, **DRIVER_OPTIONS)
+    # Products scraped in earlier runs are not queued again
+    seen = SeenIndex()
     
-    # --- STEP 1: Scrape Listing Pages for URLs via Infinite Scroll ---
-    print("--- STEP 1: Scraping Listing Pages for URLs via Infinite Scroll ---")
-    for page in range(MAX_PAGES):
+    # The listing queue and per-URL status survive crashes (see run_state)
+    state = RunState("zalando")
+    queued = state.unfinished() if resume else None
+    if queued is not None:
+        print(f"--- Resuming: {len(queued)} unfinished products, skipping STEP 1 ---")
+        all_data = queued
+    else:
+        # --- STEP 1: Scrape Listing Pages for URLs via Infinite Scroll ---
+        print("--- STEP 1: Scraping Listing Pages for URLs via Infinite Scroll ---")
         for category_info in CATEGORIES_TO_SCRAPE:
-            url = category_info["url"]
-            cat_name = category_info["name"]
-            main_cat = category_info["main_category"]
-            role = category_info["role"]
-            
-            print(f"\n--- Scraping Category: {cat_name} ({url}) ---")
-            
-            driver = make_driver()
-            
-            try:
-                if page > 0:
-                    url = f"{url}?p={page + 1}"
-                print(f"  -> Loading URL: {url}")
-                driver.get(url)
-                
-                # 1. INITIAL WARMUP
-                print("  -> Applying 5-second initial wait...")
-                time.sleep(5)
-                
-                # --- DEBUG: PRINT HTML SOURCE (Set to print 10001-15000 in last step) ---
-                # print("\n--- DEBUG: PRINTING PAGE HTML SOURCE (Chars 10001 to 15000) ---")
-                # print(driver.page_source[10000:15000]) 
-                # print("----------------------------------------------------------\n")
-                # -----------------------------------
-
-                # # 2. Handle Cookie Banner (First priority to clear overlays)
-                # try:
-                #     cookie_accept_selector = (By.ID, "uc-btn-accept-banner")
-                #     # Increased cookie wait slightly, in case it's delayed
-                #     cookie_button = WebDriverWait(driver, 15).until(EC.element_to_be_clickable(cookie_accept_selector))
-                #     cookie_button.click()
-                #     print("  -> ✅ Cookie banner accepted/closed.")
-                #     time.sleep(random.uniform(2, 4)) 
-                # except Exception:
-                #     print("  -> Cookie button not found or not clickable within 15s. Proceeding.")
-                #     pass
-
-                # # 3. AGGRESSIVE BRUTE-FORCE WAIT FOR CONTENT INJECTION
-                # print("  -> 🛑 Applying 30-second aggressive wait for product content to load...")
-                # time.sleep(30)
-                
-                # 4. WAIT FOR PRODUCTS TO APPEAR (Should now succeed with the new selector)
-                if not initial_wait_for_products(driver):
-                    # Now that we have the correct HTML, if this still fails, the anti-bot measures are extremely aggressive.
-                    driver.quit()
-                    continue
-
-                # 5. Scroll to load all products
-                soup_html = zalando_scroll_and_load(driver, max_scrolls=4)
-                
-                # 6. Parse the HTML
-                data = scrape_zalando_listing(soup_html, main_cat, role) 
-                
-                if not data:
-                    print(f"  -> ❌ WARNING: No product data found. Check selectors or if the page blocked you.")
-                    
-                print(f"  -> Found {len(data)} items for {cat_name}.")
-                all_data.extend(data) 
-
-            except Exception as e:
-                print(f"  -> ❌ CRITICAL ERROR during Zalando listing scraping: {e}")
-                
-            finally:
-                driver.quit()
-                
+            print(f"\n--- Scraping Category: {category_info['name']} ({category_info['url']}) ---")
+            all_data.extend(scrape_category_listing(pool, category_info))
+
         print(f"\nTotal items collected for detailed scraping: {len(all_data)}")
 
         if not all_data:
             print("Skipping STEP 2: No product URLs collected due to block/error.")
+            pool.close()
             return 
     
+        all_data = seen.filter_new("zalando", all_data)
+        if not all_data:
+            print("Skipping STEP 2: every product is already in the seen index.")
+            pool.close()
+            return
+
+        state.save_queue(all_data)
+
     print(all_data)
 
     # --- STEP 2: Scrape Product Detail Pages (PDP) ---
     print("\n--- STEP 2: Scraping Details from Product Pages ---")
-    
-    driver = make_driver() 
-    successful_data = []
-    
-    try:
-        for i, item in enumerate(all_data):
-            
-            print(f"\nProcessing item {i+1}/{len(all_data)}")
-            if not item.get('url'):
-                print("  -> Skipping item, no URL found.")
-                continue
-            
-            details = scrape_product_detail_via_schema(driver, item['url'])
-            
-            if details:
-                item.update(details)
-                successful_data.append(item) 
-            
-            sleep_time = random.uniform(2,3)
-            print(f"  -> Pausing for {sleep_time:.2f} seconds before next product...")
-            time.sleep(sleep_time) 
 
+    try:
+        successful_data = scrape_details(pool, all_data, CATALOG_PATH_TEMPLATE, seen, state, resumed=queued is not None)
     finally:
-        driver.quit()
+        pool.report()
+        pool.close()
 
-    # --- Final Saving and Preview ---
-    output_file = "zalando_catalog/sneakers-basse-uomo.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(successful_data, f, indent=4, ensure_ascii=False)
-    print(f"\n✅ Final data successfully saved to {output_file}")
     print(f"\nCompleted! Total {len(successful_data)} successful products collected.")
+    write_report(RETAILER)
 
 if __name__ == "__main__":
     os.makedirs("zalando_catalog", exist_ok=True)
-    main()
\ No newline at end of file
+    main(resume=resume_requested())
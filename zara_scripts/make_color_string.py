@@ -1,6 +1,9 @@
 import os
+import sys
 import json
-import re
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from image_urls import canonical_image_url
 
 # 1. Configuration
 # Set the base directory containing the JSON files
@@ -10,7 +13,8 @@ base_dir = "zara_catalog/donna"
 # 2. Define the transformation function
 def update_image_links(data):
     """
-    Iterates over the list of items and removes 'w=177' from the 'image_link'.
+    Iterates over the list of items and points 'image_link' at the full-size image
+    (drops the 'w=177' thumbnail width and the 'ts' cache buster, see image_urls).
     """
     count = 0
     updated_data = data
@@ -20,8 +24,8 @@ def update_image_links(data):
         
         # Check if the 'image_link' key exists and has a truthy value
         if item.get('image_link'):
-            # Use re.sub to find and replace the pattern 'w=177' with an empty string
-            rescale_img = re.sub(r'w=177', '', item['image_link'])
+            # Canonical URL without the rendition width
+            rescale_img = canonical_image_url(item['image_link'], "zara", keep_size=False)
             item['image_link'] = rescale_img
         
         # NOTE: Keeping the 'else' block from your request, though 'break' might